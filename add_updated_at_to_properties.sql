@@ -0,0 +1,33 @@
+-- Agregar la columna updated_at para la sincronización incremental del dashboard.
+-- El dashboard solo descarga las filas con updated_at posterior a su última sincronización.
+ALTER TABLE public.properties
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE;
+
+-- Las propiedades existentes toman su fecha de creación
+UPDATE public.properties
+SET updated_at = created_at
+WHERE updated_at IS NULL;
+
+ALTER TABLE public.properties
+ALTER COLUMN updated_at SET DEFAULT now(),
+ALTER COLUMN updated_at SET NOT NULL;
+
+-- Mantener updated_at al día en cada actualización
+CREATE OR REPLACE FUNCTION public.set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.updated_at = now();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS properties_set_updated_at ON public.properties;
+CREATE TRIGGER properties_set_updated_at
+BEFORE UPDATE ON public.properties
+FOR EACH ROW EXECUTE FUNCTION public.set_updated_at();
+
+-- Índice para las consultas por marca de agua (updated_at, id)
+CREATE INDEX IF NOT EXISTS properties_updated_at_id_idx
+ON public.properties (updated_at, id);
+
+COMMENT ON COLUMN public.properties.updated_at IS 'Fecha de la última modificación; usada por el dashboard para sincronizar solo los cambios';
@@ -1,13 +1,21 @@
 #!/bin/bash
 
 # Script para realizar copias de seguridad de la base de datos de Supabase
-# Requiere tener instalado PostgreSQL y configurado el acceso a la base de datos
+# Las tablas grandes (properties y promoters) se copian de forma incremental
+# con dashboard/backup.py; el resto de la base (esquema, usuarios, registros)
+# se guarda con pg_dump sin los datos de esas tablas. Si la copia incremental
+# falla, pg_dump copia la base completa.
+# Requiere tener instalado PostgreSQL, Python con las dependencias del dashboard
+# y configurado el acceso a la base de datos
 
 # Configuración
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 BACKUP_DIR="/Users/sergio/Projects/hoom-propierties-search/backups"
+INCREMENTAL_DIR="$BACKUP_DIR/incremental"
 DATE=$(date +"%Y-%m-%d_%H-%M-%S")
 BACKUP_FILE="$BACKUP_DIR/supabase_backup_$DATE.sql"
 LOG_FILE="$BACKUP_DIR/backup_log.txt"
+RETAIN_DAYS=7
 
 # Crear directorio de backups si no existe
 mkdir -p "$BACKUP_DIR"
@@ -25,20 +33,57 @@ if [ -z "$SUPABASE_DB_URL" ]; then
   exit 1
 fi
 
-# Realizar la copia de seguridad
-log_message "Iniciando copia de seguridad de la base de datos..."
-pg_dump "$SUPABASE_DB_URL" > "$BACKUP_FILE" 2>> "$LOG_FILE"
+# Copia incremental de properties y promoters: solo las filas modificadas
+# desde la ejecución anterior
+if [ -z "$SUPABASE_URL" ] || [ -z "$SUPABASE_KEY" ]; then
+  log_message "ERROR: Las variables de entorno SUPABASE_URL y SUPABASE_KEY no están configuradas"
+  log_message "Ejemplo: export SUPABASE_URL=https://vespwditkwvlglxciwwv.supabase.co SUPABASE_KEY=<service_role key>"
+  EXPORT_STATUS=1
+else
+  log_message "Iniciando copia incremental de properties y promoters..."
+  python3 "$SCRIPT_DIR/dashboard/backup.py" export --dir "$INCREMENTAL_DIR" >> "$LOG_FILE" 2>&1
+  EXPORT_STATUS=$?
+fi
+
+if [ $EXPORT_STATUS -eq 0 ]; then
+  log_message "Copia incremental completada: $INCREMENTAL_DIR"
+  INCREMENTAL_OK=1
+
+  # Juntar los segmentos de más de 7 días en una instantánea
+  python3 "$SCRIPT_DIR/dashboard/backup.py" compact --dir "$INCREMENTAL_DIR" --retain-days "$RETAIN_DAYS" >> "$LOG_FILE" 2>&1
+  if [ $? -eq 0 ]; then
+    log_message "Segmentos antiguos compactados"
+  else
+    log_message "ERROR: La compactación de los segmentos falló"
+  fi
+else
+  log_message "ERROR: La copia incremental falló; se hará una copia completa con pg_dump"
+  INCREMENTAL_OK=0
+fi
+
+# Realizar la copia de seguridad del resto de la base; si la copia
+# incremental falló, también los datos de properties y promoters
+if [ "$INCREMENTAL_OK" -eq 1 ]; then
+  log_message "Iniciando copia de seguridad de la base de datos (sin los datos de properties y promoters)..."
+  pg_dump "$SUPABASE_DB_URL" \
+    --exclude-table-data=public.properties \
+    --exclude-table-data=public.promoters \
+    > "$BACKUP_FILE" 2>> "$LOG_FILE"
+else
+  log_message "Iniciando copia de seguridad completa de la base de datos..."
+  pg_dump "$SUPABASE_DB_URL" > "$BACKUP_FILE" 2>> "$LOG_FILE"
+fi
 
 # Verificar si la copia de seguridad fue exitosa
 if [ $? -eq 0 ]; then
   log_message "Copia de seguridad completada exitosamente: $BACKUP_FILE"
-  
+
   # Comprimir el archivo de backup
   gzip "$BACKUP_FILE"
   log_message "Archivo comprimido: $BACKUP_FILE.gz"
-  
+
   # Eliminar backups antiguos (mantener los últimos 7 días)
-  find "$BACKUP_DIR" -name "supabase_backup_*.sql.gz" -type f -mtime +7 -delete
+  find "$BACKUP_DIR" -name "supabase_backup_*.sql.gz" -type f -mtime +$RETAIN_DAYS -delete
   log_message "Backups antiguos eliminados"
 else
   log_message "ERROR: La copia de seguridad falló"
@@ -47,9 +92,11 @@ fi
 # Mostrar estadísticas
 BACKUP_COUNT=$(find "$BACKUP_DIR" -name "supabase_backup_*.sql.gz" | wc -l)
 BACKUP_SIZE=$(du -sh "$BACKUP_DIR" | cut -f1)
+INCREMENTAL_SIZE=$(du -sh "$INCREMENTAL_DIR" 2>/dev/null | cut -f1)
 
 log_message "Estadísticas de backups:"
 log_message "- Número de backups: $BACKUP_COUNT"
+log_message "- Tamaño de la copia incremental: $INCREMENTAL_SIZE"
 log_message "- Tamaño total de backups: $BACKUP_SIZE"
 log_message "- Directorio de backups: $BACKUP_DIR"
 
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from queries import UNKNOWN_PORTAL
+
+# --- Agregados de mercado sobre la caché local de propiedades ---
+
+# Dimensiones de agrupación: etiqueta -> columna
+GROUP_DIMENSIONS = {
+    "Zona": 'zone',
+    "Tipo de propiedad": 'property_type',
+    "Tipo de operación": 'listing_type',
+    "Portal": 'source_portal',
+}
+NO_ZONE = "Sin zona"
+
+# Métricas con precio: etiqueta -> columna
+PRICE_METRICS = {
+    "Precio": 'price',
+    "Precio por m² de construcción": 'price_per_m2_construction',
+    "Precio por m² de terreno": 'price_per_m2_land',
+}
+
+
+def zones(location_text):
+    """Zona de cada propiedad: el primer segmento de `location_text` ("Providencia, Guadalajara" -> "Providencia").
+
+    La normalización se hace sobre los valores únicos, no por fila.
+    """
+    codes, uniques = pd.factorize(location_text, use_na_sentinel=True)
+    names = pd.Series(uniques, dtype=object).str.split(",", n=1).str[0].str.strip().str.title()
+    names = names.where(names.str.len() > 0, NO_ZONE)
+    categories = pd.Index(names.tolist() + [NO_ZONE]).unique()
+    zone_codes = np.append(categories.get_indexer(names), categories.get_loc(NO_ZONE))
+    return pd.Categorical.from_codes(zone_codes[codes], categories=categories)
+
+
+def prepare_market_frame(df_properties):
+    """Columnas numéricas para los agregados: precio por m² y zona.
+
+    Las superficies en cero o vacías dejan el precio por m² como NaN.
+    """
+    price = df_properties['price'].to_numpy(dtype=float, na_value=np.nan)
+    construction = df_properties['construction_area_m2'].to_numpy(dtype=float, na_value=np.nan)
+    land = df_properties['land_area_m2'].to_numpy(dtype=float, na_value=np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_per_m2_construction = np.where(construction > 0, price / construction, np.nan)
+        price_per_m2_land = np.where(land > 0, price / land, np.nan)
+    return pd.DataFrame({
+        'zone': zones(df_properties['location_text']),
+        'property_type': df_properties['property_type'],
+        'listing_type': df_properties['listing_type'],
+        'source_portal': df_properties['source_portal'].astype(object).fillna(UNKNOWN_PORTAL).astype('category'),
+        'price': price,
+        'price_per_m2_construction': price_per_m2_construction,
+        'price_per_m2_land': price_per_m2_land,
+        'days_on_market': df_properties['days_on_market'].to_numpy(dtype=float, na_value=np.nan),
+        'publication_date': df_properties['publication_date'],
+    }, index=df_properties.index)
+
+
+def group_summary(df_market, by, metric='price'):
+    """Conteo y percentiles de `metric` y de días en el mercado por `by`.
+
+    Usa solo agregaciones de groupby (sin `.apply` por fila), así que el
+    costo es lineal en el número de filas.
+    """
+    grouped = df_market.groupby(by, observed=True)
+    quantiles = grouped[metric].quantile([0.25, 0.5, 0.75]).unstack()
+    summary = pd.DataFrame({
+        'listings': grouped.size(),
+        'p25': quantiles[0.25],
+        'median': quantiles[0.5],
+        'p75': quantiles[0.75],
+        'mean': grouped[metric].mean(),
+        'median_days_on_market': grouped['days_on_market'].median(),
+    })
+    return summary.sort_values('listings', ascending=False).rename_axis(by).reset_index()
+
+
+def days_on_market_distribution(df_market, by, bins=(0, 15, 30, 60, 90, 180, 365, np.inf)):
+    """Número de anuncios por rango de días en el mercado, por grupo."""
+    labels = [f"{int(low)}–{int(high)}" if np.isfinite(high) else f"{int(low)}+" for low, high in zip(bins[:-1], bins[1:])]
+    ranges = pd.cut(df_market['days_on_market'], bins=list(bins), labels=labels, right=False)
+    return (
+        pd.crosstab(df_market[by], ranges, dropna=True)
+        .reindex(columns=labels, fill_value=0)
+        .loc[lambda table: table.sum(axis=1) > 0]
+    )
+
+
+def rolling_statistics(df_market, metric='price', window=30, by=None):
+    """Mediana diaria de `metric` por `publication_date` y su mediana móvil de `window` días.
+
+    Con `by`, una serie por grupo (columnas: fecha, grupo, valores).
+    """
+    df_dated = df_market.dropna(subset=['publication_date', metric])
+    keys = ['publication_date'] if by is None else [by, 'publication_date']
+    daily = df_dated.groupby(keys, observed=True)[metric].agg(['median', 'size']).rename(columns={'size': 'listings'})
+    if daily.empty:
+        return daily.reset_index()
+
+    def roll(frame):
+        # Días sin publicaciones cuentan como huecos dentro de la ventana
+        frame = frame.droplevel(0) if by is not None else frame
+        frame = frame.asfreq('D')
+        return pd.DataFrame({
+            'daily_median': frame['median'],
+            'listings': frame['listings'].fillna(0).astype(int),
+            'rolling_median': frame['median'].rolling(f"{window}D", min_periods=1).median(),
+            'rolling_listings': frame['listings'].fillna(0).rolling(f"{window}D").sum().astype(int),
+        })
+
+    if by is None:
+        return roll(daily).rename_axis('publication_date').reset_index()
+    parts = {group: roll(frame) for group, frame in daily.groupby(level=0, observed=True)}
+    return pd.concat(parts, names=[by, 'publication_date']).reset_index()
+
+
+def fetch_market_summary(client, by, metric='price', property_type=None, listing_type=None):
+    """Mismo resultado que `group_summary`, calculado en el servidor (market_analytics.sql)."""
+    response = client.rpc("market_summary", {
+        "group_by": by,
+        "metric": metric,
+        "property_type_filter": property_type,
+        "listing_type_filter": listing_type,
+    }).execute()
+    columns = ['group_value', 'listings', 'p25', 'median', 'p75', 'mean', 'median_days_on_market']
+    return pd.DataFrame(response.data or [], columns=columns).rename(columns={'group_value': by})
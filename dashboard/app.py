@@ -1,7 +1,41 @@
-import streamlit as st
+import numpy as np
 import pandas as pd
+import pydeck as pdk
+import streamlit as st
 from supabase import create_client, Client
 
+from dedup import DuplicateTracker, collapse_duplicates
+from map_clusters import DEFAULT_CENTER, MAX_ZOOM, MIN_ZOOM, cluster_points, fit_view, viewport_bounds
+from profiling import InstrumentedClient
+from property_cache import CacheFollower
+from session import (
+    get_offline_client,
+    get_profiler,
+    get_property_cache,
+    get_session_id,
+    get_write_queue,
+    show_offline_notice,
+    show_profiling_panel,
+    show_write_status,
+    start_rerun,
+)
+from spatial_index import haversine_m
+from text_search import TextSearchIndex
+from thumbnails import BACKGROUND_FETCH_RATE, DEFAULT_DIRECTORY, DEFAULT_MAX_BYTES, RateLimiter, ThumbnailCache
+from queries import (
+    NO_PROMOTER,
+    PROPERTY_TYPES,
+    UNKNOWN_PORTAL,
+    add_promoter_names,
+    count_properties,
+    fetch_filter_options,
+    fetch_property,
+    fetch_property_page,
+    filter_options,
+    is_missing_object,
+    properties_query,
+)
+
 # --- Configuración de la página ---
 st.set_page_config(
     page_title="Hoom Dashboard de Propiedades",
@@ -9,15 +43,107 @@ st.set_page_config(
     layout="wide"
 )
 
+# --- Métricas de rendimiento ---
+profiler = get_profiler()
+rerun_trace = start_rerun(profiler, "Propiedades")
+show_profiling_panel(profiler)
+
 # --- Conexión a Supabase ---
 
 @st.cache_resource
 def init_connection() -> Client:
+    # Sin conexión: copia de seguridad local de backup.py ([offline] en secrets.toml)
+    offline_client = get_offline_client(profiler)
+    if offline_client is not None:
+        return offline_client
     url = st.secrets["supabase"]["url"]
     key = st.secrets["supabase"]["key"]
-    return create_client(url, key)
+    # Cada llamada queda registrada en el panel de rendimiento
+    return InstrumentedClient(create_client(url, key), profiler)
 
 supabase_client = init_connection()
+show_offline_notice(supabase_client)
+
+# --- Carga de Datos ---
+@profiler.cache_data(ttl=600)
+def load_promoters(generation=0):
+    # Cargar todos los promotores para el filtro
+    promoters_response = supabase_client.from_("promoters").select("id, name").execute()
+    return pd.DataFrame(promoters_response.data) if promoters_response.data else pd.DataFrame(columns=['id', 'name'])
+
+@profiler.cache_data(ttl=600)
+def load_filter_options():
+    return fetch_filter_options(supabase_client)
+
+@profiler.cache_data(ttl=600)
+def load_count(filters, generation=0):
+    return count_properties(supabase_client, filters)
+
+@profiler.cache_data(ttl=600)
+def load_data(filters, sort_column, ascending, offset, limit, generation=0):
+    # Cargar solo la página visible, ya filtrada en el servidor.
+    # Se usa mientras la caché local termina su primera sincronización.
+    df_properties = fetch_property_page(supabase_client, filters, sort_column, ascending, offset, limit)
+    return add_promoter_names(df_properties, load_promoters(write_queue.generation("promoters")))
+
+@profiler.cache_data(ttl=600)
+def load_property(property_id, generation=0):
+    # Fila completa para el detalle y la edición
+    return fetch_property(supabase_client, property_id)
+
+property_cache = get_property_cache(supabase_client)
+
+# Las escrituras se envían en segundo plano; `generation` cambia tras cada
+# envío exitoso y renueva las consultas al servidor.
+write_queue = get_write_queue(supabase_client)
+write_queue.on_failure("properties", property_cache.refresh)
+session_id = get_session_id()
+
+@st.cache_resource
+def get_thumbnail_cache():
+    # Directorio y tamaño configurables en secrets.toml, sección [thumbnails]
+    config = st.secrets.get("thumbnails", {})
+    max_bytes = int(config["max_mb"]) * 1024 * 1024 if "max_mb" in config else DEFAULT_MAX_BYTES
+    return ThumbnailCache(config.get("directory", DEFAULT_DIRECTORY), max_bytes=max_bytes)
+
+thumbnails = get_thumbnail_cache()
+
+@st.cache_resource
+def get_cache_follower():
+    # Duplicados y búsqueda de texto se actualizan juntos: las descripciones
+    # se piden una sola vez para los dos. Con photo_hashes = true en
+    # secrets.toml, sección [dedup], los duplicados comparan también la
+    # primera foto (pHash): descarga la foto de cada propiedad, a
+    # photos_per_second por segundo y sin pasar por la caché de miniaturas
+    config = st.secrets.get("dedup", {})
+    image_loader = None
+    if config.get("photo_hashes", False):
+        limiter = RateLimiter(float(config.get("photos_per_second", BACKGROUND_FETCH_RATE)))
+        image_loader = lambda url: thumbnails.load_uncached(url, 'gallery', limiter)
+    return CacheFollower(supabase_client, [DuplicateTracker(image_loader), TextSearchIndex()])
+
+cache_follower = get_cache_follower()
+duplicate_tracker, search_index = cache_follower.consumers
+
+@profiler.cache_data(ttl=600)
+def load_nearby_properties(latitude, longitude, radius_m, property_type, limit, generation=0):
+    # Comparables desde el servidor (spatial_search.sql) mientras no hay caché local
+    query = properties_query(
+        supabase_client, "id, title, price, construction_area_m2, land_area_m2, latitude, longitude, property_url",
+        {'latitude': latitude, 'longitude': longitude, 'radius_m': radius_m},
+    )
+    if property_type is not None:
+        query = query.eq("property_type", property_type)
+    return pd.DataFrame(query.limit(limit).execute().data or [])
+
+def get_property(property_id):
+    # Fila completa con los cambios aún pendientes en la cola
+    row = load_property(property_id, write_queue.generation("properties"))
+    pending_changes, _ = write_queue.pending("properties")
+    pending = pending_changes.get(property_id)
+    if row is not None and pending is not None and pending['op'] == 'update':
+        row = dict(row, **pending['data'])
+    return row
 
 # --- Lógica de Eliminación ---
 if 'property_to_delete' in st.session_state and st.session_state.property_to_delete is not None:
@@ -27,16 +153,13 @@ if 'property_to_delete' in st.session_state and st.session_state.property_to_del
     def confirm_delete_dialog():
         st.warning(f"¿Estás seguro de que quieres eliminar la propiedad: '{property_to_delete['title']}'?")
         col1, col2 = st.columns(2)
-        if col1.button("Confirmar", use_container_width=True, type="primary"):
-            try:
-                supabase_client.from_("properties").delete().eq("id", property_to_delete['id']).execute()
-                st.toast(f"Propiedad '{property_to_delete['title']}' eliminada.")
-                st.session_state.property_to_delete = None
-                st.cache_data.clear()
-                st.rerun()
-            except Exception as e:
-                st.error(f"Error al eliminar: {e}")
-        if col2.button("Cancelar", use_container_width=True):
+        if col1.button("Confirmar", width="stretch", type="primary"):
+            # Se aplica localmente de inmediato; el resultado llega como toast
+            write_queue.delete("properties", property_to_delete['id'], session_id)
+            property_cache.apply_delete([property_to_delete['id']])
+            st.session_state.property_to_delete = None
+            st.rerun()
+        if col2.button("Cancelar", width="stretch"):
             st.session_state.property_to_delete = None
             st.rerun()
 
@@ -78,7 +201,7 @@ if 'property_to_edit' in st.session_state and st.session_state.property_to_edit
             
             description = st.text_area("Descripción", value=property_to_edit.get('description', ''))
 
-            if st.form_submit_button("Guardar Cambios", use_container_width=True, type="primary"):
+            if st.form_submit_button("Guardar Cambios", width="stretch", type="primary"):
                 updated_data = {
                     'title': title, 'price': price, 'location_text': location_text,
                     'description': description, 'construction_area_m2': construction_area_m2,
@@ -86,14 +209,10 @@ if 'property_to_edit' in st.session_state and st.session_state.property_to_edit
                     'half_bathrooms': half_bathrooms, 'parking_spaces': parking_spaces, 'levels': levels,
                     'promoter_id': promoter_options[promoter_selection]
                 }
-                try:
-                    supabase_client.from_("properties").update(updated_data).eq("id", property_to_edit['id']).execute()
-                    st.toast("Propiedad actualizada con éxito.")
-                    st.session_state.property_to_edit = None
-                    st.cache_data.clear()
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error al actualizar: {e}")
+                write_queue.update("properties", property_to_edit['id'], updated_data, session_id)
+                property_cache.apply_update(property_to_edit['id'], updated_data)
+                st.session_state.property_to_edit = None
+                st.rerun()
 
         if st.button("Cancelar"):
             st.session_state.property_to_edit = None
@@ -101,181 +220,523 @@ if 'property_to_edit' in st.session_state and st.session_state.property_to_edit
 
     edit_property_dialog()
 
-# --- Carga de Datos ---
-@st.cache_data(ttl=600)
-def load_data():
-    # Cargar propiedades
-    properties_response = supabase_client.from_("properties").select("*, promoter_id(*)").execute()
-    if not properties_response.data:
-        return pd.DataFrame(), pd.DataFrame()
-    
-    df_properties = pd.DataFrame(properties_response.data)
-    
-    # Procesar datos de propiedades
-    df_properties['created_at'] = pd.to_datetime(df_properties['created_at']).dt.date
-    df_properties['price'] = pd.to_numeric(df_properties['price'], errors='coerce')
-    df_properties['source_portal'] = df_properties['source_portal'].fillna('Desconocido')
-    df_properties['latitude'] = pd.to_numeric(df_properties['latitude'], errors='coerce')
-    df_properties['longitude'] = pd.to_numeric(df_properties['longitude'], errors='coerce')
-
-    # Extraer y aplanar datos del promotor
-    def get_promoter_name(promoter_data):
-        if isinstance(promoter_data, dict) and 'name' in promoter_data:
-            return promoter_data['name']
-        return "Sin Promotor"
-
-    df_properties['promoter_name'] = df_properties['promoter_id'].apply(get_promoter_name)
-    df_properties['promoter_id'] = df_properties['promoter_id'].apply(lambda x: x.get('id') if isinstance(x, dict) else None)
+# --- Vista de Tarjetas ---
+PAGE_SIZE_OPTIONS = [12, 24, 48, 96]
+# En la vista de tabla cada página es más grande; st.dataframe solo dibuja las filas visibles
+TABLE_PAGE_SIZE = 500
+
+# Etiqueta -> (columna, ascendente)
+SORT_OPTIONS = {
+    "Más recientes": ('created_at', False),
+    "Precio: menor a mayor": ('price', True),
+    "Precio: mayor a menor": ('price', False),
+    "Construcción m²": ('construction_area_m2', False),
+    "Terreno m²": ('land_area_m2', False),
+}
+# Solo con una búsqueda de texto sobre la caché local
+RELEVANCE_SORT = {"Relevancia": ('relevance', False)}
+
+def create_metric_string(value, unit):
+    # Helper to format metric strings, handling None, NaN, or 0 values
+    return f"{int(value)} {unit}" if pd.notna(value) and value != 0 else "N/A"
+
+def render_property_details(row, key_prefix=""):
+    # Sin la fila completa (p. ej. otra sesión la eliminó) queda la de la
+    # lista, que no trae descripción ni galería
+    row = get_property(row['id']) or row.to_dict()
+    st.markdown("**Descripción**")
+    st.write(row.get('description') or "Sin descripción.")
+    # Mostrar niveles si existe el dato
+    if pd.notna(row.get('levels')) and row['levels'] > 0:
+        st.markdown("**Características adicionales**")
+        st.metric("Niveles", int(row['levels']))
+
+    # Ubicación en el mapa compartido de resultados
+    if pd.notna(row.get('latitude')) and pd.notna(row.get('longitude')):
+        map_col, area_col = st.columns(2)
+        map_col.button(
+            "📍 Ver en el mapa de resultados", key=f"{key_prefix}map_{row['id']}",
+            on_click=focus_on_map, args=(float(row['latitude']), float(row['longitude']), row['id']),
+        )
+        area_col.button(
+            "🎯 Filtrar alrededor de esta propiedad", key=f"{key_prefix}area_{row['id']}",
+            on_click=filter_around, args=(float(row['latitude']), float(row['longitude'])),
+        )
+        render_comparables(row, key_prefix)
+
+    # Otros anuncios del mismo inmueble (en otros portales o repetidos)
+    duplicate_ids = duplicate_tracker.members(row['id'])
+    df_cached = property_cache.snapshot()
+    if duplicate_ids and df_cached is not None:
+        st.markdown("**Otros anuncios del mismo inmueble**")
+        for _, duplicate in df_cached.loc[df_cached.index.intersection(duplicate_ids)].iterrows():
+            price_str = f"${duplicate['price']:,.0f}" if pd.notna(duplicate['price']) else "N/A"
+            portal = duplicate['source_portal'] if pd.notna(duplicate['source_portal']) else UNKNOWN_PORTAL
+            st.markdown(f"- **{portal}** · [{duplicate['title'] or 'Sin Título'}]({duplicate['property_url']}) · {price_str}")
+
+    # Galería de fotos con opción de seleccionar principal
+    if row.get('photos') and len(row['photos']) > 1:
+        st.markdown("**Galería**")
+        # Crear una cuadrícula para la galería
+        cols = st.columns(4)
+        for i, photo_url in enumerate(row['photos']):
+            col_index = i % 4
+            with cols[col_index]:
+                st.image(thumbnails.get(photo_url, 'gallery'), width="stretch")
+                # No mostrar el botón para la imagen que ya es principal
+                if i > 0:
+                    if st.button("Establecer como principal", key=f"{key_prefix}set_main_{row['id']}_{i}", width="stretch"):
+                        # Reordenar la lista de fotos
+                        new_photos_order = [photo_url] + [p for p in row['photos'] if p != photo_url]
+                        write_queue.update("properties", row['id'], {"photos": new_photos_order}, session_id)
+                        property_cache.apply_update(row['id'], {"photos": new_photos_order})
+                        st.rerun()
+
+# --- Comparables ---
+COMPARABLE_RADIUS_OPTIONS = [500, 1000, 2000, 5000]
+COMPARABLES_LIMIT = 8
+
+def filter_around(latitude, longitude):
+    st.session_state.area_mode = "Radio"
+    st.session_state.area_latitude = latitude
+    st.session_state.area_longitude = longitude
+
+def render_comparables(row, key_prefix=""):
+    # Propiedades del mismo tipo más cercanas, con el índice espacial de la caché local
+    st.markdown("**Comparables cercanos**")
+    radius_m = st.select_slider(
+        "Radio", options=COMPARABLE_RADIUS_OPTIONS, value=1000, format_func=lambda r: f"{r / 1000:g} km",
+        key=f"{key_prefix}comparables_radius_{row['id']}",
+    )
+    latitude, longitude = float(row['latitude']), float(row['longitude'])
+    property_type = row.get('property_type') if pd.notna(row.get('property_type')) else None
+    filter_index = property_cache.filter_index()
+    if filter_index is not None:
+        positions, distances = filter_index.spatial.within_radius(latitude, longitude, radius_m)
+        nearby = filter_index.df.iloc[positions].assign(distance_m=distances)
+        if property_type is not None:
+            nearby = nearby[nearby['property_type'] == property_type]
+    else:
+        try:
+            nearby = load_nearby_properties(latitude, longitude, radius_m, property_type, COMPARABLES_LIMIT + 1, write_queue.generation("properties"))
+        except Exception:
+            st.caption("Los comparables estarán disponibles al terminar la carga de datos.")
+            return
+        if not nearby.empty:
+            nearby['distance_m'] = haversine_m(nearby['latitude'].astype(float), nearby['longitude'].astype(float), latitude, longitude)
+    nearby = nearby[nearby['id'] != row['id']].head(COMPARABLES_LIMIT) if not nearby.empty else nearby
+    if nearby.empty:
+        st.caption(f"No hay propiedades del mismo tipo a menos de {radius_m / 1000:g} km.")
+        return
+
+    construction = pd.to_numeric(nearby['construction_area_m2'], errors='coerce')
+    comparables = pd.DataFrame({
+        'title': nearby['title'],
+        'price': pd.to_numeric(nearby['price'], errors='coerce'),
+        'price_per_m2': pd.to_numeric(nearby['price'], errors='coerce') / construction.where(construction > 0),
+        'distance_m': nearby['distance_m'].round(),
+        'property_url': nearby['property_url'],
+    })
+    median_price = comparables['price'].median()
+    if pd.notna(median_price) and pd.notna(row.get('price')):
+        st.caption(f"Mediana de los comparables: ${median_price:,.0f} ({(row['price'] / median_price - 1):+.0%} esta propiedad)")
+    st.dataframe(
+        comparables,
+        width="stretch",
+        hide_index=True,
+        column_config={
+            'title': 'Título',
+            'price': st.column_config.NumberColumn('Precio', format="$%.0f"),
+            'price_per_m2': st.column_config.NumberColumn('Precio/m² constr.', format="$%.0f"),
+            'distance_m': st.column_config.NumberColumn('Distancia', format="%d m"),
+            'property_url': st.column_config.LinkColumn('Anuncio', display_text="Ver"),
+        },
+    )
 
-    # Cargar todos los promotores para el filtro
-    promoters_response = supabase_client.from_("promoters").select("id, name").execute()
-    df_promoters = pd.DataFrame(promoters_response.data) if promoters_response.data else pd.DataFrame(columns=['id', 'name'])
-    
-    return df_properties, df_promoters
+def render_property_card(row, df_promoters, key_prefix=""):
+    with st.container(border=True):
+        col1, col2 = st.columns([1, 2])
+
+        with col1:
+            # Foto principal (miniatura local; sin foto se usa la imagen de reemplazo)
+            main_photo = row['main_photo'] if pd.notna(row['main_photo']) else None
+            st.image(thumbnails.get(main_photo, 'card'), width="stretch")
+
+        with col2:
+            # --- Título y Precio ---
+            title_col, price_col = st.columns([3, 1])
+            with title_col:
+                st.subheader(row['title'] or "Sin Título")
+            with price_col:
+                price_str = f"${row['price']:,.0f}" if pd.notna(row['price']) else "N/A"
+                st.markdown(f"<h3 style='text-align: right; color: #28a745;'>{price_str}</h3>", unsafe_allow_html=True)
+
+            # --- Ubicación y Promotor ---
+            st.markdown(f"**📍 {row['location_text'] or 'Ubicación no especificada'}**")
+            st.markdown(f"**👤 Promotor:** {row['promoter_name']}")
+            if row.get('duplicate_count', 1) > 1:
+                st.caption(f"🔁 Publicada {row['duplicate_count']} veces: {row['duplicate_portals']}")
+
+            # --- Métricas Compactas ---
+            # First row of metrics
+            metrics_col1, metrics_col2, metrics_col3, metrics_col4 = st.columns(4)
+            metrics_col1.markdown(f"**Constr:**<br>{create_metric_string(row.get('construction_area_m2'), 'm²')}", unsafe_allow_html=True)
+            metrics_col2.markdown(f"**Terreno:**<br>{create_metric_string(row.get('land_area_m2'), 'm²')}", unsafe_allow_html=True)
+            metrics_col3.markdown(f"**Recámaras:**<br>{create_metric_string(row.get('bedrooms'), '🛏️')}", unsafe_allow_html=True)
+            metrics_col4.markdown(f"**Niveles:**<br>{create_metric_string(row.get('levels'), '🏢')}", unsafe_allow_html=True)
+
+            # Second row of metrics
+            metrics_col5, metrics_col6, metrics_col7, _ = st.columns(4) # Use a throwaway for alignment
+            metrics_col5.markdown(f"**Baños:**<br>{create_metric_string(row.get('full_bathrooms'), '🚽')}", unsafe_allow_html=True)
+            metrics_col6.markdown(f"**1/2 Baños:**<br>{create_metric_string(row.get('half_bathrooms'), '🚻')}", unsafe_allow_html=True)
+            metrics_col7.markdown(f"**Estac:**<br>{create_metric_string(row.get('parking_spaces'), '🚗')}", unsafe_allow_html=True)
+
+            # --- Botones de Acción ---
+            action_col1, action_col2, action_col3 = st.columns(3)
+            action_col1.link_button("Ver Anuncio", row['property_url'], width="stretch")
+            if action_col2.button("✏️ Editar", key=f"{key_prefix}edit_{row['id']}", width="stretch"):
+                st.session_state.property_to_edit = get_property(row['id']) or row.to_dict()
+                st.session_state.df_promoters_for_dialog = df_promoters # Guardar promotores para el diálogo
+                st.rerun()
+            if action_col3.button("🗑️ Eliminar", key=f"{key_prefix}delete_{row['id']}", width="stretch"):
+                st.session_state.property_to_delete = row
+
+        # Expander para más detalles y galería.
+        # El mapa y la galería solo se construyen cuando el expander está abierto.
+        details = st.expander("Ver más detalles y galería de fotos", key=f"{key_prefix}details_{row['id']}", on_change="rerun")
+        if details.open:
+            with details:
+                render_property_details(row, key_prefix)
+
+# --- Mapa de Resultados ---
+# Un solo mapa para todo el resultado. Los puntos se agrupan según el zoom y
+# solo se envían los que caen en la vista actual, así que el mapa no se puede
+# arrastrar ni acercar con la rueda: se navega con los botones y los grupos.
+def focus_on_map(latitude, longitude, property_id=None):
+    st.session_state.map_view = (latitude, longitude, 15)
+    st.session_state.map_focus_id = property_id
+    st.session_state.results_map_open = True
+
+def zoom_map(step):
+    latitude, longitude, zoom = st.session_state.map_view
+    st.session_state.map_view = (latitude, longitude, int(np.clip(zoom + step, MIN_ZOOM, MAX_ZOOM)))
+
+def reset_map():
+    st.session_state.map_view = None
+    st.session_state.map_focus_id = None
+
+def on_map_select():
+    picked = st.session_state.results_map.selection.objects.get("clusters", [])
+    if not picked:
+        return
+    point = picked[0]
+    if point['count'] == 1:
+        # Un punto individual muestra su tarjeta debajo del mapa
+        st.session_state.map_focus_id = point['property_id']
+    else:
+        # Un grupo acerca el mapa sobre él
+        zoom = st.session_state.map_view[2]
+        st.session_state.map_view = (point['latitude'], point['longitude'], min(zoom + 2, MAX_ZOOM))
+
+def render_results_map(map_df, df_promoters):
+    if st.session_state.get('map_view') is None:
+        located = map_df.dropna(subset=['latitude', 'longitude'])
+        st.session_state.map_view = fit_view(located['latitude'].to_numpy(dtype=float), located['longitude'].to_numpy(dtype=float))
+    latitude, longitude, zoom = st.session_state.map_view
+
+    zoom_in_col, zoom_out_col, reset_col, info_col = st.columns([1, 1, 2, 4])
+    zoom_in_col.button("➕", on_click=zoom_map, args=(2,), width="stretch")
+    zoom_out_col.button("➖", on_click=zoom_map, args=(-2,), width="stretch")
+    reset_col.button("Ajustar a resultados", on_click=reset_map, width="stretch")
+
+    clusters = cluster_points(map_df, zoom, viewport_bounds(latitude, longitude, zoom))
+    info_col.caption(
+        f"Zoom {zoom} · {int(clusters['count'].sum()) if len(clusters) else 0} propiedades en la vista · "
+        "haz clic en un grupo para acercarte"
+    )
+    clusters['radius'] = np.where(clusters['count'] > 1, 10 + 4 * np.log2(clusters['count'].clip(lower=1).astype(float)), 6)
+    clusters['count_label'] = np.where(clusters['count'] > 1, clusters['count'].astype(str), "")
+
+    deck = pdk.Deck(
+        layers=[
+            pdk.Layer(
+                "ScatterplotLayer", id="clusters", data=clusters,
+                get_position=["longitude", "latitude"], get_radius="radius", radius_units="pixels",
+                get_fill_color=[40, 167, 69, 200], get_line_color=[255, 255, 255], line_width_min_pixels=1,
+                stroked=True, pickable=True,
+            ),
+            pdk.Layer(
+                "TextLayer", id="cluster_counts", data=clusters[clusters['count'] > 1],
+                get_position=["longitude", "latitude"], get_text="count_label",
+                get_size=12, get_color=[255, 255, 255],
+            ),
+        ],
+        views=[pdk.View(type="MapView", controller=False)],
+        initial_view_state=pdk.ViewState(latitude=latitude, longitude=longitude, zoom=zoom),
+        tooltip={"text": "{label}"},
+    )
+    st.pydeck_chart(deck, on_select=on_map_select, selection_mode="single-object", key="results_map")
+
+    focus_id = st.session_state.get('map_focus_id')
+    focused = map_df[map_df['id'] == focus_id] if focus_id else map_df.iloc[0:0]
+    if len(focused):
+        st.markdown("**Propiedad seleccionada en el mapa**")
+        focused = add_promoter_names(focused, df_promoters) if 'promoter_name' not in focused else focused
+        render_property_card(focused.iloc[0], df_promoters, key_prefix="map_")
+
+# --- Vista de Tabla y Operaciones Masivas ---
+def render_bulk_table(table_df, df_promoters):
+    if 'bulk_table_version' not in st.session_state:
+        st.session_state.bulk_table_version = 0
+
+    event = st.dataframe(
+        table_df[['title', 'price', 'location_text', 'promoter_name', 'property_type', 'source_portal', 'created_at']],
+        width="stretch",
+        hide_index=True,
+        column_config={
+            'title': 'Título',
+            'price': st.column_config.NumberColumn('Precio', format="$%.0f"),
+            'location_text': 'Ubicación',
+            'promoter_name': 'Promotor',
+            'property_type': 'Tipo',
+            'source_portal': 'Portal',
+            'created_at': st.column_config.DatetimeColumn('Capturada', format="YYYY-MM-DD"),
+        },
+        key=f"bulk_table_{st.session_state.bulk_table_version}",
+        on_select="rerun",
+        selection_mode="multi-row",
+    )
+    selected_ids = table_df.iloc[event.selection.rows]['id'].tolist()
+    st.caption(f"{len(selected_ids)} propiedad(es) seleccionada(s)")
+
+    def finish_bulk_operation():
+        # Una nueva llave limpia la selección de la tabla
+        st.session_state.bulk_table_version += 1
+        st.rerun()
+
+    promoter_options = {NO_PROMOTER: None, **dict(zip(df_promoters['name'], df_promoters['id']))}
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        new_promoter = st.selectbox("Reasignar a", options=list(promoter_options.keys()))
+        if st.button("👤 Reasignar promotor", disabled=not selected_ids, width="stretch"):
+            changes = {'promoter_id': promoter_options[new_promoter]}
+            write_queue.update_many("properties", selected_ids, changes, session_id)
+            property_cache.apply_update_many(selected_ids, changes)
+            finish_bulk_operation()
+    with col2:
+        new_property_type = st.selectbox("Cambiar tipo a", options=PROPERTY_TYPES)
+        if st.button("🏷️ Cambiar tipo", disabled=not selected_ids, width="stretch"):
+            changes = {'property_type': new_property_type}
+            write_queue.update_many("properties", selected_ids, changes, session_id)
+            property_cache.apply_update_many(selected_ids, changes)
+            finish_bulk_operation()
+    with col3:
+        confirm_delete = st.checkbox(f"Confirmar eliminación de {len(selected_ids)} propiedad(es)")
+        if st.button("🗑️ Eliminar seleccionadas", disabled=not (selected_ids and confirm_delete), width="stretch"):
+            write_queue.delete_many("properties", selected_ids, session_id)
+            property_cache.apply_delete(selected_ids)
+            finish_bulk_operation()
+
+# --- Filtro por Ubicación ---
+AREA_MODES = ["Sin filtro", "Radio", "Polígono"]
+
+def parse_polygon(text):
+    # "lat, lon" por línea -> [(lat, lon), ...] y las líneas que no se pudieron leer
+    polygon, invalid_lines = [], []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            latitude, longitude = (float(value) for value in line.replace(";", ",").split(","))
+            polygon.append((latitude, longitude))
+        except ValueError:
+            invalid_lines.append(line.strip())
+    return polygon, invalid_lines
 
 # --- UI de la Aplicación ---
 st.title("🏠 Dashboard de Propiedades")
 
-df_properties, df_promoters = load_data()
-
-if df_properties.empty:
+show_write_status(write_queue)
+
+with profiler.phase("promotores"):
+    df_promoters = load_promoters(write_queue.generation("promoters"))
+
+# Mientras la caché local no esté lista, los filtros y la paginación se
+# resuelven en el servidor.
+with profiler.phase("caché local"):
+    property_cache.ensure_synced()
+    filter_index = property_cache.filter_index()
+    df_cached = filter_index.df if filter_index is not None else None
+    # Los duplicados y el índice de búsqueda se actualizan en segundo plano
+    # sobre la caché local
+    cache_follower.ensure_synced(df_cached)
+with profiler.phase("opciones de filtros"):
+    if df_cached is not None:
+        portals, property_type_options, max_available_price = filter_options(df_cached)
+    else:
+        portals, property_type_options, max_available_price = load_filter_options()
+
+if not portals:
     st.warning("No se encontraron propiedades en la base de datos. ¡Empieza a capturar con la extensión!")
 else:
     st.header("Filtros")
+    # Búsqueda de texto en título, descripción y ubicación: índice BM25 local
+    # o tsvector en el servidor
+    search_query = st.text_input(
+        "Buscar", key="search_query", placeholder="p. ej. casa con alberca en Zapopan",
+    )
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
         # Filtro por portal
-        portals = df_properties['source_portal'].unique()
         selected_portal = st.multiselect("Portal de Origen", options=portals, default=portals)
 
     with col2:
         # Filtro por promotor
-        promoter_list = pd.concat([pd.DataFrame([{'name': 'Sin Promotor'}]), df_promoters[['name']]], ignore_index=True)
+        promoter_list = pd.concat([pd.DataFrame([{'name': NO_PROMOTER}]), df_promoters[['name']]], ignore_index=True)
         selected_promoters = st.multiselect("Promotor", options=promoter_list['name'].unique(), default=promoter_list['name'].unique())
     
     with col3:
         # Filtro por tipo de propiedad
-        property_types = ['Todos'] + sorted(df_properties['property_type'].dropna().unique().tolist())
+        property_types = ['Todos'] + property_type_options
         selected_property_type = st.selectbox("Tipo de Propiedad", options=property_types, index=0)
         
     with col4:
         # Filtro para excluir fraccionamientos
         exclude_fraccionamientos = st.checkbox("Excluir Fraccionamientos", value=True)
+        # Requiere la caché local: los grupos de duplicados se calculan sobre ella
+        collapse_duplicate_listings = st.checkbox(
+            "Agrupar duplicados", value=False, disabled=df_cached is None,
+            help="Muestra un solo anuncio por inmueble cuando aparece en varios portales.",
+        )
     
     # Filtro por rango de precio (debajo de las otras columnas)
     min_price, max_price = st.slider(
         "Rango de Precio (MXN)",
         min_value=0,
-        max_value=int(df_properties['price'].max() or 0),
-        value=(0, int(df_properties['price'].max() or 0))
+        max_value=int(max_available_price),
+        value=(0, int(max_available_price))
     )
 
+    # Filtro por ubicación: índice espacial local o PostGIS en el servidor
+    st.session_state.setdefault('area_latitude', DEFAULT_CENTER[0])
+    st.session_state.setdefault('area_longitude', DEFAULT_CENTER[1])
+    area_mode = st.radio("Ubicación", options=AREA_MODES, horizontal=True, key="area_mode")
+    area = None
+    if area_mode == "Radio":
+        area_col1, area_col2, area_col3 = st.columns(3)
+        center_latitude = area_col1.number_input("Latitud", format="%.6f", key="area_latitude")
+        center_longitude = area_col2.number_input("Longitud", format="%.6f", key="area_longitude")
+        radius_km = area_col3.number_input("Radio (km)", min_value=0.1, max_value=50.0, value=1.0, step=0.5, key="area_radius_km")
+        area = {'latitude': center_latitude, 'longitude': center_longitude, 'radius_m': radius_km * 1000}
+    elif area_mode == "Polígono":
+        polygon_text = st.text_area(
+            "Vértices del polígono", key="area_polygon",
+            placeholder="Un vértice por línea: latitud, longitud\n20.68, -103.39\n20.70, -103.36\n20.66, -103.35",
+        )
+        polygon, invalid_lines = parse_polygon(polygon_text)
+        if invalid_lines:
+            st.warning(f"Líneas ignoradas (se espera 'latitud, longitud'): {', '.join(invalid_lines)}")
+        if len(polygon) >= 3:
+            area = {'polygon': polygon}
+        elif polygon_text.strip():
+            st.info("El polígono necesita al menos 3 vértices.")
+
     if st.button("🔄 Recargar Datos"):
+        property_cache.poll()
         st.cache_data.clear()
         st.rerun()
 
-    # Aplicar filtros
-    filtered_df = df_properties[
-        (df_properties['source_portal'].isin(selected_portal)) &
-        (df_properties['promoter_name'].isin(selected_promoters)) &
-        (df_properties['price'] >= min_price) &
-        (df_properties['price'] <= max_price) &
-        ((selected_property_type == 'Todos') | (df_properties['property_type'] == selected_property_type)) &
-        (~df_properties['title'].str.contains('fraccionamiento', case=False, na=False) | ~exclude_fraccionamientos)
-    ]
-
-    st.header(f"Propiedades Encontradas: {len(filtered_df)}")
+    # Filtros que se aplican en el servidor. Un filtro con todas las
+    # opciones seleccionadas no se envía.
+    all_promoters_selected = set(selected_promoters) >= set(promoter_list['name'])
+    filters = {
+        'portals': None if set(selected_portal) >= set(portals) else list(selected_portal),
+        'promoter_ids': None if all_promoters_selected else df_promoters.loc[df_promoters['name'].isin(selected_promoters), 'id'].tolist(),
+        'include_no_promoter': NO_PROMOTER in selected_promoters,
+        'property_type': None if selected_property_type == 'Todos' else selected_property_type,
+        'min_price': min_price,
+        'max_price': max_price,
+        'exclude_fraccionamientos': exclude_fraccionamientos,
+        'area': area,
+        'search': search_query.strip() or None,
+    }
+
+    with profiler.phase("filtrado"):
+        sort_options = SORT_OPTIONS
+        if df_cached is not None:
+            filtered_df = filter_index.filter(**{name: value for name, value in filters.items() if name != 'search'})
+            if filters['search'] is not None:
+                ids, scores = search_index.search(search_query)
+                relevance = pd.Series(scores, index=pd.Index(ids, dtype=object)).reindex(filtered_df['id'])
+                filtered_df = filtered_df.assign(relevance=relevance.to_numpy())[relevance.notna().to_numpy()]
+                sort_options = {**RELEVANCE_SORT, **SORT_OPTIONS}
+                if not cache_follower.ready:
+                    st.caption("🔍 Indexando descripciones; los resultados de la búsqueda se completan en segundo plano.")
+            if collapse_duplicate_listings:
+                filtered_df = collapse_duplicates(filtered_df, duplicate_tracker.groups)
+                if not cache_follower.ready:
+                    st.caption("🔍 Buscando duplicados; los grupos se completan en segundo plano.")
+            total_properties = len(filtered_df)
+        else:
+            try:
+                total_properties = load_count(filters, write_queue.generation("properties"))
+            except Exception as e:
+                server_only = [name for name in ('search', 'area') if filters[name] is not None]
+                if not server_only or not is_missing_object(e):
+                    raise
+                st.warning(
+                    "La búsqueda de texto o por ubicación en el servidor no está disponible "
+                    f"(¿falta text_search.sql o spatial_search.sql?): {e}"
+                )
+                for name in server_only:
+                    filters[name] = None
+                total_properties = load_count(filters, write_queue.generation("properties"))
+    st.header(f"Propiedades Encontradas: {total_properties}")
+
+    # --- Paginación y Orden ---
+    view_mode = st.radio("Vista", options=["Tarjetas", "Tabla"], horizontal=True)
+    sort_col, size_col, page_col = st.columns([2, 1, 1])
+    with sort_col:
+        sort_label = st.selectbox("Ordenar por", options=list(sort_options.keys()), index=0)
+    with size_col:
+        if view_mode == "Tabla":
+            page_size = TABLE_PAGE_SIZE
+            st.selectbox("Propiedades por página", options=[TABLE_PAGE_SIZE], disabled=True)
+        else:
+            page_size = st.selectbox("Propiedades por página", options=PAGE_SIZE_OPTIONS, index=0)
+
+    total_pages = max(1, -(-total_properties // page_size))
+    with page_col:
+        page_number = st.number_input("Página", min_value=1, max_value=total_pages, value=1, step=1)
+
+    sort_column, sort_ascending = sort_options[sort_label]
+    page_start = (page_number - 1) * page_size
+    with profiler.phase("página"):
+        if df_cached is not None:
+            page_df = filtered_df.sort_values([sort_column, 'id'], ascending=[sort_ascending, True], na_position='last').iloc[page_start:page_start + page_size]
+            page_df = add_promoter_names(page_df, df_promoters)
+        else:
+            page_df = load_data(filters, sort_column, sort_ascending, page_start, page_size, write_queue.generation("properties"))
+
+    st.caption(f"Mostrando {page_start + 1 if len(page_df) else 0}–{page_start + len(page_df)} de {total_properties} (página {page_number} de {total_pages})")
     st.markdown("---")
 
-    # --- Vista de Tarjetas ---
-    for _, row in filtered_df.iterrows():
-        with st.container(border=True):
-            col1, col2 = st.columns([1, 2])
-
-            with col1:
-                # Foto principal
-                if row['photos'] and len(row['photos']) > 0:
-                    st.image(row['photos'][0], use_container_width=True)
-                else:
-                    # Placeholder si no hay foto
-                    st.image("https://via.placeholder.com/400x300.png?text=Sin+Foto", use_container_width=True)
-
-            with col2:
-                # --- Título y Precio ---
-                title_col, price_col = st.columns([3, 1])
-                with title_col:
-                    st.subheader(row['title'] or "Sin Título")
-                with price_col:
-                    price_str = f"${row['price']:,.0f}" if pd.notna(row['price']) else "N/A"
-                    st.markdown(f"<h3 style='text-align: right; color: #28a745;'>{price_str}</h3>", unsafe_allow_html=True)
-
-                # --- Ubicación y Promotor ---
-                st.markdown(f"**📍 {row['location_text'] or 'Ubicación no especificada'}**")
-                st.markdown(f"**👤 Promotor:** {row['promoter_name']}")
-
-                # --- Métricas Compactas ---
-                def create_metric_string(value, unit):
-                    # Helper to format metric strings, handling None, NaN, or 0 values
-                    return f"{int(value)} {unit}" if pd.notna(value) and value != 0 else "N/A"
-
-                # First row of metrics
-                metrics_col1, metrics_col2, metrics_col3, metrics_col4 = st.columns(4)
-                metrics_col1.markdown(f"**Constr:**<br>{create_metric_string(row.get('construction_area_m2'), 'm²')}", unsafe_allow_html=True)
-                metrics_col2.markdown(f"**Terreno:**<br>{create_metric_string(row.get('land_area_m2'), 'm²')}", unsafe_allow_html=True)
-                metrics_col3.markdown(f"**Recámaras:**<br>{create_metric_string(row.get('bedrooms'), '🛏️')}", unsafe_allow_html=True)
-                metrics_col4.markdown(f"**Niveles:**<br>{create_metric_string(row.get('levels'), '🏢')}", unsafe_allow_html=True)
-
-                # Second row of metrics
-                metrics_col5, metrics_col6, metrics_col7, _ = st.columns(4) # Use a throwaway for alignment
-                metrics_col5.markdown(f"**Baños:**<br>{create_metric_string(row.get('full_bathrooms'), '🚽')}", unsafe_allow_html=True)
-                metrics_col6.markdown(f"**1/2 Baños:**<br>{create_metric_string(row.get('half_bathrooms'), '🚻')}", unsafe_allow_html=True)
-                metrics_col7.markdown(f"**Estac:**<br>{create_metric_string(row.get('parking_spaces'), '🚗')}", unsafe_allow_html=True)
-
-                # --- Botones de Acción ---
-                action_col1, action_col2, action_col3 = st.columns(3)
-                action_col1.link_button("Ver Anuncio", row['property_url'], use_container_width=True)
-                if action_col2.button("✏️ Editar", key=f"edit_{row['id']}", use_container_width=True):
-                    st.session_state.property_to_edit = row.to_dict()
-                    st.session_state.df_promoters_for_dialog = df_promoters # Guardar promotores para el diálogo
-                    st.rerun()
-                if action_col3.button("🗑️ Eliminar", key=f"delete_{row['id']}", use_container_width=True):
-                    st.session_state.property_to_delete = row
-
-            # Expander para más detalles y galería
-            with st.expander("Ver más detalles y galería de fotos"):
-                st.markdown("**Descripción**")
-                st.write(row['description'] or "Sin descripción.")
-                # Mostrar niveles si existe el dato
-                if pd.notna(row['levels']) and row['levels'] > 0:
-                    st.markdown("**Características adicionales**")
-                    st.metric("Niveles", int(row['levels']))
-
-                # Mapa de ubicación
-                if pd.notna(row['latitude']) and pd.notna(row['longitude']):
-                    st.markdown("**Ubicación en el Mapa**")
-                    map_df = pd.DataFrame({'lat': [row['latitude']], 'lon': [row['longitude']]})
-                    st.map(map_df, zoom=14)
-
-                # Galería de fotos con opción de seleccionar principal
-                if row['photos'] and len(row['photos']) > 1:
-                    st.markdown("**Galería**")
-                    # Crear una cuadrícula para la galería
-                    cols = st.columns(4)
-                    for i, photo_url in enumerate(row['photos']):
-                        col_index = i % 4
-                        with cols[col_index]:
-                            st.image(photo_url, use_container_width=True)
-                            # No mostrar el botón para la imagen que ya es principal
-                            if i > 0:
-                                if st.button("Establecer como principal", key=f"set_main_{row['id']}_{i}", use_container_width=True):
-                                    # Reordenar la lista de fotos
-                                    new_photos_order = [photo_url] + [p for p in row['photos'] if p != photo_url]
-                                    try:
-                                        # Actualizar en Supabase
-                                        supabase_client.from_("properties").update({"photos": new_photos_order}).eq("id", row['id']).execute()
-                                        st.toast("Imagen principal actualizada.")
-                                        st.cache_data.clear()
-                                        st.rerun()
-                                    except Exception as e:
-                                        st.error(f"Error al actualizar: {e}")
+    # El mapa se construye solo mientras su expander está abierto
+    results_map = st.expander("🗺️ Mapa de resultados", key="results_map_open", on_change="rerun")
+    if results_map.open:
+        with results_map, profiler.phase("mapa"):
+            render_results_map(filtered_df if df_cached is not None else page_df, df_promoters)
+
+    if view_mode == "Tabla":
+        with profiler.phase("tabla"):
+            render_bulk_table(page_df, df_promoters)
+    else:
+        # --- Vista de Tarjetas ---
+        # Solo se materializa la página visible
+        with profiler.phase("tarjetas"):
+            thumbnails.prefetch(page_df['main_photo'].dropna().tolist(), 'card')
+            for _, row in page_df.iterrows():
+                render_property_card(row, df_promoters)
+
+profiler.commit(rerun_trace, finished=True)
@@ -0,0 +1,481 @@
+"""Copias de seguridad incrementales de properties y promoters.
+
+Reemplaza el pg_dump completo de estas tablas en backup_supabase.sh. Cada
+`export` descarga solo las filas modificadas desde la marca de agua
+anterior (updated_at, id), por bloques con paginación por llave, y las
+escribe a medida que llegan como un segmento comprimido: Parquet (zstd) o
+JSONL (gzip). Las eliminaciones se guardan como segmentos de ids. `compact`
+junta los segmentos anteriores a la retención en una instantánea completa,
+así que mientras tanto se puede restaurar cualquier momento intermedio.
+
+    python backup.py export --dir ../backups
+    python backup.py compact --dir ../backups --retain-days 7
+    python backup.py status --dir ../backups
+    python backup.py restore --dir ../backups --url http://localhost:54321 --key ...
+    python backup.py restore --dir ../backups --at 2026-10-01T03:00 --output ../restaurado
+
+`restore` sube las filas con upsert (las que no están en la copia no se
+tocan) o las escribe como un archivo por tabla. `open_backup` carga la copia
+en el dashboard como fuente de datos sin conexión, con `[offline]
+backup_dir` en secrets.toml. --url/--key (o SUPABASE_URL y SUPABASE_KEY)
+aceptan cualquier PostgREST, p. ej. el Postgres local de `supabase start`.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from memory_client import MemoryClient, promoter_summaries
+from queries import quote_filter_value
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Tabla -> columna de la marca de agua, en el orden en que se restauran
+# (properties referencia a promoters). promoters no tiene updated_at y es
+# pequeña: se descarga completa y se compara con la copia.
+TABLES = {'promoters': None, 'properties': 'updated_at'}
+# Columnas de cada tabla (promoters_schema.sql y las migraciones
+# add_*_to_properties.sql), para las tablas que la copia tiene vacías
+TABLE_COLUMNS = {
+    'promoters': ['id', 'name', 'company', 'phone', 'email'],
+    'properties': [
+        'id', 'created_at', 'updated_at', 'source_portal', 'property_url', 'title', 'description', 'price',
+        'location_text', 'latitude', 'longitude', 'land_area_m2', 'construction_area_m2', 'bedrooms',
+        'full_bathrooms', 'half_bathrooms', 'parking_spaces', 'levels', 'photos', 'promoter_id',
+        'property_type', 'listing_type', 'publication_date', 'days_on_market', 'ad_type',
+    ],
+}
+# Columnas generadas por la base (text_search.sql, spatial_search.sql): no se
+# guardan y no se pueden escribir al restaurar
+GENERATED_COLUMNS = {'properties': {'search_vector', 'location'}}
+
+FORMATS = {'parquet': ".parquet", 'jsonl': ".jsonl.gz"}
+# Filas por petición (límite de PostgREST) y por escritura al restaurar
+PAGE_SIZE = 1000
+UPSERT_CHUNK_SIZE = 500
+# Ids por filtro in_("id", ...), para no exceder el largo de la URL
+ID_CHUNK_SIZE = 200
+# Las filas modificadas en los últimos segundos quedan para la siguiente
+# exportación: updated_at es la hora de inicio de la transacción, así que una
+# transacción aún abierta podría confirmar filas anteriores a la marca de agua
+SETTLE_SECONDS = 60
+DEFAULT_RETAIN_DAYS = 7
+
+
+# --- Segmentos ---
+
+class SegmentWriter:
+    """Escribe las filas de un segmento por bloques, sin guardarlas en memoria.
+
+    En Parquet cada bloque es un grupo de filas; si un bloque no cabe en el
+    esquema del archivo (p. ej. una columna que era toda nula) se empieza
+    otra parte con el esquema nuevo.
+    """
+
+    def __init__(self, directory, table, kind, file_format):
+        self.directory = Path(directory)
+        self.table = table
+        self.kind = kind
+        self.file_format = file_format
+        self.stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        self.files = []
+        self.rows = 0
+        self._writer = None
+
+    def _open(self):
+        name = f"{self.table}/{self.kind}-{self.stamp}-{len(self.files):03d}{FORMATS[self.file_format]}"
+        (self.directory / self.table).mkdir(parents=True, exist_ok=True)
+        self.files.append(name)
+        return self.directory / name
+
+    def write(self, rows):
+        if not rows:
+            return
+        self.rows += len(rows)
+        if self.file_format == 'jsonl':
+            if self._writer is None:
+                self._writer = gzip.open(self._open(), "wt", encoding="utf-8")
+            for row in rows:
+                self._writer.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            return
+        batch = pa.Table.from_pylist(rows)
+        if self._writer is not None:
+            try:
+                batch = batch.cast(self._writer.schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError):
+                self._writer.close()
+                self._writer = None
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._open(), batch.schema, compression="zstd")
+        self._writer.write_table(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        return self.files
+
+
+def read_rows(path, columns=None):
+    """Filas de un archivo de segmento como diccionarios."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pq.read_table(path, columns=columns).to_pylist()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    return [{column: row.get(column) for column in columns} for row in rows] if columns else rows
+
+
+# --- Manifiesto ---
+
+def read_manifest(directory):
+    path = Path(directory) / MANIFEST
+    if not path.exists():
+        return {'version': MANIFEST_VERSION, 'tables': {}}
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Versión de manifiesto no soportada: {manifest.get('version')}")
+    return manifest
+
+
+def write_manifest(directory, manifest):
+    # Se reemplaza de una vez: una exportación interrumpida deja archivos
+    # sueltos, pero nunca un manifiesto a medias
+    path = Path(directory) / MANIFEST
+    temporary = path.with_suffix(".tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temporary, path)
+
+
+def _segments(entry, at=None):
+    # Segmentos que forman el estado de la tabla en `at` (todos si es None)
+    segments = entry['segments']
+    if at is None:
+        return segments
+    at = _utc(at)
+    selected = [segment for segment in segments if _utc(segment['created_at']) <= at]
+    if segments and not selected:
+        raise ValueError(f"La copia más antigua de la tabla es del {segments[0]['created_at']}")
+    return selected
+
+
+def _utc(value):
+    value = datetime.fromisoformat(value) if isinstance(value, str) else value
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _table_ids(directory, segments):
+    ids = set()
+    for segment in segments:
+        for name in segment['files']:
+            segment_ids = (row['id'] for row in read_rows(Path(directory) / name, columns=['id']))
+            if segment['kind'] == 'deletes':
+                ids.difference_update(segment_ids)
+            else:
+                ids.update(segment_ids)
+    return ids
+
+
+def _table_rows(directory, segments):
+    rows = {}
+    for segment in segments:
+        for name in segment['files']:
+            segment_rows = read_rows(Path(directory) / name)
+            if segment['kind'] == 'deletes':
+                for row in segment_rows:
+                    rows.pop(row['id'], None)
+            else:
+                rows.update((row['id'], row) for row in segment_rows)
+    return rows
+
+
+def load_tables(directory, at=None):
+    """Filas de cada tabla según la copia: {tabla: [fila, ...]}, en el momento `at` si se da."""
+    manifest = read_manifest(directory)
+    return {
+        table: list(_table_rows(directory, _segments(entry, at)).values())
+        for table, entry in manifest['tables'].items()
+    }
+
+
+# --- Exportación ---
+
+def _fetch_changes(client, table, column, last_key, cutoff):
+    # Paginación por llave (updated_at, id) desde la marca de agua, como
+    # PropertyCache._fetch_since, pero entregando cada página al llegar
+    while True:
+        query = client.from_(table).select("*").lt(column, cutoff)
+        if last_key is not None:
+            ts, row_id = quote_filter_value(last_key[0]), quote_filter_value(last_key[1])
+            query = query.or_(f"{column}.gt.{ts},and({column}.eq.{ts},id.gt.{row_id})")
+        batch = query.order(column).order("id").limit(PAGE_SIZE).execute().data or []
+        if batch:
+            yield batch
+            last_key = [batch[-1][column], batch[-1]['id']]
+        if len(batch) < PAGE_SIZE:
+            return
+
+
+def _fetch_all(client, table, columns="*"):
+    last_id = None
+    while True:
+        query = client.from_(table).select(columns)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        batch = query.order("id").limit(PAGE_SIZE).execute().data or []
+        if batch:
+            yield batch
+            last_id = batch[-1]['id']
+        if len(batch) < PAGE_SIZE:
+            return
+
+
+def _fetch_ids(client, table, ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        batch = client.from_(table).select("*").in_("id", ids[start:start + ID_CHUNK_SIZE]).execute().data or []
+        if batch:
+            yield batch
+
+
+def _strip_generated(table, rows):
+    generated = GENERATED_COLUMNS.get(table, ())
+    return [{column: value for column, value in row.items() if column not in generated} for row in rows]
+
+
+def _segment(writer, created_at):
+    # Entrada del manifiesto; None si no se escribió ninguna fila
+    writer.close()
+    if not writer.rows:
+        return None
+    return {'kind': writer.kind, 'created_at': created_at, 'rows': writer.rows, 'files': writer.files}
+
+
+def _export_changes(client, directory, table, column, entry, file_format, now):
+    # Filas modificadas desde la marca de agua, escritas al llegar
+    cutoff = (now - timedelta(seconds=SETTLE_SECONDS)).isoformat()
+    kind = 'delta' if entry['segments'] else 'snapshot'
+    writer = SegmentWriter(directory, table, kind, file_format)
+    last_key = entry.get('watermark')
+    exported_ids = set()
+    try:
+        for batch in _fetch_changes(client, table, column, last_key, cutoff):
+            writer.write(_strip_generated(table, batch))
+            exported_ids.update(row['id'] for row in batch)
+            last_key = [batch[-1][column], batch[-1]['id']]
+    finally:
+        writer.close()
+    segment = _segment(writer, now.isoformat())
+    segments = [segment] if segment else []
+
+    # Las eliminaciones no dejan rastro en updated_at, y una transacción larga
+    # puede confirmar filas con updated_at anterior a la marca de agua; solo
+    # si el conteo no coincide se descarga la lista de ids
+    local_ids = _table_ids(directory, entry['segments']) | exported_ids
+    remote_count = client.from_(table).select("id", count="exact", head=True).execute().count or 0
+    if remote_count != len(local_ids):
+        remote_ids = {row['id'] for batch in _fetch_all(client, table, "id") for row in batch}
+        writer = SegmentWriter(directory, table, 'delta' if entry['segments'] or segments else 'snapshot', file_format)
+        try:
+            for batch in _fetch_ids(client, table, remote_ids - local_ids):
+                writer.write(_strip_generated(table, batch))
+        finally:
+            writer.close()
+        segment = _segment(writer, now.isoformat())
+        segments += [segment] if segment else []
+        segments += _export_deletes(directory, table, local_ids - remote_ids, file_format, now)
+    return segments, last_key
+
+
+def _export_compared(client, directory, table, entry, file_format, now):
+    # Tablas sin marca de agua: se descargan completas y solo se guardan las
+    # filas distintas a las de la copia
+    current = _table_rows(directory, entry['segments'])
+    writer = SegmentWriter(directory, table, 'delta' if entry['segments'] else 'snapshot', file_format)
+    remote_ids = set()
+    try:
+        for batch in _fetch_all(client, table):
+            batch = _strip_generated(table, batch)
+            remote_ids.update(row['id'] for row in batch)
+            writer.write([row for row in batch if current.get(row['id']) != row])
+    finally:
+        writer.close()
+    segment = _segment(writer, now.isoformat())
+    segments = [segment] if segment else []
+    return segments + _export_deletes(directory, table, current.keys() - remote_ids, file_format, now), None
+
+
+def _export_deletes(directory, table, ids, file_format, now):
+    writer = SegmentWriter(directory, table, 'deletes', file_format)
+    for start in range(0, len(ids), PAGE_SIZE):
+        writer.write([{'id': row_id} for row_id in sorted(ids)[start:start + PAGE_SIZE]])
+    segment = _segment(writer, now.isoformat())
+    return [segment] if segment else []
+
+
+def export(client, directory, file_format="parquet", tables=None):
+    """Agrega a la copia de `directory` los cambios de cada tabla. Devuelve {tabla: segmentos nuevos}."""
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(directory)
+    added = {}
+    for table in tables or TABLES:
+        entry = manifest['tables'].setdefault(table, {'watermark': None, 'segments': []})
+        now = datetime.now(timezone.utc)
+        if TABLES[table]:
+            segments, watermark = _export_changes(client, directory, table, TABLES[table], entry, file_format, now)
+        else:
+            segments, watermark = _export_compared(client, directory, table, entry, file_format, now)
+        entry['segments'] += segments
+        entry['watermark'] = watermark
+        entry['exported_at'] = now.isoformat()
+        # Cada tabla se confirma por separado
+        write_manifest(directory, manifest)
+        added[table] = segments
+    return added
+
+
+# --- Compactación ---
+
+def compact(directory, retain_days=DEFAULT_RETAIN_DAYS, file_format="parquet"):
+    """Junta los segmentos anteriores a `retain_days` en una instantánea y borra sus archivos.
+
+    Los segmentos más recientes se conservan, así que `restore --at` puede
+    volver a cualquier exportación de los últimos `retain_days` días.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retain_days)
+    manifest = read_manifest(directory)
+    removed = []
+    for table, entry in manifest['tables'].items():
+        old = [segment for segment in entry['segments'] if _utc(segment['created_at']) < cutoff]
+        if len(old) <= 1 and all(segment['kind'] == 'snapshot' for segment in old):
+            continue
+        rows = list(_table_rows(directory, old).values())
+        writer = SegmentWriter(directory, table, 'snapshot', file_format)
+        for start in range(0, len(rows), PAGE_SIZE):
+            writer.write(rows[start:start + PAGE_SIZE])
+        # La instantánea representa el estado del último segmento que reemplaza
+        snapshot = _segment(writer, old[-1]['created_at'])
+        entry['segments'] = ([snapshot] if snapshot else []) + entry['segments'][len(old):]
+        removed += [name for segment in old for name in segment['files']]
+    if removed:
+        write_manifest(directory, manifest)
+        for name in removed:
+            (Path(directory) / name).unlink(missing_ok=True)
+    return removed
+
+
+# --- Restauración ---
+
+def restore(client, tables, chunk_size=UPSERT_CHUNK_SIZE):
+    """Sube las filas de `tables` (ver `load_tables`) con upsert por id, en el orden de TABLES."""
+    for table in TABLES:
+        rows = tables.get(table, [])
+        for start in range(0, len(rows), chunk_size):
+            client.from_(table).upsert(rows[start:start + chunk_size], on_conflict="id").execute()
+
+
+def write_tables(tables, directory, file_format="parquet"):
+    """Escribe cada tabla restaurada en un solo archivo de `directory`."""
+    files = []
+    for table, rows in tables.items():
+        writer = SegmentWriter(directory, table, 'restored', file_format)
+        for start in range(0, len(rows), PAGE_SIZE):
+            writer.write(rows[start:start + PAGE_SIZE])
+        files += writer.close()
+    return files
+
+
+def open_backup(directory, at=None):
+    """Cliente de solo lectura con la interfaz de supabase-py sobre la copia de `directory`.
+
+    Permite usar el dashboard sin conexión; `backup_at` es la fecha de la
+    última exportación incluida. Las tablas vacías o sin exportar conservan
+    sus columnas (TABLE_COLUMNS).
+    """
+    manifest = read_manifest(directory)
+    entries = list(manifest['tables'].values())
+    if not entries:
+        raise ValueError(f"No hay copias de seguridad en {directory}")
+    tables = load_tables(directory, at)
+    client = MemoryClient(
+        {table: tables.get(table, []) for table in TABLES},
+        views={'promoter_summaries': promoter_summaries},
+        columns=TABLE_COLUMNS,
+    )
+    dates = [_utc(segment['created_at']) for entry in entries for segment in _segments(entry, at)]
+    if at is None:
+        dates += [_utc(entry['exported_at']) for entry in entries if entry.get('exported_at')]
+    client.backup_at = max(dates) if dates else _utc(at)
+    return client
+
+
+# --- Línea de comandos ---
+
+def _client(args):
+    from supabase import create_client
+
+    url = args.url or os.environ.get("SUPABASE_URL")
+    key = args.key or os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        sys.exit("Faltan --url y --key (o las variables SUPABASE_URL y SUPABASE_KEY).")
+    return create_client(url, key)
+
+
+def print_status(directory):
+    manifest = read_manifest(directory)
+    if not manifest['tables']:
+        print(f"No hay copias de seguridad en {directory}")
+    for table, entry in manifest['tables'].items():
+        size = sum((Path(directory) / name).stat().st_size for s in entry['segments'] for name in s['files'])
+        print(f"\n{table}: {len(entry['segments'])} segmentos, {size / 1024 / 1024:.1f} MB, marca de agua {entry['watermark']}")
+        for segment in entry['segments']:
+            print(f"  {segment['created_at']}  {segment['kind']:<8} {segment['rows']:>9} filas  {len(segment['files'])} archivo(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copias de seguridad incrementales de properties y promoters.")
+    parser.add_argument("command", choices=["export", "compact", "status", "restore"])
+    parser.add_argument("--dir", required=True, help="Directorio de la copia de seguridad")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet", help="Formato de los archivos nuevos")
+    parser.add_argument("--url", help="URL de Supabase/PostgREST (o SUPABASE_URL)")
+    parser.add_argument("--key", help="Llave de Supabase (o SUPABASE_KEY)")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), help="Tablas a exportar (todas por omisión)")
+    parser.add_argument("--retain-days", type=float, default=DEFAULT_RETAIN_DAYS,
+                        help="compact: días de segmentos que se conservan sin juntar")
+    parser.add_argument("--at", help="restore: fecha y hora (ISO, UTC) del estado a restaurar")
+    parser.add_argument("--output", help="restore: escribe las tablas en este directorio en vez de subirlas")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        for table, segments in export(_client(args), args.dir, args.format, args.tables).items():
+            summary = ", ".join(f"{s['rows']} filas ({s['kind']})" for s in segments) or "sin cambios"
+            print(f"{table}: {summary}")
+    elif args.command == "compact":
+        removed = compact(args.dir, args.retain_days, args.format)
+        print(f"{len(removed)} archivo(s) compactados")
+    elif args.command == "status":
+        print_status(args.dir)
+    else:
+        tables = load_tables(args.dir, args.at)
+        if args.output:
+            for name in write_tables(tables, args.output, args.format):
+                print(Path(args.output) / name)
+        else:
+            restore(_client(args), tables)
+            print(", ".join(f"{table}: {len(rows)} filas" for table, rows in tables.items()))
+            # Los ids de promoters son SERIAL: la secuencia no avanza con ids explícitos
+            print("Ajusta la secuencia de promoters: "
+                  "SELECT setval('promoters_id_seq', (SELECT max(id) FROM promoters));")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""Benchmark de las rutas de datos del dashboard sobre datos sintéticos.
+
+Siembra promotores y propiedades con las columnas de promoters_schema.sql y
+las migraciones add_*_to_properties.sql y mide, para cada tamaño: la carga
+de la caché local, el conteo y la página del servidor (`load_data`), el
+índice de filtros y los filtros típicos, el orden y la paginación, y las
+ejecuciones completas de la página de propiedades (por fase) y de la de
+promotores. Por cada caso se reportan tiempo (mediana), memoria máxima de
+Python (tracemalloc), bytes recibidos y peticiones.
+
+Por omisión usa un cliente en memoria (memory_client.py, sin red; con
+--latency-ms se simula la latencia por petición). Con --url/--key corre
+contra un Postgres + PostgREST local (p. ej. `supabase start` con el
+esquema y las migraciones aplicados); --seed llena la base si está vacía.
+
+    python benchmark.py --sizes 1000 10000 100000
+    python benchmark.py --save-baseline        # guarda benchmark_baseline.json
+    python benchmark.py --check                # sale con 1 si hay regresiones
+
+Los tiempos dependen de la máquina: se escalan con una calibración (un
+trabajo fijo de pandas y Python medido en cada ejecución) y solo se
+comparan si la línea base se generó en el mismo entorno (Python, pandas,
+procesador, backend y latencia); la memoria y los bytes se comparan siempre.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+from PIL import Image, ImageDraw
+
+from benchmark_dedup import PORTALS, ZONES, generate
+from filter_index import PropertyFilterIndex
+from memory_client import MemoryClient, promoter_summaries
+from profiling import InstrumentedClient, Profiler
+from property_cache import PropertyCache
+from queries import PROPERTY_TYPES, add_promoter_names, count_properties, fetch_property_page
+
+DASHBOARD_DIR = Path(__file__).parent
+BASELINE_PATH = DASHBOARD_DIR / "benchmark_baseline.json"
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Regresión: el valor nuevo supera la línea base por más de este factor
+TOLERANCES = {'seconds': 1.5, 'peak_mb': 1.25, 'payload_bytes': 1.05}
+# Diferencias de tiempo menores a esto son ruido
+MIN_SECONDS_DELTA = 0.005
+# Ejecuciones mínimas por caso con --check (la mediana de pocas es ruidosa)
+MIN_CHECK_REPEAT = 5
+DEFAULT_REPEAT = 3
+
+PHOTO_COUNT = 8
+# Host de las URLs de fotos sintéticas; `photo_fetcher` las lee del disco
+PHOTO_HOST = "https://fotos.benchmark.invalid"
+START_DATE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# Filtros de la página de propiedades al abrirla (todas las opciones) y
+# combinaciones típicas
+DEFAULT_FILTERS = {
+    'portals': None,
+    'promoter_ids': None,
+    'include_no_promoter': True,
+    'property_type': None,
+    'min_price': 0,
+    'max_price': None,
+    'exclude_fraccionamientos': True,
+    'area': None,
+}
+FILTER_SCENARIOS = {
+    'todos': {},
+    'portal_y_precio': {'portals': PORTALS[:2], 'min_price': 2_000_000, 'max_price': 6_000_000},
+    'tipo_y_promotores': {'property_type': 'casa', 'promoter_ids': [1, 2, 3], 'include_no_promoter': False},
+    'radio_2km': {'area': {'latitude': 20.7, 'longitude': -103.35, 'radius_m': 2000}},
+}
+
+
+# --- Datos sintéticos ---
+
+def _photos(directory):
+    # Fotos locales para medir las miniaturas sin depender de la red
+    urls = []
+    for i in range(PHOTO_COUNT):
+        rng = random.Random(i)
+        image = Image.new("RGB", (640, 480), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(20):
+            x, y = rng.randrange(640), rng.randrange(480)
+            draw.rectangle([x, y, x + rng.randrange(20, 200), y + rng.randrange(20, 150)],
+                           fill=tuple(rng.randrange(256) for _ in range(3)))
+        image.save(Path(directory) / f"photo_{i}.jpg", format="JPEG", quality=85)
+        urls.append(f"{PHOTO_HOST}/photo_{i}.jpg")
+    return urls
+
+
+def photo_fetcher(directory):
+    """Función de descarga para ThumbnailCache que sirve las fotos de `_photos` desde el disco."""
+    def fetch(url):
+        if not url.startswith(f"{PHOTO_HOST}/"):
+            raise ValueError(f"URL fuera del benchmark: {url}")
+        return (Path(directory) / url.rsplit("/", 1)[1]).read_bytes()
+    return fetch
+
+
+def generate_dataset(n, photo_urls, seed=11):
+    """(promotores, propiedades) con las columnas de la base; deterministas para una misma semilla."""
+    rng = random.Random(seed)
+    promoters = [
+        {'id': i, 'name': f"Promotor {i:04d}", 'company': f"Inmobiliaria {i % 37}" if i % 3 else None,
+         'phone': f"33{rng.randrange(10**8):08d}", 'email': f"promotor{i}@example.com"}
+        for i in range(1, max(10, n // 200) + 1)
+    ]
+    properties = []
+    for record in generate(n, seed=seed):
+        created_at = START_DATE + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        publication_date = (created_at - timedelta(days=rng.randrange(200))).date()
+        title = record['title']
+        if rng.random() < 0.05:
+            title = title.replace(" en venta en ", " en venta en fraccionamiento ")
+        properties.append({
+            'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'created_at': created_at.isoformat(),
+            'updated_at': (created_at + timedelta(hours=rng.randrange(24 * 30))).isoformat(),
+            'source_portal': record['source_portal'] if rng.random() > 0.02 else None,
+            'property_url': f"https://{record['source_portal']}.example.com/propiedad/{record['id']}",
+            'title': title,
+            'description': record['description'],
+            'price': record['price'] if rng.random() > 0.03 else None,
+            'location_text': f"{next(zone for zone in ZONES if zone in record['title'])}, Jalisco",
+            'latitude': record['latitude'],
+            'longitude': record['longitude'],
+            'land_area_m2': record['land_area_m2'],
+            'construction_area_m2': record['construction_area_m2'],
+            'bedrooms': rng.randint(1, 5),
+            'full_bathrooms': rng.randint(1, 4),
+            'half_bathrooms': rng.choice([None, 0, 1]),
+            'parking_spaces': rng.randint(0, 4),
+            'levels': rng.choice([None, 1, 2, 3]),
+            'photos': rng.sample(photo_urls, rng.randint(0, 3)),
+            'promoter_id': rng.choice(promoters)['id'] if rng.random() < 0.7 else None,
+            'property_type': rng.choice(PROPERTY_TYPES[:3]),
+            'listing_type': 'venta' if rng.random() < 0.8 else 'renta',
+            'publication_date': publication_date.isoformat(),
+            'days_on_market': (created_at.date() - publication_date).days,
+            'ad_type': rng.choice(['super destacado', 'destacado', 'normal']),
+        })
+    return promoters, properties
+
+
+def create_memory_client(promoters, properties, latency=0.0):
+    return MemoryClient(
+        {'promoters': promoters, 'properties': properties},
+        views={'promoter_summaries': promoter_summaries},
+        latency=latency,
+    )
+
+
+def seed_database(client, promoters, properties, chunk_size=500):
+    count = client.from_("properties").select("id", count="exact", head=True).execute().count or 0
+    if count:
+        sys.exit(f"La tabla properties ya tiene {count} filas; --seed solo llena una base vacía.")
+    client.from_("promoters").insert(promoters).execute()
+    for start in range(0, len(properties), chunk_size):
+        client.from_("properties").insert(properties[start:start + chunk_size]).execute()
+
+
+# --- Mediciones ---
+
+def _measure(function, repeat, profiler=None):
+    # Mediana de `repeat` ejecuciones y una más con tracemalloc para la memoria
+    times = []
+    for _ in range(repeat):
+        if profiler is not None:
+            profiler.reset()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    result = {'seconds': statistics.median(times)}
+    if profiler is not None:
+        metrics = profiler.metrics()
+        result['requests'] = int(sum(s['value'] for s in metrics['hoom_supabase_requests_total']))
+        result['payload_bytes'] = int(sum(s['value'] for s in metrics['hoom_supabase_response_bytes_total']))
+    tracemalloc.start()
+    try:
+        function()
+        result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def _load_cache(client):
+    cache = PropertyCache(client)
+    cache.ensure_synced()
+    while not cache.ready:
+        if cache.last_error is not None:
+            raise cache.last_error
+        time.sleep(0.001)
+    return cache
+
+
+def _join_threads(*names):
+    # Los hilos de fondo compiten por el GIL con la ejecución que se mide
+    for thread in threading.enumerate():
+        if thread.name in names:
+            thread.join()
+
+
+def _run_page(at):
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{at.exception[0].value}\n{''.join(at.exception[0].stack_trace)}")
+
+
+def measure_pages(client, url, key, thumbnail_directory, fetch, repeat):
+    """Ejecuciones completas de las páginas con AppTest, tras la carga de la caché local.
+
+    `fetch` reemplaza la descarga de fotos de las miniaturas.
+    """
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    from session import get_profiler
+
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    results = {}
+    patch = mock.patch("supabase.create_client", lambda *args, **kwargs: client) if client is not None else nullcontext()
+    with patch, mock.patch("thumbnails.fetch_url", fetch):
+        for name, path, warmup in (
+            ('pagina:propiedades', DASHBOARD_DIR / "app.py", ("property-cache-sync", "cache-follower")),
+            ('pagina:promotores', DASHBOARD_DIR / "pages" / "1_ gestione_de_promotores.py", ()),
+        ):
+            at = AppTest.from_file(str(path), default_timeout=600)
+            at.secrets['supabase'] = {'url': url or "http://memoria", 'key': key or "memoria"}
+            at.secrets['dedup'] = {'photo_hashes': False}
+            at.secrets['thumbnails'] = {'directory': str(thumbnail_directory)}
+            # Primera ejecución: inicia la caché y los índices en segundo plano
+            _run_page(at)
+            for thread_name in warmup:
+                _join_threads(thread_name)
+                _run_page(at)
+            _run_page(at)
+
+            reruns = []
+            for _ in range(repeat):
+                _run_page(at)
+                reruns.append(get_profiler().reruns[-1])
+            results[name] = {'seconds': statistics.median(r['seconds'] for r in reruns)}
+            for phase in dict.fromkeys(p['phase'] for r in reruns for p in r['phases']):
+                durations = [sum(p['seconds'] for p in r['phases'] if p['phase'] == phase) for r in reruns]
+                results[f"{name}:{phase}"] = {'seconds': statistics.median(durations)}
+            tracemalloc.start()
+            try:
+                _run_page(at)
+                results[name]['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            finally:
+                tracemalloc.stop()
+    return results
+
+
+def run(size, args, work_directory):
+    photo_urls = _photos(work_directory)
+    promoters, properties = generate_dataset(size, photo_urls)
+    if args.url:
+        from supabase import create_client
+        raw_client = create_client(args.url, args.key)
+        if args.seed:
+            seed_database(raw_client, promoters, properties)
+    else:
+        raw_client = create_memory_client(promoters, properties, latency=args.latency_ms / 1000)
+    profiler = Profiler()
+    client = InstrumentedClient(raw_client, profiler)
+    results = {}
+
+    results['carga_cache'] = _measure(lambda: _load_cache(client), args.repeat, profiler)
+    df_cached = _load_cache(client).snapshot()
+    df_promoters = pd.DataFrame(client.from_("promoters").select("id, name").execute().data)
+
+    filters = dict(DEFAULT_FILTERS, max_price=float(df_cached['price'].max()))
+    results['load_count'] = _measure(lambda: count_properties(client, filters), args.repeat, profiler)
+    results['load_data'] = _measure(
+        lambda: add_promoter_names(fetch_property_page(client, filters, 'created_at', False, 0, 12), df_promoters),
+        args.repeat, profiler,
+    )
+
+    results['indice_filtros'] = _measure(lambda: PropertyFilterIndex(df_cached), args.repeat)
+    filter_index = PropertyFilterIndex(df_cached)
+    for scenario, changes in FILTER_SCENARIOS.items():
+        results[f'filtro:{scenario}'] = _measure(lambda: filter_index.filter(**dict(filters, **changes)), args.repeat)
+    filtered_df = filter_index.filter(**filters)
+    results['orden_y_pagina'] = _measure(
+        lambda: add_promoter_names(
+            filtered_df.sort_values(['price', 'id'], ascending=[True, True], na_position='last').iloc[:12], df_promoters
+        ),
+        args.repeat,
+    )
+
+    if not args.no_pages:
+        results.update(measure_pages(
+            raw_client if not args.url else None, args.url, args.key, Path(work_directory) / "thumbnails",
+            photo_fetcher(work_directory), args.repeat,
+        ))
+    return results
+
+
+# --- Reporte y línea base ---
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'system': platform.system(),
+    }
+
+
+def print_results(size, results):
+    print(f"\n{size} propiedades")
+    print(f"  {'caso':<42} {'ms':>10} {'MB máx.':>9} {'KB':>10} {'peticiones':>10}")
+    for case, values in results.items():
+        peak = f"{values['peak_mb']:.1f}" if 'peak_mb' in values else ""
+        payload = f"{values['payload_bytes'] / 1024:.0f}" if 'payload_bytes' in values else ""
+        print(f"  {case:<42} {values['seconds'] * 1000:>10.1f} {peak:>9} {payload:>10} {values.get('requests', ''):>10}")
+
+
+def calibrate(repeat=MIN_CHECK_REPEAT):
+    """Segundos (mediana) de un trabajo fijo de pandas y Python, para escalar los tiempos."""
+    rng = random.Random(0)
+    df = pd.DataFrame({
+        'group': [rng.choice("abcdefgh") for _ in range(100_000)],
+        'value': [rng.random() for _ in range(100_000)],
+        'key': [rng.randrange(1000) for _ in range(100_000)],
+    })
+
+    def work():
+        df.groupby('group')['value'].median()
+        df.sort_values(['key', 'value'])
+        json.loads(json.dumps(df.head(20_000).to_dict('records')))
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        work()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def compare(baseline, results, seconds_scale=1.0):
+    """Regresiones de `results` contra `baseline`: lista de textos.
+
+    Los tiempos de la línea base se multiplican por `seconds_scale`; con
+    None no se comparan.
+    """
+    regressions = []
+    for size, cases in results.items():
+        for case, values in cases.items():
+            base = baseline.get(size, {}).get(case)
+            if base is None:
+                continue
+            for metric, tolerance in TOLERANCES.items():
+                if metric not in values or not base.get(metric) or (metric == 'seconds' and seconds_scale is None):
+                    continue
+                new, old = values[metric], base[metric] * (seconds_scale if metric == 'seconds' else 1)
+                if new > old * tolerance and (metric != 'seconds' or new - old > MIN_SECONDS_DELTA):
+                    regressions.append(f"{size} filas, {case}: {metric} {old:.4g} -> {new:.4g} (x{new / old:.2f}, límite x{tolerance})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", help="tamaños (por omisión, los de la línea base o 1k/10k/100k)")
+    parser.add_argument("--repeat", type=int,
+                        help=f"ejecuciones por caso, se reporta la mediana ({DEFAULT_REPEAT}; con --check, al menos {MIN_CHECK_REPEAT})")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latencia simulada por petición del cliente en memoria")
+    parser.add_argument("--url", help="URL de un Supabase/PostgREST local en lugar del cliente en memoria")
+    parser.add_argument("--key", help="llave del Supabase local")
+    parser.add_argument("--seed", action="store_true", help="con --url, llenar la base vacía con los datos sintéticos")
+    parser.add_argument("--no-pages", action="store_true", help="omitir las ejecuciones completas de las páginas")
+    parser.add_argument("--output", type=Path, help="guardar los resultados en este archivo JSON")
+    parser.add_argument("--save-baseline", action="store_true", help=f"guardar los resultados como {BASELINE_PATH.name}")
+    parser.add_argument("--check", action="store_true", help="comparar con la línea base; sale con 1 si hay regresiones")
+    args = parser.parse_args()
+    if args.repeat is None:
+        args.repeat = MIN_CHECK_REPEAT if args.check else DEFAULT_REPEAT
+    elif args.check and args.repeat < MIN_CHECK_REPEAT:
+        parser.error(f"--check necesita --repeat {MIN_CHECK_REPEAT} o más")
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else None
+    sizes = args.sizes or ([int(size) for size in baseline['results']] if args.check and baseline else DEFAULT_SIZES)
+    if args.url and len(sizes) > 1:
+        parser.error("con --url la base tiene un solo tamaño; indica uno con --sizes")
+
+    calibration_seconds = calibrate()
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="hoom-benchmark-") as work_directory:
+        for size in sizes:
+            results[str(size)] = run(size, args, work_directory)
+            print_results(size, results[str(size)])
+
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'environment': dict(environment(), backend='postgrest' if args.url else 'memory'),
+        'latency_ms': args.latency_ms,
+        'calibration_seconds': calibration_seconds,
+        'results': results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+        print(f"\nLínea base guardada en {BASELINE_PATH}")
+    if args.check:
+        if baseline is None:
+            sys.exit(f"No existe {BASELINE_PATH.name}; genérala con --save-baseline")
+        seconds_scale = calibration_seconds / baseline.get('calibration_seconds', calibration_seconds)
+        if baseline['environment'] != report['environment'] or baseline['latency_ms'] != args.latency_ms:
+            print(f"\n⚠️  La línea base se generó en otro entorno ({baseline['environment']}); no se comparan los tiempos")
+            seconds_scale = None
+        else:
+            print(f"\nCalibración: x{seconds_scale:.2f} respecto a la línea base")
+        regressions = compare(baseline['results'], results, seconds_scale)
+        if regressions:
+            print("\nRegresiones:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nSin regresiones respecto a la línea base.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Benchmark del detector de duplicados sobre un conjunto sintético.
+
+Genera anuncios con textos de plantilla (como los de los portales), copia
+una parte en otros portales con el texto, precio, ubicación y foto
+ligeramente alterados, y mide el tiempo, las comparaciones hechas y la
+precisión/exhaustividad por pares contra los grupos verdaderos.
+
+    python benchmark_dedup.py --sizes 1000 10000 50000 --photos
+"""
+import argparse
+import io
+import random
+import time
+from itertools import combinations
+
+from PIL import Image, ImageDraw
+
+from dedup import DuplicateIndex, perceptual_hash
+
+PORTALS = ['inmuebles24', 'lamudi', 'vivanuncios', 'propiedades.com']
+ZONES = ['Zapopan', 'Guadalajara Centro', 'Tlaquepaque', 'Providencia', 'Chapalita', 'Tlajomulco', 'Valle Real']
+TYPES = ['Casa', 'Departamento', 'Terreno', 'Casa en condominio']
+FEATURES = [
+    'alberca', 'roof garden', 'jardín', 'cocina integral', 'cuarto de servicio', 'terraza', 'estudio',
+    'vigilancia 24 horas', 'área de juegos', 'gimnasio', 'cochera techada', 'bodega', 'vestidor',
+    'calentador solar', 'cisterna', 'acabados de lujo', 'doble altura', 'vista panorámica',
+]
+WORDS = (
+    'excelente ubicación cerca de escuelas plazas comerciales hospitales avenidas principales '
+    'amplia iluminada remodelada nueva oportunidad inversión crédito infonavit fovissste bancario '
+    'privada coto seguridad tranquila familiar moderna minimalista espaciosa lista para habitar'
+).split()
+
+
+def _description(rng, bedrooms, zone, features):
+    words = rng.sample(WORDS, 12)
+    return (
+        f"Se vende hermosa propiedad en {zone} con {bedrooms} recámaras, "
+        f"{', '.join(features)}. {' '.join(words)}. Agenda tu cita hoy mismo."
+    )
+
+
+def _perturb(rng, text, rate=0.15):
+    # Otro portal: algunas palabras cambian o desaparecen y cambia la firma
+    words = text.split()
+    out = [rng.choice(WORDS) if rng.random() < rate else w for w in words if rng.random() > rate / 2]
+    return " ".join(out) + rng.choice(["", " Informes por WhatsApp.", " Precio negociable."])
+
+
+def _photo(seed, size=(160, 120)):
+    photo_rng = random.Random(seed)
+    image = Image.new("RGB", size, tuple(photo_rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = photo_rng.randrange(size[0]), photo_rng.randrange(size[1])
+        draw.rectangle(
+            [x, y, x + photo_rng.randrange(10, 80), y + photo_rng.randrange(10, 60)],
+            fill=tuple(photo_rng.randrange(256) for _ in range(3)),
+        )
+    return image
+
+
+def _jpeg(image, scale=1.0, quality=85):
+    if scale != 1.0:
+        image = image.resize((int(image.width * scale), int(image.height * scale)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def generate(n, duplicate_rate=0.25, photos=False, seed=7):
+    """Lista de anuncios sintéticos; `truth` indica el inmueble de cada uno."""
+    rng = random.Random(seed)
+    records = []
+    listing = 0
+    while len(records) < n:
+        listing += 1
+        zone = rng.choice(ZONES)
+        bedrooms = rng.randint(1, 5)
+        features = rng.sample(FEATURES, 4)
+        base = {
+            'title': f"{rng.choice(TYPES)} en venta en {zone} {bedrooms} recámaras",
+            'description': _description(rng, bedrooms, zone, features),
+            'price': round(rng.lognormvariate(15.2, 0.6), -3),
+            'latitude': 20.6 + rng.random() * 0.2,
+            'longitude': -103.45 + rng.random() * 0.2,
+            'construction_area_m2': rng.randint(60, 400),
+            'land_area_m2': rng.randint(90, 600),
+            'photo_hash': perceptual_hash(_jpeg(_photo(listing))) if photos else None,
+        }
+        copies = 1 + (rng.randint(1, 3) if rng.random() < duplicate_rate else 0)
+        for copy in range(min(copies, n - len(records))):
+            record = dict(base, id=f"{listing}-{copy}", truth=listing, source_portal=PORTALS[copy % len(PORTALS)])
+            if copy:
+                record['description'] = _perturb(rng, base['description'])
+                record['price'] = round(base['price'] * rng.uniform(0.98, 1.02), -3)
+                record['latitude'] += rng.uniform(-0.0005, 0.0005)
+                record['longitude'] += rng.uniform(-0.0005, 0.0005)
+                if photos:
+                    # Misma foto, recomprimida y a otro tamaño
+                    record['photo_hash'] = perceptual_hash(_jpeg(_photo(listing), scale=rng.uniform(0.6, 1.4), quality=60))
+            records.append(record)
+    return records
+
+
+def _pairs(labels):
+    groups = {}
+    for row_id, label in labels.items():
+        groups.setdefault(label, []).append(row_id)
+    return {pair for members in groups.values() for pair in combinations(sorted(members), 2)}
+
+
+def run(n, photos=False):
+    records = generate(n, photos=photos)
+    index = DuplicateIndex()
+    start = time.perf_counter()
+    index.add(records)
+    groups = index.groups()
+    elapsed = time.perf_counter() - start
+
+    predicted = _pairs({row_id: groups.get(row_id, row_id) for row_id in (r['id'] for r in records)})
+    truth = _pairs({r['id']: r['truth'] for r in records})
+    true_positives = len(predicted & truth)
+    precision = true_positives / len(predicted) if predicted else 1.0
+    recall = true_positives / len(truth) if truth else 1.0
+    print(
+        f"{n:>8} filas  {elapsed:7.2f} s  {n / elapsed:8.0f} filas/s  "
+        f"{index.comparisons:>10} comparaciones ({index.comparisons / (n * (n - 1) / 2):.5%} de todos los pares)  "
+        f"precisión {precision:.3f}  exhaustividad {recall:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--photos", action="store_true", help="incluir pHash de fotos sintéticas")
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, photos=args.photos)
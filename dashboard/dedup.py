@@ -0,0 +1,383 @@
+import io
+import itertools
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from queries import UNKNOWN_PORTAL
+
+# --- Detección de anuncios duplicados entre portales ---
+
+# MinHash sobre title + description: NUM_PERM = LSH_BANDS * LSH_ROWS. Con 16
+# bandas de 4 filas, dos textos con similitud >= 0.5 comparten una banda con
+# probabilidad > 0.6, y con >= 0.7 casi siempre.
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 5
+MIN_SHARED_TEXT_BANDS = 2
+
+# pHash de 64 bits de la primera foto, partido en 4 bandas de 16 bits: dos
+# fotos a distancia de Hamming <= 3 comparten al menos una banda.
+PHASH_BANDS = 4
+PHASH_MAX_DISTANCE = 6
+
+# Bloques por ubicación y precio (celdas de ~200 m, escalones de precio de 10%)
+GEO_CELL_DEGREES = 0.002
+PRICE_BUCKET_RATIO = 1.10
+
+# Criterios para confirmar un par candidato
+MAX_DISTANCE_M = 300
+PRICE_TOLERANCE = 0.05
+AREA_TOLERANCE = 0.10
+TEXT_HIGH_SIMILARITY = 0.8
+TEXT_LOW_SIMILARITY = 0.3
+
+# Cubetas más grandes que esto (p. ej. textos de plantilla) no generan
+# candidatos; mantienen el costo por fila acotado.
+MAX_BUCKET_SIZE = 200
+
+
+def normalize_text(text):
+    # Minúsculas sin acentos y solo letras/números, separados por un espacio
+    text = unicodedata.normalize("NFKD", str(text or "").lower()).encode("ascii", "ignore").decode()
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+_SHINGLE_WEIGHTS = np.uint64(256) ** np.arange(SHINGLE_SIZE, dtype=np.uint64)
+
+
+def _shingle_hashes(text):
+    # Shingles de SHINGLE_SIZE caracteres codificados en un entero y mezclados a 32 bits
+    data = np.frombuffer(normalize_text(text).encode(), dtype=np.uint8)
+    if len(data) == 0:
+        return None
+    if len(data) < SHINGLE_SIZE:
+        data = np.pad(data, (0, SHINGLE_SIZE - len(data)))
+    windows = np.lib.stride_tricks.sliding_window_view(data.astype(np.uint64), SHINGLE_SIZE)
+    codes = np.unique(windows @ _SHINGLE_WEIGHTS)
+    return (codes * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+
+
+class MinHasher:
+    """Firmas MinHash de `NUM_PERM` valores.
+
+    Cada permutación es un hash multiplicativo (a*x + b) en 64 bits del que
+    se toman los 32 bits altos; el desbordamiento de uint64 es intencional.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+
+    def signatures(self, texts, batch_size=256):
+        """Una firma por texto (None si el texto está vacío)."""
+        shingles = [_shingle_hashes(text) for text in texts]
+        result = [None] * len(shingles)
+        for start in range(0, len(shingles), batch_size):
+            batch = [(i, h) for i, h in enumerate(shingles[start:start + batch_size], start) if h is not None]
+            if not batch:
+                continue
+            hashes = np.concatenate([h for _, h in batch])
+            offsets = np.cumsum([0] + [len(h) for _, h in batch[:-1]])
+            permuted = np.outer(self._a, hashes)
+            permuted += self._b[:, None]
+            permuted >>= np.uint64(32)
+            minimums = np.minimum.reduceat(permuted, offsets, axis=1).T.astype(np.uint32)
+            for (i, _), signature in zip(batch, minimums):
+                result[i] = signature
+        return result
+
+    def signature(self, text):
+        return self.signatures([text])[0]
+
+
+def _dct_matrix(size):
+    k = np.arange(size)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * size))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def perceptual_hash(image_bytes):
+    """pHash de 64 bits: DCT de la imagen en grises a 32x32, frecuencias bajas contra su mediana."""
+    image = Image.open(io.BytesIO(image_bytes)).convert("L").resize((32, 32), Image.Resampling.LANCZOS)
+    pixels = np.asarray(image, dtype=float)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _distance_m(a, b):
+    # Aproximación equirectangular; suficiente para distancias de cientos de metros
+    mean_lat = math.radians((a["latitude"] + b["latitude"]) / 2)
+    dx = math.radians(b["longitude"] - a["longitude"]) * math.cos(mean_lat)
+    dy = math.radians(b["latitude"] - a["latitude"])
+    return 6371000 * math.hypot(dx, dy)
+
+
+def _within(a, b, tolerance):
+    # Sin alguno de los dos valores no se descarta el par
+    if a is None or b is None:
+        return True
+    return abs(a - b) <= tolerance * max(abs(a), abs(b))
+
+
+def _number(value):
+    return float(value) if value is not None and pd.notna(value) and value != 0 else None
+
+
+_NEIGHBORS = list(itertools.product((-1, 0, 1), repeat=3))
+
+
+class DuplicateIndex:
+    """Índice incremental de anuncios que probablemente son el mismo inmueble.
+
+    Cada fila se inserta en cubetas (bandas LSH del MinHash del texto, bandas
+    del pHash de la foto y celda de ubicación x precio) y solo se compara con
+    las filas que comparten alguna cubeta, así que el costo por fila no
+    depende del tamaño de la tabla. Los pares confirmados forman grupos por
+    componentes conexas.
+    """
+
+    def __init__(self, image_hasher=None):
+        self._minhasher = MinHasher()
+        self._image_hasher = image_hasher
+        self._rows = {}
+        self._buckets = defaultdict(set)
+        self._row_buckets = {}
+        self._edges = defaultdict(set)
+        self._groups = None
+        self.comparisons = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    # --- Actualización ---
+
+    def add(self, records):
+        """Inserta o reemplaza filas (dicts con las columnas de la tabla properties)."""
+        records = list(records)
+        self.remove(record["id"] for record in records if record["id"] in self._rows)
+        signatures = self._minhasher.signatures(
+            f"{record.get('title') or ''} {record.get('description') or ''}" for record in records
+        )
+        for record, signature in zip(records, signatures):
+            row = self._prepare(record, signature)
+            query_keys, keys = self._bucket_keys(row)
+            # Una sola banda de texto en común es frecuente entre anuncios de
+            # plantilla; se piden MIN_SHARED_TEXT_BANDS o una cubeta de foto/ubicación
+            text_matches, candidates = [], set()
+            for key in query_keys:
+                bucket = self._buckets.get(key, ())
+                if len(bucket) < MAX_BUCKET_SIZE:
+                    if key[0] == "text":
+                        text_matches.extend(bucket)
+                    else:
+                        candidates.update(bucket)
+            candidates.update(
+                other_id for other_id, count in Counter(text_matches).items() if count >= MIN_SHARED_TEXT_BANDS
+            )
+            for other_id in candidates:
+                self.comparisons += 1
+                if self._is_duplicate(row, self._rows[other_id]):
+                    self._edges[row["id"]].add(other_id)
+                    self._edges[other_id].add(row["id"])
+            for key in keys:
+                self._buckets[key].add(row["id"])
+            self._rows[row["id"]] = row
+            self._row_buckets[row["id"]] = keys
+        self._groups = None
+
+    def remove(self, ids):
+        for row_id in list(ids):
+            if self._rows.pop(row_id, None) is None:
+                continue
+            for key in self._row_buckets.pop(row_id):
+                bucket = self._buckets[key]
+                bucket.discard(row_id)
+                if not bucket:
+                    del self._buckets[key]
+            for other_id in self._edges.pop(row_id, ()):
+                self._edges[other_id].discard(row_id)
+                if not self._edges[other_id]:
+                    del self._edges[other_id]
+            self._groups = None
+
+    def _prepare(self, record, signature):
+        # `photo_hash` puede venir precalculado (p. ej. en paralelo)
+        photo_hash = record.get("photo_hash")
+        if photo_hash is None and self._image_hasher is not None and record.get("main_photo"):
+            photo_hash = self._image_hasher(record["main_photo"])
+        latitude, longitude = _number(record.get("latitude")), _number(record.get("longitude"))
+        return {
+            "id": record["id"],
+            "signature": signature,
+            "photo_hash": photo_hash,
+            "latitude": latitude if longitude is not None else None,
+            "longitude": longitude if latitude is not None else None,
+            "price": _number(record.get("price")),
+            "construction_area_m2": _number(record.get("construction_area_m2")),
+            "land_area_m2": _number(record.get("land_area_m2")),
+        }
+
+    @staticmethod
+    def _bucket_keys(row):
+        """(llaves a consultar, llaves donde se registra la fila)."""
+        keys = []
+        if row["signature"] is not None:
+            for band in range(LSH_BANDS):
+                keys.append(("text", band, row["signature"][band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()))
+        if row["photo_hash"] is not None:
+            for band in range(PHASH_BANDS):
+                keys.append(("photo", band, (row["photo_hash"] >> (16 * band)) & 0xFFFF))
+        query_keys = list(keys)
+        if row["latitude"] is not None and row["price"] is not None and row["price"] > 0:
+            # La fila se registra en su celda y en las vecinas, y se consulta
+            # solo su celda: así no se pierden los pares que caen en un borde
+            cell = (
+                math.floor(row["latitude"] / GEO_CELL_DEGREES),
+                math.floor(row["longitude"] / GEO_CELL_DEGREES),
+                math.floor(math.log(row["price"]) / math.log(PRICE_BUCKET_RATIO)),
+            )
+            query_keys.append(("geo",) + cell)
+            keys.extend(("geo", cell[0] + d_lat, cell[1] + d_lon, cell[2] + d_price) for d_lat, d_lon, d_price in _NEIGHBORS)
+        return query_keys, keys
+
+    def _is_duplicate(self, a, b):
+        if not _within(a["price"], b["price"], PRICE_TOLERANCE):
+            return False
+        if not _within(a["construction_area_m2"], b["construction_area_m2"], AREA_TOLERANCE):
+            return False
+        if not _within(a["land_area_m2"], b["land_area_m2"], AREA_TOLERANCE):
+            return False
+        near = None
+        if a["latitude"] is not None and b["latitude"] is not None:
+            near = _distance_m(a, b) <= MAX_DISTANCE_M
+            if not near:
+                return False
+
+        if a["photo_hash"] is not None and b["photo_hash"] is not None:
+            if _hamming(a["photo_hash"], b["photo_hash"]) <= PHASH_MAX_DISTANCE:
+                return True
+        if a["signature"] is not None and b["signature"] is not None:
+            similarity = float(np.mean(a["signature"] == b["signature"]))
+            if similarity >= TEXT_HIGH_SIMILARITY:
+                return True
+            if near and a["price"] is not None and b["price"] is not None and similarity >= TEXT_LOW_SIMILARITY:
+                return True
+        return False
+
+    # --- Consulta ---
+
+    def groups(self):
+        """Serie id -> id del grupo, solo para las filas con al menos un duplicado."""
+        if self._groups is None:
+            parent = {}
+
+            def find(row_id):
+                root = row_id
+                while parent.get(root, root) != root:
+                    root = parent[root]
+                while row_id != root:
+                    parent[row_id], row_id = root, parent.get(row_id, root)
+                return root
+
+            for row_id, others in self._edges.items():
+                for other_id in others:
+                    root_a, root_b = find(row_id), find(other_id)
+                    if root_a != root_b:
+                        # El id menor representa al grupo, así el resultado es estable
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+            self._groups = pd.Series({row_id: find(row_id) for row_id in self._edges}, dtype=object)
+        return self._groups
+
+
+def collapse_duplicates(df_properties, groups):
+    """Deja un anuncio por grupo de duplicados, el actualizado más recientemente.
+
+    Conserva el orden de `df_properties` y agrega `duplicate_count` (anuncios
+    del grupo dentro de `df_properties`) y `duplicate_portals`.
+    """
+    ids = df_properties['id'].to_numpy(dtype=object)
+    group = groups.reindex(ids).to_numpy(dtype=object)
+    group = np.where(pd.isna(group), ids, group)
+    df_groups = pd.DataFrame({
+        'group': group,
+        'portal': df_properties['source_portal'].astype(object).fillna(UNKNOWN_PORTAL).to_numpy(),
+    })
+    counts = df_groups['group'].map(df_groups['group'].value_counts()).to_numpy()
+
+    newest_first = df_properties['updated_at'].reset_index(drop=True).sort_values(
+        ascending=False, na_position='last', kind='stable'
+    ).index.to_numpy()
+    keep = np.zeros(len(df_properties), dtype=bool)
+    keep[newest_first[~df_groups['group'].iloc[newest_first].duplicated().to_numpy()]] = True
+
+    # Los portales solo se calculan para los grupos con más de un anuncio
+    shared = df_groups[counts > 1]
+    portals = shared.groupby('group')['portal'].agg(lambda p: ", ".join(sorted(set(p))))
+    collapsed = df_properties.iloc[np.flatnonzero(keep)]
+    return collapsed.assign(
+        duplicate_count=counts[keep],
+        duplicate_portals=df_groups['group'][keep].map(portals).to_numpy(),
+    )
+
+
+class DuplicateTracker:
+    """Mantiene un `DuplicateIndex` al día con la caché local de propiedades.
+
+    Recibe las filas nuevas, modificadas o eliminadas de un
+    `property_cache.CacheFollower`. Las fotos se obtienen con
+    `image_loader(url)` (bytes o None) y se procesan en paralelo.
+    """
+
+    def __init__(self, image_loader=None):
+        self._image_loader = image_loader
+        self._index = DuplicateIndex()
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="dedup-photos")
+        self.groups = pd.Series(dtype=object)
+
+    def add(self, records):
+        if self._image_loader is not None:
+            urls = [record.get('main_photo') for record in records]
+            for record, photo_hash in zip(records, self._executor.map(self._photo_hash, urls)):
+                record['photo_hash'] = photo_hash
+        self._index.add(records)
+
+    def remove(self, ids):
+        self._index.remove(ids)
+
+    def publish(self):
+        self.groups = self._index.groups()
+
+    def members(self, property_id):
+        # Ids del mismo grupo, sin incluir `property_id`
+        groups = self.groups
+        group = groups.get(property_id)
+        if group is None:
+            return []
+        return [row_id for row_id in groups.index[groups == group] if row_id != property_id]
+
+    def _photo_hash(self, url):
+        if not url:
+            return None
+        try:
+            data = self._image_loader(url)
+            return perceptual_hash(data) if data else None
+        except Exception:
+            return None
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+from spatial_index import SpatialIndex
+
+# --- Índice de filtros sobre la caché local de propiedades ---
+
+
+def _pack(mask):
+    # Un bit por propiedad
+    return np.packbits(np.asarray(mask, dtype=bool))
+
+
+class PropertyFilterIndex:
+    """Índices precalculados para los filtros del dashboard.
+
+    Se construyen una vez por versión de los datos: un bitmap por portal,
+    promotor y tipo, los precios ordenados, la marca de fraccionamiento y
+    el índice espacial. `filter` devuelve las mismas filas que
+    `queries.filter_properties`.
+    """
+
+    def __init__(self, df_properties):
+        self.df = df_properties
+        self.size = len(df_properties)
+        self._all = _pack(np.ones(self.size, dtype=bool))
+
+        self._portals = self._bitmaps(df_properties['source_portal'])
+        self._promoters = self._bitmaps(df_properties['promoter_id'])
+        self._property_types = self._bitmaps(df_properties['property_type'])
+
+        prices = df_properties['price'].to_numpy(dtype=float, na_value=np.nan)
+        priced_positions = np.flatnonzero(~np.isnan(prices))
+        order = np.argsort(prices[priced_positions], kind='stable')
+        self._price_positions = priced_positions[order]
+        self._sorted_prices = prices[self._price_positions]
+
+        is_fraccionamiento = df_properties['title'].str.contains('fraccionamiento', case=False, na=False)
+        self._not_fraccionamiento = _pack(~is_fraccionamiento.to_numpy(dtype=bool))
+
+        self.spatial = SpatialIndex(
+            df_properties['latitude'].to_numpy(dtype=float, na_value=np.nan),
+            df_properties['longitude'].to_numpy(dtype=float, na_value=np.nan),
+        )
+
+    def _bitmaps(self, series):
+        # Valor -> bitmap; los nulos quedan bajo la llave None
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        bitmaps = {self._key(value): _pack(codes == code) for code, value in enumerate(uniques)}
+        if (codes == -1).any():
+            bitmaps[None] = _pack(codes == -1)
+        return bitmaps
+
+    @staticmethod
+    def _key(value):
+        # Los ids llegan como enteros de numpy o de Python según el origen
+        return int(value) if isinstance(value, (int, np.integer)) else value
+
+    def _union(self, bitmaps, keys):
+        result = np.zeros_like(self._all)
+        for key in keys:
+            bits = bitmaps.get(self._key(key))
+            if bits is not None:
+                result |= bits
+        return result
+
+    def _price_range(self, min_price, max_price):
+        start = 0 if min_price is None else np.searchsorted(self._sorted_prices, min_price, side='left')
+        end = len(self._sorted_prices) if max_price is None else np.searchsorted(self._sorted_prices, max_price, side='right')
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self._price_positions[start:end]] = True
+        return _pack(mask)
+
+    def positions(
+        self,
+        portals=None,
+        promoter_ids=None,
+        include_no_promoter=True,
+        property_type=None,
+        min_price=None,
+        max_price=None,
+        exclude_fraccionamientos=False,
+        area=None,
+    ):
+        bits = self._all.copy()
+        if portals is not None:
+            bits &= self._union(self._portals, portals)
+        if promoter_ids is not None:
+            bits &= self._union(self._promoters, list(promoter_ids) + ([None] if include_no_promoter else []))
+        if property_type is not None:
+            bits &= self._union(self._property_types, [property_type])
+        if min_price is not None or max_price is not None:
+            bits &= self._price_range(min_price, max_price)
+        if exclude_fraccionamientos:
+            bits &= self._not_fraccionamiento
+        if area is not None:
+            mask = np.zeros(self.size, dtype=bool)
+            mask[self.spatial.query(area)] = True
+            bits &= _pack(mask)
+        return np.flatnonzero(np.unpackbits(bits, count=self.size))
+
+    def filter(self, **filters):
+        return self.df.iloc[self.positions(**filters)]
@@ -0,0 +1,18 @@
+-- Opciones de los filtros del dashboard en una sola fila, sin descargar la
+-- tabla: portales (NULL = sin portal), tipos de propiedad y precio máximo.
+-- Mismo resultado que queries.filter_options sobre la caché local.
+CREATE OR REPLACE FUNCTION public.property_filter_options()
+RETURNS TABLE (
+    portals text[],
+    property_types text[],
+    max_price double precision
+)
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+AS $$
+    SELECT
+        (SELECT array_agg(DISTINCT source_portal) FROM public.properties),
+        (SELECT array_agg(DISTINCT property_type::text) FROM public.properties WHERE property_type IS NOT NULL),
+        (SELECT max(price)::double precision FROM public.properties);
+$$;
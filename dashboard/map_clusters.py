@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+# --- Agrupación de puntos para el mapa de resultados ---
+
+TILE_SIZE = 256
+# Radio en pixeles dentro del cual los puntos se agrupan
+CLUSTER_RADIUS_PX = 48
+# A partir de este zoom se muestran los puntos individuales
+MAX_CLUSTER_ZOOM = 16
+MIN_ZOOM, MAX_ZOOM = 3, 18
+# Guadalajara, cuando no hay puntos
+DEFAULT_CENTER = (20.6597, -103.3496)
+
+
+def _project(latitude, longitude):
+    # Web Mercator normalizado a [0, 1]
+    lat = np.radians(np.clip(latitude, -85.0511, 85.0511))
+    x = (np.asarray(longitude) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return x, y
+
+
+def _unproject(x, y):
+    longitude = x * 360.0 - 180.0
+    latitude = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * y))))
+    return latitude, longitude
+
+
+def fit_view(latitude, longitude, width_px=1200, height_px=500):
+    """Centro y zoom que abarcan todos los puntos."""
+    if len(latitude) == 0:
+        return DEFAULT_CENTER[0], DEFAULT_CENTER[1], 10
+    x, y = _project(latitude, longitude)
+    center_lat, center_lon = _unproject((x.min() + x.max()) / 2, (y.min() + y.max()) / 2)
+    span = max(x.max() - x.min(), (y.max() - y.min()) * width_px / height_px, 1e-9)
+    zoom = int(np.floor(np.log2(width_px / (TILE_SIZE * span))))
+    return float(center_lat), float(center_lon), int(np.clip(zoom, MIN_ZOOM, MAX_ZOOM))
+
+
+def viewport_bounds(latitude, longitude, zoom, width_px=1200, height_px=500, margin=0.5):
+    """(min_lat, max_lat, min_lon, max_lon) visibles, con un margen relativo."""
+    x, y = _project(latitude, longitude)
+    world_px = TILE_SIZE * 2 ** zoom
+    half_w = width_px * (1 + margin) / 2 / world_px
+    half_h = height_px * (1 + margin) / 2 / world_px
+    max_lat, min_lon = _unproject(x - half_w, y - half_h)
+    min_lat, max_lon = _unproject(x + half_w, y + half_h)
+    return float(min_lat), float(max_lat), float(min_lon), float(max_lon)
+
+
+def cluster_points(df_properties, zoom, bounds=None):
+    """Agrupa las propiedades en celdas de `CLUSTER_RADIUS_PX` pixeles al zoom dado.
+
+    Solo se consideran los puntos dentro de `bounds`. Devuelve una fila por
+    grupo con su posición media, el número de propiedades y, si el grupo
+    tiene una sola, su `property_id`.
+    """
+    columns = ['latitude', 'longitude', 'count', 'property_id', 'label']
+    df_points = df_properties[['id', 'title', 'price', 'latitude', 'longitude']].dropna(subset=['latitude', 'longitude'])
+    if bounds is not None:
+        min_lat, max_lat, min_lon, max_lon = bounds
+        df_points = df_points[
+            df_points['latitude'].between(min_lat, max_lat) & df_points['longitude'].between(min_lon, max_lon)
+        ]
+    if df_points.empty:
+        return pd.DataFrame(columns=columns)
+
+    x, y = _project(df_points['latitude'].to_numpy(dtype=float), df_points['longitude'].to_numpy(dtype=float))
+    if zoom >= MAX_CLUSTER_ZOOM:
+        cell_x, cell_y = np.arange(len(df_points)), np.zeros(len(df_points), dtype=int)
+    else:
+        cell = CLUSTER_RADIUS_PX / (TILE_SIZE * 2 ** zoom)
+        cell_x, cell_y = np.floor(x / cell).astype(np.int64), np.floor(y / cell).astype(np.int64)
+
+    grouped = pd.DataFrame({
+        'cell_x': cell_x, 'cell_y': cell_y,
+        'latitude': df_points['latitude'].to_numpy(dtype=float),
+        'longitude': df_points['longitude'].to_numpy(dtype=float),
+        'id': df_points['id'].to_numpy(dtype=object),
+        'title': df_points['title'].to_numpy(dtype=object),
+        'price': df_points['price'].to_numpy(dtype=float),
+    }).groupby(['cell_x', 'cell_y'], sort=False)
+
+    clusters = grouped.agg(
+        latitude=('latitude', 'mean'),
+        longitude=('longitude', 'mean'),
+        count=('id', 'size'),
+        property_id=('id', 'first'),
+        title=('title', 'first'),
+        price=('price', 'first'),
+    ).reset_index(drop=True)
+
+    single = clusters['count'] == 1
+    price_labels = clusters['price'].map(lambda p: f"${p:,.0f}" if pd.notna(p) else "N/A")
+    clusters['label'] = np.where(
+        single,
+        clusters['title'].fillna("Sin Título").astype(str) + " · " + price_labels,
+        clusters['count'].astype(str) + " propiedades",
+    )
+    clusters['property_id'] = clusters['property_id'].where(single, None)
+    return clusters[columns]
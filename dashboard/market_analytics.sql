@@ -0,0 +1,54 @@
+-- Agregados de mercado calculados en el servidor para la página de Análisis.
+-- Mismo resultado que analytics.group_summary sobre la caché local.
+--   group_by: 'zone' | 'property_type' | 'listing_type' | 'source_portal'
+--   metric:   'price' | 'price_per_m2_construction' | 'price_per_m2_land'
+CREATE OR REPLACE FUNCTION public.market_summary(
+    group_by text,
+    metric text DEFAULT 'price',
+    property_type_filter text DEFAULT NULL,
+    listing_type_filter text DEFAULT NULL
+)
+RETURNS TABLE (
+    group_value text,
+    listings bigint,
+    p25 double precision,
+    median double precision,
+    p75 double precision,
+    mean double precision,
+    median_days_on_market double precision
+)
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+AS $$
+    WITH market AS (
+        SELECT
+            CASE group_by
+                WHEN 'zone' THEN COALESCE(NULLIF(initcap(trim(split_part(location_text, ',', 1))), ''), 'Sin zona')
+                WHEN 'property_type' THEN property_type::text
+                WHEN 'listing_type' THEN listing_type::text
+                WHEN 'source_portal' THEN COALESCE(source_portal, 'Desconocido')
+            END AS group_value,
+            CASE metric
+                WHEN 'price' THEN price::double precision
+                WHEN 'price_per_m2_construction' THEN price / NULLIF(construction_area_m2, 0)
+                WHEN 'price_per_m2_land' THEN price / NULLIF(land_area_m2, 0)
+            END AS value,
+            days_on_market
+        FROM public.properties
+        WHERE (property_type_filter IS NULL OR property_type::text = property_type_filter)
+          AND (listing_type_filter IS NULL OR listing_type::text = listing_type_filter)
+    )
+    SELECT
+        group_value,
+        COUNT(*) AS listings,
+        percentile_cont(0.25) WITHIN GROUP (ORDER BY value) AS p25,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY value) AS median,
+        percentile_cont(0.75) WITHIN GROUP (ORDER BY value) AS p75,
+        AVG(value) AS mean,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY days_on_market) AS median_days_on_market
+    FROM market
+    WHERE group_value IS NOT NULL
+    GROUP BY group_value
+    ORDER BY listings DESC;
+$$;
@@ -0,0 +1,378 @@
+import json
+import re
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from text_search import analyze
+
+# --- Cliente de Supabase en memoria (benchmarks y copias de seguridad sin conexión) ---
+
+# Operadores de comparación de PostgREST
+COMPARISONS = {
+    'eq': lambda column, value: column == value,
+    'neq': lambda column, value: column.notna() & (column != value),
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+}
+
+
+# Tipos de `text_search` que postgrest-py convierte en plfts, phfts y wfts;
+# cualquier otro valor se envía como fts (to_tsquery)
+TEXT_SEARCH_TYPES = ('plain', 'phrase', 'web_search')
+
+
+class MemoryAPIError(Exception):
+    # `code` como en postgrest.APIError (SQLSTATE o PGRSTxxx)
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class MemoryClient:
+    """Subconjunto de PostgREST sobre DataFrames, con la interfaz de supabase-py.
+
+    Cubre las consultas del dashboard: select con alias y `->>`, conteos,
+    filtros (también en `or_`, `and(...)` y `not_`), `text_search`, orden y
+    paginación; es de solo lectura y las escrituras fallan como errores de
+    la API. Cada respuesta se serializa a JSON y se vuelve a leer, como en
+    la red, y pasa por los hooks `response` de `postgrest.session`, así que
+    `profiling.InstrumentedClient` mide sus bytes. `latency` (segundos
+    por petición) y `bytes_per_second` simulan la red. Las funciones RPC no
+    existen: el dashboard usa sus rutas alternativas. `columns` ({tabla:
+    [columnas]}) garantiza las columnas de las tablas sin filas.
+    """
+
+    def __init__(self, tables, views=None, latency=0.0, bytes_per_second=None, columns=None):
+        columns = columns or {}
+        self.tables = {name: _table_frame(rows, columns.get(name, ())) for name, rows in tables.items()}
+        self.views = dict(views or {})
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.postgrest = SimpleNamespace(session=SimpleNamespace(event_hooks={'request': [], 'response': []}))
+        self._sort_orders = {}
+        self._search_terms = {}
+
+    def from_(self, table):
+        return MemoryQuery(self, table)
+
+    def table(self, table):
+        return self.from_(table)
+
+    def rpc(self, function, *args, **kwargs):
+        return _MissingFunction(function)
+
+    # --- Uso interno de MemoryQuery ---
+
+    def _frame(self, table):
+        if table in self.views:
+            return self.views[table](self)
+        if table not in self.tables:
+            raise MemoryAPIError(f'relation "public.{table}" does not exist', code="42P01")
+        return self.tables[table]
+
+    def _sort_order(self, table, df, orders):
+        # Las tablas no cambian durante un benchmark: el orden completo se
+        # calcula una vez y cada consulta solo filtra sus posiciones
+        key = (table, tuple(orders))
+        if key not in self._sort_orders:
+            frame = pd.DataFrame({f"k{i}": df[column] for i, (column, _, _) in enumerate(orders)})
+            na_position = 'first' if orders[0][2] else 'last'
+            self._sort_orders[key] = frame.reset_index(drop=True).sort_values(
+                list(frame.columns), ascending=[not desc for _, desc, _ in orders],
+                na_position=na_position, kind='stable',
+            ).index.to_numpy()
+        return self._sort_orders[key]
+
+    def _terms(self, table, df, column):
+        # Términos de cada fila con el mismo análisis que el índice local
+        key = (table, column)
+        if key not in self._search_terms:
+            text = df['title'].fillna('') + ' ' + df['location_text'].fillna('') + ' ' + df['description'].fillna('')
+            self._search_terms[key] = [set(analyze(value)) for value in text]
+        return self._search_terms[key]
+
+    def _respond(self, data, count=None):
+        payload = json.dumps(data, default=str).encode("utf-8")
+        for hook in self.postgrest.session.event_hooks.get('response', []):
+            hook(_HttpResponse(payload))
+        delay = self.latency + (len(payload) / self.bytes_per_second if self.bytes_per_second else 0.0)
+        if delay:
+            time.sleep(delay)
+        return SimpleNamespace(data=json.loads(payload), count=count)
+
+
+def _table_frame(rows, columns):
+    # Tipos con nulos (Int64, string) para que los enteros no vuelvan como 1.0;
+    # las columnas sin valores se quedan como object (no se puede inferir su tipo)
+    df = pd.DataFrame(rows).convert_dtypes(convert_boolean=False)
+    for column in columns:
+        if column not in df.columns:
+            df[column] = pd.Series(None, index=df.index, dtype=object)
+    return df
+
+
+def _raise(error):
+    raise error
+
+
+class _HttpResponse:
+    # Lo que reciben los hooks de httpx
+    def __init__(self, content):
+        self.content = content
+
+    def read(self):
+        return self.content
+
+
+class _MissingFunction:
+    def __init__(self, function):
+        self._function = function
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        raise MemoryAPIError(
+            f"Could not find the function public.{self._function} in the schema cache", code="PGRST202"
+        )
+
+
+class MemoryQuery:
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._columns = "*"
+        self._count = None
+        self._head = False
+        self._conditions = []
+        self._negate_next = False
+        self._orders = []
+        self._offset = 0
+        self._limit = None
+        self._write = False
+
+    def select(self, columns="*", count=None, head=False):
+        self._columns, self._count, self._head = columns, count, head
+        return self
+
+    def _writes(self, *args, **kwargs):
+        self._write = True
+        return self
+
+    insert = update = upsert = delete = _writes
+
+    def _add(self, condition):
+        if self._negate_next:
+            self._negate_next = False
+            self._conditions.append(lambda df: ~condition(df))
+        else:
+            self._conditions.append(condition)
+        return self
+
+    @property
+    def not_(self):
+        self._negate_next = True
+        return self
+
+    def eq(self, column, value):
+        return self._add(_comparison(column, 'eq', value))
+
+    def neq(self, column, value):
+        return self._add(_comparison(column, 'neq', value))
+
+    def gt(self, column, value):
+        return self._add(_comparison(column, 'gt', value))
+
+    def gte(self, column, value):
+        return self._add(_comparison(column, 'gte', value))
+
+    def lt(self, column, value):
+        return self._add(_comparison(column, 'lt', value))
+
+    def lte(self, column, value):
+        return self._add(_comparison(column, 'lte', value))
+
+    def in_(self, column, values):
+        return self._add(_membership(column, list(values)))
+
+    def is_(self, column, value):
+        return self._add(_is(column, value))
+
+    def ilike(self, column, pattern):
+        return self._add(_like(column, pattern))
+
+    def or_(self, filters):
+        conditions = [_parse_condition(part) for part in _split(filters)]
+        return self._add(lambda df: np.logical_or.reduce([condition(df) for condition in conditions]))
+
+    def text_search(self, column, query, options=None):
+        # Todas las palabras de la consulta, con el análisis del índice local.
+        # Como to_tsquery, el tipo por omisión no acepta varias palabras sueltas.
+        if (options or {}).get('type') not in TEXT_SEARCH_TYPES and len(query.split()) > 1:
+            return self._add(lambda df: _raise(MemoryAPIError(f"syntax error in tsquery: \"{query}\"", code="42601")))
+        words = set(analyze(query))
+        client, table = self._client, self._table
+        return self._add(lambda df: np.fromiter(
+            (words <= terms for terms in client._terms(table, df, column)), dtype=bool, count=len(df)
+        ))
+
+    def order(self, column, desc=False, nullsfirst=None):
+        self._orders.append((column, desc, desc if nullsfirst is None else nullsfirst))
+        return self
+
+    def range(self, start, end):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def execute(self):
+        if self._write:
+            raise MemoryAPIError(f"el cliente en memoria es de solo lectura: no se puede modificar {self._table}")
+        df = self._client._frame(self._table)
+        mask = np.ones(len(df), dtype=bool)
+        for condition in self._conditions:
+            mask &= np.asarray(condition(df), dtype=bool)
+        if self._orders:
+            order = self._client._sort_order(self._table, df, self._orders)
+            positions = order[mask[order]]
+        else:
+            positions = np.flatnonzero(mask)
+        count = len(positions) if self._count else None
+        if self._head:
+            return self._client._respond([], count)
+        end = None if self._limit is None else self._offset + self._limit
+        rows = _project(df.iloc[positions[self._offset:end]], self._columns)
+        return self._client._respond(rows, count)
+
+
+# --- Filtros de PostgREST ---
+
+def _value(column, value):
+    # Los filtros llegan como texto; se comparan con el tipo de la columna
+    if isinstance(value, str) and pd.api.types.is_numeric_dtype(column.dtype):
+        return float(value)
+    return value
+
+
+def _comparison(name, operator, value):
+    return lambda df: COMPARISONS[operator](df[name], _value(df[name], value)).fillna(False).to_numpy(dtype=bool)
+
+
+def _membership(name, values):
+    return lambda df: df[name].isin([_value(df[name], value) for value in values]).to_numpy()
+
+
+def _is(name, value):
+    if value in (None, "null"):
+        return lambda df: df[name].isna().to_numpy()
+    return lambda df: (df[name] == (value in (True, "true"))).to_numpy()
+
+
+def _like(name, pattern):
+    regex = "^" + ".*".join(re.escape(part) for part in re.split(r"[*%]", pattern)) + "$"
+    return lambda df: df[name].astype("string").str.contains(regex, case=False, regex=True, na=False).to_numpy(dtype=bool)
+
+
+def _split(text):
+    # Separa por comas fuera de paréntesis y comillas
+    parts, current, depth, quoted, escaped = [], [], 0, False, False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return [part for part in parts if part]
+
+
+def _literal(text):
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        return text[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return text
+
+
+def _parse_condition(text):
+    negate = text.startswith("not.")
+    if negate:
+        text = text[4:]
+    if text.startswith(("and(", "or(")):
+        operator, _, inner = text.partition("(")
+        conditions = [_parse_condition(part) for part in _split(inner[:-1])]
+        reduce = np.logical_and.reduce if operator == "and" else np.logical_or.reduce
+        condition = lambda df: reduce([c(df) for c in conditions])
+    else:
+        name, operator, value = text.split(".", 2)
+        if operator == "not":
+            operator, value = value.split(".", 1)
+            return _negated(_parse_condition(f"{name}.{operator}.{value}"))
+        if operator in COMPARISONS:
+            condition = _comparison(name, operator, _literal(value))
+        elif operator == "in":
+            condition = _membership(name, [_literal(v) for v in _split(value[1:-1])])
+        elif operator == "is":
+            condition = _is(name, value)
+        elif operator in ("ilike", "like"):
+            condition = _like(name, _literal(value))
+        else:
+            raise MemoryAPIError(f"operador no soportado: {operator}")
+    return _negated(condition) if negate else condition
+
+
+def _negated(condition):
+    return lambda df: ~np.asarray(condition(df), dtype=bool)
+
+
+def _project(df, columns):
+    # select de PostgREST: "*", columnas y alias con `columna->>índice`
+    output = {}
+    for spec in _split(columns):
+        spec = spec.strip()
+        if spec == "*":
+            output.update({column: df[column] for column in df.columns})
+            continue
+        alias, _, expression = spec.rpartition(":")
+        column, _, index = expression.partition("->>")
+        values = df[column]
+        if index:
+            position = int(index)
+            values = values.map(lambda items: items[position] if isinstance(items, list) and len(items) > position else None)
+        output[alias or column] = values
+    frame = pd.DataFrame(output, index=df.index)
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+# --- Vistas ---
+
+def promoter_summaries(client):
+    # Vista promoter_summaries (promoter_summaries.sql) sobre las tablas del cliente
+    promoters, properties = client.tables['promoters'], client.tables['properties']
+    grouped = properties.dropna(subset=['promoter_id']).groupby('promoter_id')
+    summary = pd.DataFrame({
+        'property_count': grouped.size(),
+        'median_price': grouped['price'].median(),
+        'property_types': grouped['property_type'].unique().map(lambda types: sorted(pd.Series(types).dropna())),
+    })
+    df_summaries = promoters.join(summary, on='id')
+    df_summaries['property_count'] = df_summaries['property_count'].fillna(0).astype(int)
+    df_summaries['property_types'] = df_summaries['property_types'].apply(lambda types: types if isinstance(types, list) else [])
+    return df_summaries.sort_values('name')
@@ -2,6 +2,19 @@ import streamlit as st
 import pandas as pd
 from supabase import create_client, Client
 
+from profiling import InstrumentedClient
+from queries import is_missing_object, scan_pages
+from session import (
+    get_offline_client,
+    get_profiler,
+    get_session_id,
+    get_write_queue,
+    show_offline_notice,
+    show_profiling_panel,
+    show_write_status,
+    start_rerun,
+)
+
 # --- Configuración de la página ---
 st.set_page_config(
     page_title="Gestión de Promotores",
@@ -9,35 +22,102 @@ st.set_page_config(
     layout="wide"
 )
 
+# --- Métricas de rendimiento ---
+profiler = get_profiler()
+rerun_trace = start_rerun(profiler, "Promotores")
+show_profiling_panel(profiler)
+
 # --- Conexión a Supabase ---
 @st.cache_resource
 def init_connection() -> Client:
+    # Sin conexión: copia de seguridad local de backup.py ([offline] en secrets.toml)
+    offline_client = get_offline_client(profiler)
+    if offline_client is not None:
+        return offline_client
     url = st.secrets["supabase"]["url"]
     key = st.secrets["supabase"]["key"]
-    return create_client(url, key)
+    return InstrumentedClient(create_client(url, key), profiler)
 
 supabase_client = init_connection()
+show_offline_notice(supabase_client)
+
+# Las escrituras se envían en segundo plano; `generation` cambia tras cada
+# envío exitoso y renueva las consultas.
+write_queue = get_write_queue(supabase_client)
+session_id = get_session_id()
 
 # --- Carga de Datos ---
-@st.cache_data(ttl=60)
-def load_promoters():
-    # Cargar promotores con sus propiedades
-    response = supabase_client.from_("promoters").select("*, properties(id, title, price, location_text, property_type)").execute()
-    if response.data:
-        return pd.DataFrame(response.data)
-    return pd.DataFrame()
-
-@st.cache_data(ttl=60)
-def load_properties():
-    response = supabase_client.from_("properties").select("id, title, promoter_id").execute()
-    if response.data:
-        return pd.DataFrame(response.data)
-    return pd.DataFrame()
+SUMMARY_COLUMNS = ['id', 'name', 'company', 'phone', 'email', 'property_count', 'median_price', 'property_types']
+
+def summarize_promoters(promoters, properties):
+    # Mismo resultado que la vista promoter_summaries, calculado localmente
+    df_promoters = pd.DataFrame(promoters, columns=['id', 'name', 'company', 'phone', 'email'])
+    df_properties = pd.DataFrame(properties, columns=['promoter_id', 'price', 'property_type'])
+    df_properties['price'] = pd.to_numeric(df_properties['price'], errors='coerce')
+    summary = df_properties.groupby('promoter_id').agg(
+        property_count=('promoter_id', 'size'),
+        median_price=('price', 'median'),
+        property_types=('property_type', lambda types: sorted(types.dropna().unique().tolist())),
+    )
+    df_promoters = df_promoters.join(summary, on='id').sort_values('name', ignore_index=True)
+    df_promoters['property_count'] = df_promoters['property_count'].fillna(0).astype(int)
+    df_promoters['property_types'] = df_promoters['property_types'].apply(lambda types: types if isinstance(types, list) else [])
+    return df_promoters
+
+def fetch_rows(table, columns, where=None):
+    # Todas las filas, por páginas para no quedar cortado por el límite de filas de PostgREST
+    return [row for batch in scan_pages(supabase_client, table, columns, where) for row in batch]
+
+@profiler.cache_data(ttl=60)
+def load_promoters(promoters_generation=0, properties_generation=0):
+    # Resumen por promotor calculado en el servidor (promoter_summaries.sql)
+    try:
+        summaries = fetch_rows("promoter_summaries", ", ".join(SUMMARY_COLUMNS))
+        return pd.DataFrame(summaries, columns=SUMMARY_COLUMNS).sort_values('name', ignore_index=True)
+    except Exception as e:
+        if not is_missing_object(e):
+            raise
+    # Sin la vista: se agrega a partir de columnas mínimas de propiedades
+    promoters = fetch_rows("promoters", "id, name, company, phone, email")
+    properties = fetch_rows(
+        "properties", "id, promoter_id, price, property_type", lambda query: query.not_.is_("promoter_id", "null")
+    )
+    return summarize_promoters(promoters, properties)
+
+@profiler.cache_data(ttl=60)
+def load_promoter_properties(promoter_id, generation=0):
+    # Solo se consulta al abrir el expander del promotor
+    response = supabase_client.from_("properties").select("id, title, price, location_text, property_type").eq("promoter_id", promoter_id).execute()
+    return pd.DataFrame(response.data or [], columns=['id', 'title', 'price', 'location_text', 'property_type'])
+
+def apply_pending_writes(df_promoters):
+    # Muestra de inmediato los cambios que aún están en la cola
+    pending_changes, pending_inserts = write_queue.pending("promoters")
+    if df_promoters.empty or not pending_changes:
+        return df_promoters, pending_inserts
+    df_promoters = df_promoters.copy()
+    deleted_ids = [row_id for row_id, change in pending_changes.items() if change['op'] == 'delete']
+    df_promoters = df_promoters[~df_promoters['id'].isin(deleted_ids)]
+    for row_id, change in pending_changes.items():
+        if change['op'] == 'update':
+            for column, value in change['data'].items():
+                df_promoters.loc[df_promoters['id'] == row_id, column] = value
+    return df_promoters, pending_inserts
 
 # --- UI de la Aplicación ---
 st.title("👥 Gestión de Promotores")
 
-df_promoters = load_promoters()
+show_write_status(write_queue)
+
+with profiler.phase("promotores"):
+    df_promoters, pending_inserts = apply_pending_writes(
+        load_promoters(write_queue.generation("promoters"), write_queue.generation("properties"))
+    )
+    # Índice id -> promotor para las búsquedas de la página
+    promoters_by_id = {
+        promoter['id']: promoter
+        for promoter in df_promoters.astype(object).where(df_promoters.notna(), None).to_dict('records')
+    }
 
 # --- Formulario para Añadir/Editar Promotor ---
 st.header("Añadir o Editar Promotor")
@@ -66,19 +146,13 @@ with st.form(key="promoter_form", clear_on_submit=True):
     if submitted:
         if name:
             promoter_data = {"name": name, "company": company, "phone": phone, "email": email}
-            try:
-                if promoter_id:
-                    supabase_client.from_("promoters").update(promoter_data).eq("id", promoter_id).execute()
-                    st.toast(f"Promotor '{name}' actualizado con éxito.")
-                else:
-                    supabase_client.from_("promoters").insert(promoter_data).execute()
-                    st.toast(f"Promotor '{name}' añadido con éxito.")
-                
-                st.session_state.selected_promoter = None
-                st.cache_data.clear()
-                st.rerun()
-            except Exception as e:
-                st.error(f"Error al guardar: {e}")
+            if promoter_id:
+                write_queue.update("promoters", promoter_id, promoter_data, session_id)
+            else:
+                write_queue.insert("promoters", promoter_data, session_id)
+
+            st.session_state.selected_promoter = None
+            st.rerun()
         else:
             st.warning("El nombre del promotor es obligatorio.")
 
@@ -91,74 +165,79 @@ st.markdown("---")
 
 # --- Tabla de Promotores ---
 st.header("Promotores Existentes")
+for pending_insert in pending_inserts:
+    st.caption(f"⏳ Guardando promotor '{pending_insert['data']['name']}'...")
 if not df_promoters.empty:
-    # Mostrar lista de promotores con propiedades
-    for _, promoter in df_promoters.iterrows():
-        with st.expander(f"{promoter['name']} - {promoter['company'] or 'Sin empresa'}"):
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.write(f"**Teléfono:** {promoter.get('phone', 'No especificado')}")
-                st.write(f"**Email:** {promoter.get('email', 'No especificado')}")
+    with profiler.phase("lista de promotores"):
+        # Mostrar lista de promotores; el contenido de cada uno se construye
+        # solo mientras su expander está abierto
+        for promoter in promoters_by_id.values():
+            median_price = f"${promoter['median_price']:,.0f}" if pd.notna(promoter['median_price']) else "N/A"
+            details = st.expander(
+                f"{promoter['name']} - {promoter['company'] or 'Sin empresa'} · "
+                f"{promoter['property_count']} propiedades · Mediana {median_price}",
+                key=f"promoter_{promoter['id']}",
+                on_change="rerun",
+            )
+            if not details.open:
+                continue
+            with details:
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    st.write(f"**Teléfono:** {promoter.get('phone') or 'No especificado'}")
+                    st.write(f"**Email:** {promoter.get('email') or 'No especificado'}")
+                    if promoter['property_types']:
+                        st.write(f"**Tipos:** {', '.join(promoter['property_types'])}")
             
-            with col2:
-                if st.button(f"✏️ Editar", key=f"edit_{promoter['id']}"):
-                    st.session_state.selected_promoter = promoter.to_dict()
-                    st.rerun()
+                with col2:
+                    if st.button(f"✏️ Editar", key=f"edit_{promoter['id']}"):
+                        st.session_state.selected_promoter = promoter
+                        st.rerun()
                 
-                if st.button(f"🗑️ Eliminar", key=f"delete_{promoter['id']}"):
-                    try:
-                        supabase_client.from_("promoters").delete().eq("id", promoter['id']).execute()
-                        st.toast(f"Promotor '{promoter['name']}' eliminado.")
-                        st.cache_data.clear()
+                    if st.button(f"🗑️ Eliminar", key=f"delete_{promoter['id']}"):
+                        write_queue.delete("promoters", promoter['id'], session_id)
                         st.rerun()
-                    except Exception as e:
-                        st.error(f"Error al eliminar: {e}")
             
-            # Mostrar propiedades del promotor
-            if promoter.get('properties'):
-                st.subheader("Propiedades")
-                properties_df = pd.DataFrame(promoter['properties'])
-                st.dataframe(
-                    properties_df[['title', 'price', 'location_text', 'property_type']],
-                    use_container_width=True,
-                    column_config={
-                        'title': 'Título',
-                        'price': st.column_config.NumberColumn('Precio', format="$%.0f"),
-                        'location_text': 'Ubicación',
-                        'property_type': 'Tipo'
-                    },
-                    hide_index=True
-                )
-            else:
-                st.info("Este promotor no tiene propiedades asignadas.")
+                # Mostrar propiedades del promotor
+                if promoter['property_count']:
+                    st.subheader("Propiedades")
+                    properties_df = load_promoter_properties(promoter['id'], write_queue.generation("properties"))
+                    st.dataframe(
+                        properties_df[['title', 'price', 'location_text', 'property_type']],
+                        width="stretch",
+                        column_config={
+                            'title': 'Título',
+                            'price': st.column_config.NumberColumn('Precio', format="$%.0f"),
+                            'location_text': 'Ubicación',
+                            'property_type': 'Tipo'
+                        },
+                        hide_index=True
+                    )
+                else:
+                    st.info("Este promotor no tiene propiedades asignadas.")
             
-            st.write("---")
+                st.write("---")
 
 # Selector para edición/eliminación
 st.subheader("Gestión Rápida")
 if not df_promoters.empty:
     selected_id = st.selectbox(
         "Selecciona un promotor para editar o eliminar",
-        options=df_promoters['id'],
-        format_func=lambda x: f"{df_promoters[df_promoters['id'] == x]['name'].iloc[0]} (ID: {x})",
+        options=list(promoters_by_id.keys()),
+        format_func=lambda x: f"{promoters_by_id[x]['name']} (ID: {x})",
         key="promoter_selector"
     )
     
     col1, col2 = st.columns(2)
     if col1.button("✏️ Editar Promotor Seleccionado"):
-        selected_promoter_data = df_promoters[df_promoters['id'] == selected_id].iloc[0].to_dict()
-        st.session_state.selected_promoter = selected_promoter_data
+        st.session_state.selected_promoter = promoters_by_id[selected_id]
         st.rerun()
         
     if col2.button("🗑️ Eliminar Promotor Seleccionado"):
-        try:
-            supabase_client.from_("promoters").delete().eq("id", selected_id).execute()
-            st.toast("Promotor eliminado.")
-            st.cache_data.clear()
-            st.rerun()
-            st.cache_data.clear()
-            st.rerun()
-        except Exception as e:
-            st.error(f"Error al eliminar: {e}. Asegúrate de que no esté asociado a ninguna propiedad.")
+        # Si falla (p. ej. tiene propiedades asociadas) el error llega como toast
+        write_queue.delete("promoters", selected_id, session_id)
+        st.rerun()
 else:
     st.info("No hay promotores registrados.")
+
+profiler.commit(rerun_trace, finished=True)
@@ -0,0 +1,181 @@
+import pandas as pd
+import streamlit as st
+from supabase import create_client, Client
+
+from analytics import (
+    GROUP_DIMENSIONS,
+    PRICE_METRICS,
+    days_on_market_distribution,
+    fetch_market_summary,
+    group_summary,
+    prepare_market_frame,
+    rolling_statistics,
+)
+from profiling import InstrumentedClient
+from queries import PROPERTY_TYPES
+from session import (
+    get_offline_client,
+    get_profiler,
+    get_property_cache,
+    show_offline_notice,
+    show_profiling_panel,
+    start_rerun,
+)
+
+# --- Configuración de la página ---
+st.set_page_config(
+    page_title="Análisis de Mercado",
+    page_icon="📊",
+    layout="wide"
+)
+
+# --- Métricas de rendimiento ---
+profiler = get_profiler()
+rerun_trace = start_rerun(profiler, "Análisis de mercado")
+show_profiling_panel(profiler)
+
+# --- Conexión a Supabase ---
+@st.cache_resource
+def init_connection() -> Client:
+    # Sin conexión: copia de seguridad local de backup.py ([offline] en secrets.toml)
+    offline_client = get_offline_client(profiler)
+    if offline_client is not None:
+        return offline_client
+    url = st.secrets["supabase"]["url"]
+    key = st.secrets["supabase"]["key"]
+    return InstrumentedClient(create_client(url, key), profiler)
+
+supabase_client = init_connection()
+show_offline_notice(supabase_client)
+
+# Misma caché local que la página de propiedades
+property_cache = get_property_cache(supabase_client)
+
+# --- Carga de Datos ---
+# Los agregados se memorizan por versión de la caché: solo se recalculan
+# cuando cambian los datos o las opciones elegidas.
+@profiler.cache_data(max_entries=2)
+def load_market_frame(_df_properties, version):
+    return prepare_market_frame(_df_properties)
+
+def filter_market(df_market, property_type, listing_type):
+    mask = pd.Series(True, index=df_market.index)
+    if property_type is not None:
+        mask &= df_market['property_type'] == property_type
+    if listing_type is not None:
+        mask &= df_market['listing_type'] == listing_type
+    return df_market[mask]
+
+@profiler.cache_data(max_entries=64)
+def load_group_summary(_df_market, version, by, metric, property_type, listing_type):
+    return group_summary(filter_market(_df_market, property_type, listing_type), by, metric)
+
+@profiler.cache_data(max_entries=64)
+def load_days_on_market(_df_market, version, by, property_type, listing_type):
+    return days_on_market_distribution(filter_market(_df_market, property_type, listing_type), by)
+
+@profiler.cache_data(max_entries=64)
+def load_rolling(_df_market, version, metric, window, by, groups, property_type, listing_type):
+    df_market = filter_market(_df_market, property_type, listing_type)
+    if by is not None:
+        df_market = df_market[df_market[by].isin(groups)]
+    return rolling_statistics(df_market, metric, window, by)
+
+@profiler.cache_data(ttl=600)
+def load_server_summary(by, metric, property_type, listing_type):
+    # Mientras la caché local no esté lista, el agregado se calcula en Postgres
+    return fetch_market_summary(supabase_client, by, metric, property_type, listing_type)
+
+# --- UI de la Aplicación ---
+st.title("📊 Análisis de Mercado")
+
+with profiler.phase("caché local"):
+    property_cache.ensure_synced()
+    version = property_cache.version
+    df_properties = property_cache.snapshot()
+    df_market = load_market_frame(df_properties, version) if df_properties is not None else None
+
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    dimension_label = st.selectbox("Agrupar por", options=list(GROUP_DIMENSIONS.keys()))
+with col2:
+    metric_label = st.selectbox("Métrica", options=list(PRICE_METRICS.keys()))
+with col3:
+    type_options = ['Todos'] + (sorted(df_market['property_type'].dropna().unique().tolist()) if df_market is not None else PROPERTY_TYPES)
+    selected_type = st.selectbox("Tipo de Propiedad", options=type_options)
+with col4:
+    selected_listing_type = st.selectbox("Operación", options=['Todas', 'venta', 'renta'])
+
+by = GROUP_DIMENSIONS[dimension_label]
+metric = PRICE_METRICS[metric_label]
+property_type = None if selected_type == 'Todos' else selected_type
+listing_type = None if selected_listing_type == 'Todas' else selected_listing_type
+
+# --- Resumen por grupo ---
+st.header(f"{metric_label} por {dimension_label.lower()}")
+with profiler.phase("resumen"):
+    if df_market is not None:
+        summary = load_group_summary(df_market, version, by, metric, property_type, listing_type)
+    else:
+        st.caption("⏳ Cargando la caché local; el resumen se calcula en el servidor.")
+        try:
+            summary = load_server_summary(by, metric, property_type, listing_type)
+        except Exception as e:
+            st.warning(f"No se pudo calcular el resumen en el servidor (¿falta market_analytics.sql?): {e}")
+            st.stop()
+
+if summary.empty:
+    st.info("No hay propiedades con datos para esta combinación.")
+    st.stop()
+
+st.dataframe(
+    summary,
+    width="stretch",
+    hide_index=True,
+    column_config={
+        by: dimension_label,
+        'listings': st.column_config.NumberColumn('Anuncios'),
+        'p25': st.column_config.NumberColumn('Percentil 25', format="$%.0f"),
+        'median': st.column_config.NumberColumn('Mediana', format="$%.0f"),
+        'p75': st.column_config.NumberColumn('Percentil 75', format="$%.0f"),
+        'mean': st.column_config.NumberColumn('Promedio', format="$%.0f"),
+        'median_days_on_market': st.column_config.NumberColumn('Mediana días en mercado', format="%.0f"),
+    },
+)
+st.bar_chart(summary.head(20).set_index(by)['median'], horizontal=True, x_label=f"Mediana de {metric_label.lower()}")
+
+if df_market is None:
+    st.info("Los días en el mercado y las tendencias se muestran cuando termina la carga de la caché local.")
+    st.stop()
+
+# --- Días en el mercado ---
+st.header(f"Días en el mercado por {dimension_label.lower()}")
+with profiler.phase("días en el mercado"):
+    distribution = load_days_on_market(df_market, version, by, property_type, listing_type)
+if distribution.empty:
+    st.info("No hay datos de días en el mercado.")
+else:
+    st.bar_chart(distribution.head(20), horizontal=True, stack=True)
+
+# --- Tendencia por fecha de publicación ---
+st.header(f"Tendencia de {metric_label.lower()} por fecha de publicación")
+trend_col1, trend_col2 = st.columns([2, 1])
+with trend_col1:
+    window = st.slider("Ventana móvil (días)", min_value=7, max_value=180, value=30, step=1)
+with trend_col2:
+    split_by_group = st.checkbox(f"Separar por {dimension_label.lower()} (5 principales)")
+
+top_groups = tuple(summary[by].head(5).tolist()) if split_by_group else ()
+with profiler.phase("tendencia"):
+    rolling = load_rolling(
+        df_market, version, metric, window, by if split_by_group else None, top_groups, property_type, listing_type
+    )
+if rolling.empty:
+    st.info("No hay propiedades con fecha de publicación.")
+elif split_by_group:
+    st.line_chart(rolling, x='publication_date', y='rolling_median', color=by)
+else:
+    st.line_chart(rolling.set_index('publication_date')[['daily_median', 'rolling_median']])
+    st.bar_chart(rolling.set_index('publication_date')['listings'], y_label="Anuncios publicados")
+
+profiler.commit(rerun_trace, finished=True)
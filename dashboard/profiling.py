@@ -0,0 +1,341 @@
+import bisect
+import functools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import streamlit as st
+
+# --- Tiempos de ejecución del dashboard y llamadas a Supabase ---
+
+# Límites (segundos) de los histogramas exportados en formato Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Ejecuciones y llamadas recientes que se guardan con detalle
+RECENT_RERUNS = 50
+RECENT_CALLS = 200
+# Página de las llamadas hechas fuera de una ejecución del script (caché
+# local, cola de escrituras, duplicados)
+BACKGROUND = "segundo plano"
+
+# Nombre -> (tipo, descripción, etiquetas)
+METRICS = {
+    'hoom_rerun_seconds': ('histogram', "Duración de cada ejecución del script.", ('page',)),
+    'hoom_phase_seconds': ('histogram', "Duración de cada fase de una ejecución.", ('page', 'phase')),
+    'hoom_supabase_request_seconds': ('histogram', "Latencia de cada llamada a Supabase.", ('target', 'method')),
+    'hoom_supabase_requests_total': ('counter', "Llamadas a Supabase.", ('target', 'method', 'status')),
+    'hoom_supabase_rows_total': ('counter', "Filas devueltas por Supabase.", ('target', 'method')),
+    'hoom_supabase_response_bytes_total': ('counter', "Bytes de respuesta de Supabase.", ('target', 'method')),
+    'hoom_cache_requests_total': ('counter', "Llamadas a funciones con st.cache_data.", ('function', 'result')),
+}
+
+# Métodos de los query builders que definen el tipo de llamada
+QUERY_METHODS = {"select", "insert", "update", "upsert", "delete"}
+
+# Ejecución en curso y bytes recibidos, por hilo: Streamlit ejecuta cada
+# script en su propio hilo y httpx llama a sus hooks en el hilo que hace
+# la petición
+_local = threading.local()
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+
+class RerunTrace:
+    """Fases y llamadas a Supabase de una ejecución del script."""
+
+    def __init__(self, page):
+        self.page = page
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.last_activity = self.start
+        self.end = None
+        self.phases = []
+        self.calls = []
+
+    def to_dict(self):
+        end = self.end if self.end is not None else self.last_activity
+        return {
+            'page': self.page,
+            'started_at': self.started_at.isoformat(),
+            'seconds': end - self.start,
+            # Una ejecución interrumpida (st.stop, st.rerun o una excepción)
+            # se cierra con su última actividad registrada
+            'interrupted': self.end is None,
+            'phases': [
+                {'phase': name, 'offset': offset, 'seconds': seconds} for name, offset, seconds in self.phases
+            ],
+            'supabase_calls': len(self.calls),
+            'supabase_seconds': sum(call['seconds'] for call in self.calls),
+        }
+
+
+class Profiler:
+    """Métricas de rendimiento del proceso, compartidas por todas las sesiones.
+
+    Registra la duración de cada ejecución del script y de sus fases, cada
+    llamada a Supabase hecha con un `InstrumentedClient` y los aciertos y
+    fallos de las funciones decoradas con `Profiler.cache_data`. Los
+    histogramas y contadores se exportan como JSON o texto de Prometheus.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = defaultdict(_Histogram)
+            self._counters = defaultdict(float)
+            self.reruns = deque(maxlen=RECENT_RERUNS)
+            self.calls = deque(maxlen=RECENT_CALLS)
+
+    # --- Ejecuciones y fases ---
+
+    def begin(self, page):
+        """Empieza la ejecución del script en el hilo actual."""
+        trace = _local.trace = RerunTrace(page)
+        return trace
+
+    def commit(self, trace, finished=False):
+        """Guarda `trace`; solo la primera vez que se llama para cada ejecución."""
+        if finished:
+            trace.end = time.perf_counter()
+        with self._lock:
+            if getattr(trace, 'committed', False):
+                return
+            trace.committed = True
+            summary = trace.to_dict()
+            self.reruns.append(summary)
+            self._histograms['hoom_rerun_seconds', (trace.page,)].observe(summary['seconds'])
+        if getattr(_local, 'trace', None) is trace:
+            _local.trace = None
+
+    @contextmanager
+    def phase(self, name):
+        """Mide un bloque de la ejecución actual, p. ej. `with profiler.phase("tarjetas"):`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            trace = getattr(_local, 'trace', None)
+            page = trace.page if trace is not None else BACKGROUND
+            if trace is not None:
+                trace.phases.append((name, start - trace.start, end - start))
+                trace.last_activity = end
+            with self._lock:
+                self._histograms['hoom_phase_seconds', (page, name)].observe(end - start)
+
+    # --- Supabase y caché ---
+
+    def record_call(self, target, method, seconds, rows=None, response_bytes=None, error=None):
+        trace = getattr(_local, 'trace', None)
+        call = {
+            'at': datetime.now(timezone.utc).isoformat(),
+            'page': trace.page if trace is not None else BACKGROUND,
+            'target': target,
+            'method': method,
+            'seconds': seconds,
+            'rows': rows,
+            'bytes': response_bytes,
+            'error': error,
+        }
+        if trace is not None:
+            trace.calls.append(call)
+            trace.last_activity = time.perf_counter()
+        labels = (target, method)
+        with self._lock:
+            self.calls.append(call)
+            self._histograms['hoom_supabase_request_seconds', labels].observe(seconds)
+            self._counters['hoom_supabase_requests_total', labels + ("error" if error else "ok",)] += 1
+            if rows is not None:
+                self._counters['hoom_supabase_rows_total', labels] += rows
+            if response_bytes is not None:
+                self._counters['hoom_supabase_response_bytes_total', labels] += response_bytes
+
+    def record_cache(self, function, hit):
+        with self._lock:
+            self._counters['hoom_cache_requests_total', (function, "hit" if hit else "miss")] += 1
+
+    def cache_data(self, **options):
+        """Igual que `st.cache_data(**options)`, pero cuenta aciertos y fallos.
+
+        Un fallo es una llamada en la que se ejecutó la función; Streamlit
+        usa el código y el nombre de la función original como llave.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def compute(*args, **kwargs):
+                _local.cache_miss = True
+                return func(*args, **kwargs)
+
+            cached = st.cache_data(**options)(compute)
+
+            @functools.wraps(func)
+            def call(*args, **kwargs):
+                # Las funciones memorizadas pueden llamarse entre sí
+                outer_miss = getattr(_local, 'cache_miss', False)
+                _local.cache_miss = False
+                try:
+                    result = cached(*args, **kwargs)
+                    self.record_cache(func.__name__, hit=not _local.cache_miss)
+                    return result
+                finally:
+                    _local.cache_miss = outer_miss
+
+            call.clear = cached.clear
+            return call
+        return decorator
+
+    # --- Exportación ---
+
+    def metrics(self):
+        """Métricas agregadas: nombre -> lista de {'labels', 'value'} o {'labels', 'count', 'sum', 'max', 'buckets'}."""
+        with self._lock:
+            histograms = {
+                key: {'count': h.count, 'sum': h.sum, 'max': h.max, 'buckets': list(h.buckets)}
+                for key, h in self._histograms.items()
+            }
+            counters = dict(self._counters)
+        result = {name: [] for name in METRICS}
+        for (name, labels), histogram in sorted(histograms.items()):
+            result[name].append({'labels': dict(zip(METRICS[name][2], labels)), **histogram})
+        for (name, labels), value in sorted(counters.items()):
+            result[name].append({'labels': dict(zip(METRICS[name][2], labels)), 'value': value})
+        return result
+
+    def to_json(self):
+        with self._lock:
+            reruns, calls = list(self.reruns), list(self.calls)
+        return json.dumps({
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'latency_buckets': LATENCY_BUCKETS,
+            'metrics': self.metrics(),
+            'recent_reruns': reruns,
+            'recent_calls': calls,
+        }, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Métricas en el formato de texto de Prometheus (histogramas acumulados)."""
+        lines = []
+        for name, samples in self.metrics().items():
+            kind, description, _ = METRICS[name]
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+            for sample in samples:
+                labels = sample['labels']
+                if kind == 'counter':
+                    lines.append(f"{name}{_labels(labels)} {_number(sample['value'])}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), sample['buckets']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(dict(labels, le=str(bound)))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(sample['sum'])}")
+                lines.append(f"{name}_count{_labels(labels)} {sample['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value):
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# --- Cliente de Supabase instrumentado ---
+
+def _count_response_bytes(response):
+    response.read()
+    _local.response_bytes = getattr(_local, 'response_bytes', 0) + len(response.content)
+
+
+class InstrumentedClient:
+    """Envuelve un cliente de Supabase y registra cada `execute()` en `profiler`.
+
+    Los query builders se envuelven en cada paso de la cadena, así que el
+    resto del código no cambia. Los bytes se miden con un hook de httpx en la
+    sesión de PostgREST; si la versión del cliente no la expone, quedan en None.
+    """
+
+    def __init__(self, client, profiler):
+        self._client = client
+        self._profiler = profiler
+        self._counts_bytes = False
+        try:
+            session = client.postgrest.session
+            hooks = session.event_hooks
+            session.event_hooks = {**hooks, 'response': [*hooks.get('response', []), _count_response_bytes]}
+            self._counts_bytes = True
+        except AttributeError:
+            pass
+
+    def from_(self, table):
+        return _InstrumentedQuery(self._client.from_(table), self, table, "select")
+
+    def table(self, table):
+        return self.from_(table)
+
+    def rpc(self, function, *args, **kwargs):
+        return _InstrumentedQuery(self._client.rpc(function, *args, **kwargs), self, f"rpc:{function}", "rpc")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _InstrumentedQuery:
+    def __init__(self, builder, client, target, method):
+        self._builder = builder
+        self._client = client
+        self._target = target
+        self._method = method
+
+    def _wrap(self, result, name):
+        if not hasattr(result, 'execute'):
+            return result
+        method = name if name in QUERY_METHODS and self._method != "rpc" else self._method
+        return _InstrumentedQuery(result, self._client, self._target, method)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._builder, name)
+        if not callable(attribute):
+            return self._wrap(attribute, name)
+
+        @functools.wraps(attribute)
+        def call(*args, **kwargs):
+            return self._wrap(attribute(*args, **kwargs), name)
+        return call
+
+    def execute(self):
+        _local.response_bytes = 0
+        start = time.perf_counter()
+        try:
+            response = self._builder.execute()
+        except Exception as e:
+            self._client._profiler.record_call(self._target, self._method, time.perf_counter() - start, error=str(e))
+            raise
+        data = getattr(response, 'data', None)
+        rows = len(data) if isinstance(data, list) else int(data is not None)
+        self._client._profiler.record_call(
+            self._target, self._method, time.perf_counter() - start, rows=rows,
+            response_bytes=_local.response_bytes if self._client._counts_bytes else None,
+        )
+        return response
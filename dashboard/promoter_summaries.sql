@@ -0,0 +1,22 @@
+-- Resumen de propiedades por promotor para la página de Gestión de Promotores.
+-- Evita traer todas las propiedades de cada promotor solo para contarlas.
+CREATE OR REPLACE VIEW public.promoter_summaries
+WITH (security_invoker = true) AS
+SELECT
+    p.id,
+    p.name,
+    p.company,
+    p.phone,
+    p.email,
+    COUNT(pr.id) AS property_count,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY pr.price) AS median_price,
+    COALESCE(
+        array_agg(DISTINCT pr.property_type::text) FILTER (WHERE pr.property_type IS NOT NULL),
+        '{}'
+    ) AS property_types
+FROM public.promoters p
+LEFT JOIN public.properties pr ON pr.promoter_id = p.id
+GROUP BY p.id;
+
+-- Índice para el conteo anterior y para cargar las propiedades de un promotor
+CREATE INDEX IF NOT EXISTS properties_promoter_id_idx ON public.properties (promoter_id);
@@ -0,0 +1,327 @@
+import threading
+import time
+
+import pandas as pd
+
+from filter_index import PropertyFilterIndex
+from queries import (
+    PROPERTY_LIST_COLUMNS,
+    PROPERTY_LIST_FIELDS,
+    compact_properties,
+    prepare_properties,
+    quote_filter_value,
+)
+
+# --- Caché local de propiedades con sincronización incremental ---
+
+# PostgREST limita el número de filas por respuesta; se descarga por bloques
+SYNC_PAGE_SIZE = 1000
+# Segundos mínimos entre dos consultas de cambios
+POLL_INTERVAL = 30
+# Cada consulta de cambios vuelve a pedir los últimos segundos antes de la
+# marca de agua: updated_at es la hora de inicio de la transacción, así que
+# una inserción lenta puede confirmarse con una hora anterior a la marca
+WATERMARK_LAG = 60
+# Ids por consulta con in_("id", ...) (van en la URL): columnas que la caché
+# no guarda y filas que se vuelven a leer
+EXTRA_COLUMNS_CHUNK_SIZE = 200
+
+
+class PropertyCache:
+    """Copia local de las columnas de la vista de tarjetas.
+
+    La primera carga descarga la tabla completa en segundo plano. Después
+    solo se piden las filas con `updated_at` posterior a la marca de agua,
+    también en segundo plano, y las escrituras del propio dashboard se
+    aplican localmente sin recargar. Cada cambio incrementa `version`.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.RLock()
+        # Una sola consulta de cambios a la vez (segundo plano o "Recargar Datos")
+        self._poll_lock = threading.Lock()
+        self._df = None
+        self._watermark = None
+        self._last_poll = 0.0
+        self._sync_thread = None
+        self._filter_index = None
+        self.version = 0
+        self.last_error = None
+
+    @property
+    def ready(self):
+        return self._df is not None
+
+    def snapshot(self):
+        # Las mutaciones reemplazan el DataFrame, así que la referencia es estable
+        with self._lock:
+            return self._df
+
+    def filter_index(self):
+        # Se reconstruye solo cuando cambió la versión de los datos
+        with self._lock:
+            if self._df is None:
+                return None
+            if self._filter_index is None or self._filter_index.df is not self._df:
+                self._filter_index = PropertyFilterIndex(self._df)
+            return self._filter_index
+
+    # --- Sincronización ---
+
+    def ensure_synced(self):
+        """Inicia en segundo plano la carga completa o la consulta de cambios recientes.
+
+        No espera: la ejecución de la página usa la copia que ya tiene.
+        """
+        with self._lock:
+            if self._sync_thread is not None and self._sync_thread.is_alive():
+                return
+            if self._df is None:
+                target, name = self._full_sync, "property-cache-sync"
+            elif time.monotonic() - self._last_poll >= POLL_INTERVAL:
+                # Aunque la consulta falle, no se reintenta antes del intervalo
+                self._last_poll = time.monotonic()
+                target, name = self._background_poll, "property-cache-poll"
+            else:
+                return
+            self._sync_thread = threading.Thread(target=target, name=name, daemon=True)
+            self._sync_thread.start()
+
+    def _full_sync(self):
+        try:
+            rows = self._fetch_since(None)
+            df_properties = self._to_frame(rows)
+            with self._lock:
+                self._df = df_properties
+                self._watermark = self._max_updated_at(rows)
+                self._last_poll = time.monotonic()
+                self.version += 1
+                self.last_error = None
+        except Exception as e:
+            self.last_error = e
+
+    def _background_poll(self):
+        try:
+            self.poll()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+
+    def poll(self):
+        """Aplica las filas modificadas desde la última sincronización y detecta eliminaciones."""
+        with self._poll_lock:
+            with self._lock:
+                if self._df is None:
+                    return
+                watermark = self._watermark
+            since = None
+            if watermark is not None:
+                since = (pd.Timestamp(watermark) - pd.Timedelta(seconds=WATERMARK_LAG)).isoformat()
+            rows = self._fetch_since(since)
+            with self._lock:
+                rows = self._changed_rows(rows)
+                if rows:
+                    self._upsert_rows(rows)
+                    self._watermark = max(filter(None, [self._watermark, self._max_updated_at(rows)]), key=pd.Timestamp)
+                self._last_poll = time.monotonic()
+                cached_count = len(self._df)
+
+            # Las eliminaciones no dejan rastro en updated_at; solo si el conteo
+            # no coincide se descarga la lista de ids.
+            remote_count = (
+                self._client.from_("properties").select("id", count="exact", head=True).execute().count or 0
+            )
+            if remote_count == cached_count:
+                return
+            remote_ids = set(row["id"] for row in self._fetch_ids())
+            with self._lock:
+                stale_ids = self._df.index.difference(list(remote_ids))
+                missing_ids = list(remote_ids.difference(self._df.index))
+                if len(stale_ids):
+                    self._df = self._df.drop(stale_ids)
+                    self.version += 1
+            # Filas confirmadas con un updated_at anterior a la ventana
+            if missing_ids:
+                self.refresh(missing_ids)
+
+    def _fetch_since(self, watermark):
+        # Paginación por llave (updated_at, id): estable aunque la tabla cambie
+        rows = []
+        last = None
+        while True:
+            query = self._client.from_("properties").select(PROPERTY_LIST_COLUMNS)
+            if last is not None:
+                ts, row_id = quote_filter_value(last["updated_at"]), quote_filter_value(last["id"])
+                query = query.or_(f"updated_at.gt.{ts},and(updated_at.eq.{ts},id.gt.{row_id})")
+            elif watermark is not None:
+                # gte: vuelve a traer las filas con la misma marca, la aplicación es idempotente
+                query = query.gte("updated_at", watermark)
+            response = query.order("updated_at").order("id").limit(SYNC_PAGE_SIZE).execute()
+            batch = response.data or []
+            rows.extend(batch)
+            if len(batch) < SYNC_PAGE_SIZE:
+                return rows
+            last = batch[-1]
+
+    def _fetch_ids(self):
+        ids = []
+        while True:
+            batch = (
+                self._client.from_("properties").select("id")
+                .order("id")
+                .range(len(ids), len(ids) + SYNC_PAGE_SIZE - 1)
+                .execute()
+            ).data or []
+            ids.extend(batch)
+            if len(batch) < SYNC_PAGE_SIZE:
+                return ids
+
+    def _changed_rows(self, rows):
+        # Las filas de la ventana que la caché ya tiene con el mismo updated_at no cambian nada
+        cached = self._df['updated_at']
+        return [
+            row for row in rows
+            if row["id"] not in cached.index or cached[row["id"]] != pd.Timestamp(row["updated_at"])
+        ]
+
+    @staticmethod
+    def _max_updated_at(rows):
+        timestamps = [row["updated_at"] for row in rows if row.get("updated_at")]
+        return max(timestamps, key=pd.Timestamp) if timestamps else None
+
+    @staticmethod
+    def _to_frame(rows):
+        df_properties = prepare_properties(pd.DataFrame(rows, columns=PROPERTY_LIST_FIELDS))
+        return df_properties.set_index("id", drop=False).rename_axis(None)
+
+    def _upsert_rows(self, rows):
+        delta = self._to_frame(rows)
+        # concat pierde las categorías cuando no coinciden; se restauran los tipos
+        self._df = compact_properties(pd.concat([self._df.drop(delta.index, errors="ignore"), delta]))
+        self.version += 1
+
+    # --- Escrituras locales ---
+
+    def apply_update(self, property_id, changes):
+        self.apply_update_many([property_id], changes)
+
+    def apply_update_many(self, property_ids, changes):
+        """Aplica el mismo cambio a varias filas de la caché (escrituras propias o en cola)."""
+        changes = dict(changes)
+        if "photos" in changes:
+            photos = changes.pop("photos")
+            changes["main_photo"] = photos[0] if photos else None
+        with self._lock:
+            if not self.ready:
+                return
+            property_ids = self._df.index.intersection(list(property_ids))
+            if not len(property_ids):
+                return
+            df_properties = self._df.copy()
+            for column, value in changes.items():
+                if column not in df_properties.columns:
+                    continue
+                series = df_properties[column]
+                if isinstance(series.dtype, pd.CategoricalDtype) and value is not None and value not in series.cat.categories:
+                    df_properties[column] = series.cat.add_categories([value])
+                df_properties.loc[property_ids, column] = value
+            self._df = df_properties
+            self.version += 1
+
+    def refresh(self, property_ids):
+        """Vuelve a leer del servidor las filas indicadas (p. ej. tras un envío fallido)."""
+        property_ids = list(property_ids)
+        rows = []
+        for start in range(0, len(property_ids), EXTRA_COLUMNS_CHUNK_SIZE):
+            chunk = property_ids[start:start + EXTRA_COLUMNS_CHUNK_SIZE]
+            response = self._client.from_("properties").select(PROPERTY_LIST_COLUMNS).in_("id", chunk).execute()
+            rows.extend(response.data or [])
+        with self._lock:
+            if not self.ready:
+                return
+            if rows:
+                self._upsert_rows(rows)
+            missing_ids = set(property_ids) - set(row["id"] for row in rows)
+            if missing_ids:
+                self._df = self._df.drop(list(missing_ids), errors="ignore")
+                self.version += 1
+
+    def apply_delete(self, property_ids):
+        with self._lock:
+            if not self.ready:
+                return
+            self._df = self._df.drop(list(property_ids), errors="ignore")
+            self.version += 1
+
+
+class CacheFollower:
+    """Mantiene al día índices derivados de la caché (duplicados, búsqueda).
+
+    En cada versión nueva de la caché procesa en segundo plano solo las
+    filas nuevas o modificadas (por `updated_at`) y las eliminadas. Las
+    columnas que la caché no guarda (`extra_columns`, p. ej. la descripción)
+    se piden una sola vez por bloques de ids y se reparten a todos los
+    `consumers`, que implementan `add(records)`, `remove(ids)` y `publish()`.
+    """
+
+    def __init__(self, client, consumers, extra_columns="id, description"):
+        self._client = client
+        self.consumers = list(consumers)
+        self._extra_columns = extra_columns
+        self._lock = threading.Lock()
+        self._thread = None
+        self._seen = pd.Series(dtype=object)
+        self._source_df = None
+        self.ready = False
+        self.last_error = None
+
+    def ensure_synced(self, df_properties):
+        if df_properties is None or df_properties is self._source_df:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._sync, args=(df_properties,), name="cache-follower", daemon=True)
+            self._thread.start()
+
+    def _sync(self, df_properties):
+        try:
+            current = df_properties['updated_at'].astype(str)
+            previous = self._seen.reindex(current.index)
+            changed_ids = current.index[current.ne(previous)].tolist()
+            removed_ids = self._seen.index.difference(current.index).tolist()
+
+            for consumer in self.consumers:
+                consumer.remove(removed_ids)
+            for start in range(0, len(changed_ids), EXTRA_COLUMNS_CHUNK_SIZE):
+                records = self._records(df_properties.loc[changed_ids[start:start + EXTRA_COLUMNS_CHUNK_SIZE]])
+                for consumer in self.consumers:
+                    # Cada índice puede modificar sus registros (p. ej. agregar el pHash)
+                    consumer.add([dict(record) for record in records])
+                if start % (EXTRA_COLUMNS_CHUNK_SIZE * 25) == 0:
+                    # Resultados parciales durante la primera carga
+                    for consumer in self.consumers:
+                        consumer.publish()
+
+            for consumer in self.consumers:
+                consumer.publish()
+            self._seen = current
+            self._source_df = df_properties
+            self.ready = True
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+
+    def _records(self, df_chunk):
+        records = df_chunk.astype(object).where(df_chunk.notna(), None).to_dict('records')
+        if self._extra_columns:
+            response = (
+                self._client.from_("properties").select(self._extra_columns)
+                .in_("id", df_chunk['id'].tolist())
+                .execute()
+            )
+            extra = {row["id"]: row for row in response.data or []}
+            for record in records:
+                record.update(extra.get(record['id'], {}))
+        return records
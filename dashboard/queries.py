@@ -0,0 +1,305 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from spatial_index import area_mask
+
+# --- Consultas a Supabase para la vista de propiedades ---
+
+# Columnas de la vista de tarjetas y de la página de análisis. De las fotos
+# solo se trae la principal; la descripción y la galería completa se cargan
+# bajo demanda.
+PROPERTY_LIST_COLUMNS = (
+    "id, created_at, source_portal, property_url, title, price, location_text, "
+    "latitude, longitude, land_area_m2, construction_area_m2, bedrooms, "
+    "full_bathrooms, half_bathrooms, parking_spaces, levels, property_type, "
+    "listing_type, publication_date, days_on_market, "
+    "promoter_id, updated_at, main_photo:photos->>0"
+)
+PROPERTY_LIST_FIELDS = [c.split(":")[0].strip() for c in PROPERTY_LIST_COLUMNS.split(",")]
+
+UNKNOWN_PORTAL = "Desconocido"
+# Filas por respuesta de PostgREST (max-rows) al recorrer una tabla
+SCAN_PAGE_SIZE = 1000
+NO_PROMOTER = "Sin Promotor"
+
+# Valores de property_type_enum (add_property_type_to_properties.sql y expand_property_types.sql)
+PROPERTY_TYPES = ['casa', 'terreno', 'departamento', 'oficina', 'local_comercial', 'bodega']
+
+# Tipos compactos de las columnas de la vista de tarjetas
+CATEGORY_COLUMNS = ['source_portal', 'property_type', 'listing_type']
+INTEGER_COLUMNS = {
+    'bedrooms': 'Int16',
+    'full_bathrooms': 'Int16',
+    'half_bathrooms': 'Int16',
+    'parking_spaces': 'Int16',
+    'levels': 'Int16',
+    'days_on_market': 'Int16',
+    'land_area_m2': 'Int32',
+    'construction_area_m2': 'Int32',
+    'promoter_id': 'Int32',
+}
+STRING_COLUMNS = ['id', 'title', 'location_text', 'property_url', 'main_photo']
+
+
+# Errores de PostgREST por una tabla, vista, columna o función que no existe
+# en la base (falta aplicar el .sql correspondiente)
+MISSING_OBJECT_CODES = {'42P01', '42703', '42704', '42883', 'PGRST202', 'PGRST205'}
+
+
+def is_missing_object(error):
+    return getattr(error, 'code', None) in MISSING_OBJECT_CODES
+
+
+def quote_filter_value(value):
+    # PostgREST requiere comillas para valores con caracteres reservados (, . : ( ))
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def _in_or_null(column, values, include_null):
+    # Construye un filtro `or` equivalente a `column IN (...) OR column IS NULL`
+    parts = []
+    if values:
+        parts.append(f"{column}.in.({','.join(quote_filter_value(v) for v in values)})")
+    if include_null:
+        parts.append(f"{column}.is.null")
+    return ",".join(parts)
+
+
+def apply_property_filters(
+    query,
+    portals=None,
+    promoter_ids=None,
+    include_no_promoter=True,
+    property_type=None,
+    min_price=None,
+    max_price=None,
+    exclude_fraccionamientos=False,
+    search=None,
+):
+    """Agrega a `query` los filtros del dashboard.
+
+    Un filtro en `None` no se aplica. `portals` puede incluir
+    `UNKNOWN_PORTAL` para las propiedades sin portal; `include_no_promoter`
+    solo se usa cuando se filtra por `promoter_ids`. `search` usa la
+    columna `search_vector` de text_search.sql.
+    """
+    if portals is not None:
+        portal_names = [p for p in portals if p != UNKNOWN_PORTAL]
+        condition = _in_or_null("source_portal", portal_names, UNKNOWN_PORTAL in portals)
+        query = query.or_(condition) if condition else query.in_("id", [])
+
+    if promoter_ids is not None:
+        condition = _in_or_null("promoter_id", promoter_ids, include_no_promoter)
+        query = query.or_(condition) if condition else query.in_("id", [])
+
+    if property_type is not None:
+        query = query.eq("property_type", property_type)
+
+    if min_price is not None:
+        query = query.gte("price", min_price)
+    if max_price is not None:
+        query = query.lte("price", max_price)
+
+    if exclude_fraccionamientos:
+        # Las propiedades sin título no se excluyen
+        query = query.or_("title.is.null,title.not.ilike.*fraccionamiento*")
+
+    if search is not None:
+        query = query.text_search(
+            "search_vector", search, options={"config": "public.spanish_unaccent", "type": "web_search"}
+        )
+
+    return query
+
+
+def prepare_properties(df_properties):
+    # Tipos de columnas de la vista de tarjetas
+    df_properties['created_at'] = pd.to_datetime(df_properties['created_at'], utc=True)
+    df_properties['updated_at'] = pd.to_datetime(df_properties['updated_at'], utc=True)
+    df_properties['publication_date'] = pd.to_datetime(df_properties['publication_date'], errors='coerce')
+    df_properties['price'] = pd.to_numeric(df_properties['price'], errors='coerce')
+    df_properties['latitude'] = pd.to_numeric(df_properties['latitude'], errors='coerce')
+    df_properties['longitude'] = pd.to_numeric(df_properties['longitude'], errors='coerce')
+    return compact_properties(df_properties)
+
+
+def compact_properties(df_properties):
+    """Convierte las columnas a tipos compactos; se puede aplicar varias veces.
+
+    Categorías para los valores repetidos, enteros con nulos para conteos y
+    superficies y cadenas de Arrow para el texto.
+    """
+    df_properties['source_portal'] = df_properties['source_portal'].astype(object).fillna(UNKNOWN_PORTAL)
+    for column in CATEGORY_COLUMNS:
+        df_properties[column] = df_properties[column].astype('category')
+    for column, dtype in INTEGER_COLUMNS.items():
+        df_properties[column] = pd.to_numeric(df_properties[column], errors='coerce').round().astype(dtype)
+    for column in STRING_COLUMNS:
+        df_properties[column] = df_properties[column].astype(pd.StringDtype('pyarrow'))
+    return df_properties
+
+
+def add_promoter_names(df_properties, df_promoters):
+    # Nombre del promotor como categoría, unido por id contra el catálogo
+    categories = pd.Index(df_promoters['name'].tolist() + [NO_PROMOTER]).unique()
+    name_codes = categories.get_indexer(df_promoters['name'])
+    positions = pd.Index(df_promoters['id']).get_indexer(df_properties['promoter_id'])
+    # take con mode='clip' no falla con -1 ni con un catálogo vacío; np.where descarta esos valores
+    matched = name_codes.take(positions, mode='clip') if len(name_codes) else 0
+    codes = np.where(positions >= 0, matched, categories.get_loc(NO_PROMOTER))
+    df_properties = df_properties.copy()
+    df_properties['promoter_name'] = pd.Categorical.from_codes(codes, categories=categories)
+    return df_properties
+
+
+def filter_options(df_properties):
+    # Opciones de los filtros a partir de un DataFrame local
+    portals = sorted(df_properties['source_portal'].fillna(UNKNOWN_PORTAL).unique().tolist())
+    property_types = sorted(df_properties['property_type'].dropna().unique().tolist())
+    max_price = float(df_properties['price'].max()) if df_properties['price'].notna().any() else 0.0
+    return portals, property_types, max_price
+
+
+def filter_properties(
+    df_properties,
+    portals=None,
+    promoter_ids=None,
+    include_no_promoter=True,
+    property_type=None,
+    min_price=None,
+    max_price=None,
+    exclude_fraccionamientos=False,
+    area=None,
+):
+    """Misma semántica que `apply_property_filters` y `area`, sobre un DataFrame local.
+
+    La búsqueda de texto no se resuelve aquí sino con `text_search.TextSearchIndex`.
+    """
+    mask = pd.Series(True, index=df_properties.index)
+    if portals is not None:
+        mask &= df_properties['source_portal'].isin(portals)
+    if promoter_ids is not None:
+        promoter_mask = df_properties['promoter_id'].isin(promoter_ids)
+        if include_no_promoter:
+            promoter_mask |= df_properties['promoter_id'].isna()
+        mask &= promoter_mask
+    if property_type is not None:
+        mask &= df_properties['property_type'] == property_type
+    if min_price is not None:
+        mask &= df_properties['price'] >= min_price
+    if max_price is not None:
+        mask &= df_properties['price'] <= max_price
+    if exclude_fraccionamientos:
+        mask &= ~df_properties['title'].str.contains('fraccionamiento', case=False, na=False)
+    if area is not None:
+        mask &= area_mask(
+            df_properties['latitude'].to_numpy(dtype=float, na_value=np.nan),
+            df_properties['longitude'].to_numpy(dtype=float, na_value=np.nan),
+            area,
+        )
+    return df_properties[mask]
+
+
+def properties_query(client, columns, area=None, count=None, head=False):
+    """Consulta base sobre properties, o sobre las funciones de spatial_search.sql si hay `area`.
+
+    Las funciones devuelven filas de properties, así que admiten los mismos
+    filtros, orden y paginación.
+    """
+    if area is None:
+        return client.from_("properties").select(columns, count=count, head=head)
+    if 'polygon' in area:
+        # GeoJSON usa (lon, lat) y el anillo cerrado
+        ring = [[lon, lat] for lat, lon in area['polygon']]
+        params = {"polygon": json.dumps({"type": "Polygon", "coordinates": [ring + ring[:1]]})}
+        return client.rpc("properties_within_polygon", params, count=count, head=head).select(columns)
+    params = {
+        "center_latitude": area['latitude'],
+        "center_longitude": area['longitude'],
+        "radius_m": area['radius_m'],
+    }
+    return client.rpc("properties_within_radius", params, count=count, head=head).select(columns)
+
+
+def count_properties(client, filters):
+    filters = dict(filters)
+    area = filters.pop('area', None)
+    response = apply_property_filters(
+        properties_query(client, "id", area, count="exact", head=True), **filters
+    ).execute()
+    return response.count or 0
+
+
+def fetch_property_page(client, filters, sort_column, ascending, offset, limit):
+    filters = dict(filters)
+    area = filters.pop('area', None)
+    query = apply_property_filters(properties_query(client, PROPERTY_LIST_COLUMNS, area), **filters)
+    response = (
+        query.order(sort_column, desc=not ascending, nullsfirst=False)
+        .order("id")
+        .range(offset, offset + limit - 1)
+        .execute()
+    )
+    return prepare_properties(pd.DataFrame(response.data or [], columns=PROPERTY_LIST_FIELDS))
+
+
+def fetch_property(client, property_id):
+    # Fila completa (descripción y todas las fotos) de una sola propiedad
+    response = client.from_("properties").select("*").eq("id", property_id).limit(1).execute()
+    return response.data[0] if response.data else None
+
+
+def fetch_filter_options(client):
+    """Portales, tipos de propiedad y precio máximo para los filtros (filter_options.sql).
+
+    Si la función no existe en la base, se leen las dos columnas por páginas.
+    """
+    try:
+        response = client.rpc("property_filter_options", {}).execute()
+    except Exception:
+        return _scan_filter_options(client)
+    options = (response.data or [{}])[0]
+    portals = sorted(UNKNOWN_PORTAL if portal is None else portal for portal in options.get("portals") or [])
+    property_types = sorted(options.get("property_types") or [])
+    return portals, property_types, float(options.get("max_price") or 0.0)
+
+
+def scan_pages(client, table, columns, where=None):
+    """Recorre `table` por páginas de SCAN_PAGE_SIZE filas (límite de PostgREST).
+
+    Paginación por llave sobre `id`, que debe estar en `columns`; `where`
+    recibe la consulta y le agrega filtros.
+    """
+    last_id = None
+    while True:
+        query = client.from_(table).select(columns)
+        if where is not None:
+            query = where(query)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        batch = query.order("id").limit(SCAN_PAGE_SIZE).execute().data or []
+        yield batch
+        if len(batch) < SCAN_PAGE_SIZE:
+            return
+        last_id = batch[-1]["id"]
+
+
+def _scan_filter_options(client):
+    # Solo columnas de baja cardinalidad
+    portals, property_types = set(), set()
+    for batch in scan_pages(client, "properties", "id, source_portal, property_type"):
+        portals.update(row["source_portal"] or UNKNOWN_PORTAL for row in batch)
+        property_types.update(row["property_type"] for row in batch if row["property_type"])
+
+    price_response = (
+        client.from_("properties").select("price")
+        .not_.is_("price", "null")
+        .order("price", desc=True)
+        .limit(1)
+        .execute()
+    )
+    max_price = float(price_response.data[0]["price"]) if price_response.data else 0.0
+    return sorted(portals), sorted(property_types), max_price
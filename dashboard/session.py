@@ -0,0 +1,181 @@
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+from backup import open_backup
+from profiling import InstrumentedClient, Profiler
+from property_cache import PropertyCache
+from write_queue import WriteQueue
+
+# --- Recursos compartidos entre las páginas del dashboard ---
+
+
+@st.cache_resource
+def get_profiler():
+    # Métricas de todo el proceso: todas las páginas y sesiones
+    return Profiler()
+
+
+@st.cache_resource
+def get_write_queue(_client):
+    # Una sola cola por proceso, compartida por todas las páginas y sesiones
+    return WriteQueue(_client)
+
+
+@st.cache_resource
+def get_property_cache(_client):
+    # Compartida por todas las sesiones; se sincroniza de forma incremental
+    return PropertyCache(_client)
+
+
+@st.cache_resource
+def get_offline_client(_profiler):
+    """Cliente de solo lectura sobre la copia de seguridad local, o None.
+
+    Se activa con `backup_dir` en la sección [offline] de secrets.toml;
+    con `at` (fecha ISO) se carga el estado de ese momento.
+    """
+    config = st.secrets.get("offline", {})
+    if not config.get("backup_dir"):
+        return None
+    return InstrumentedClient(open_backup(config["backup_dir"], at=config.get("at")), _profiler)
+
+
+def show_offline_notice(client):
+    backup_at = getattr(client, 'backup_at', None)
+    if backup_at is not None:
+        st.sidebar.warning(
+            f"Sin conexión: datos de la copia de seguridad del {backup_at:%Y-%m-%d %H:%M} UTC. "
+            "Los cambios no se guardan."
+        )
+
+
+def get_session_id():
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+
+@st.fragment(run_every=1)
+def show_write_status(write_queue):
+    # Muestra el resultado de los envíos de esta sesión sin recargar la página
+    for level, message in write_queue.drain_messages(get_session_id()):
+        st.toast(message, icon="✅" if level == "success" else "⚠️")
+
+
+# --- Panel de rendimiento ---
+
+
+def start_rerun(profiler, page):
+    """Empieza a medir esta ejecución del script.
+
+    Si la anterior de la sesión no llegó al final (`st.stop`, `st.rerun`),
+    se guarda aquí con su última actividad registrada.
+    """
+    previous = st.session_state.get('_profiling_trace')
+    if previous is not None:
+        profiler.commit(previous)
+    trace = st.session_state['_profiling_trace'] = profiler.begin(page)
+    return trace
+
+
+def show_profiling_panel(profiler):
+    # Se muestra con ?debug=1 en la URL o con panel = true en secrets.toml,
+    # sección [profiling]; las métricas se registran siempre
+    if st.query_params.get("debug") != "1" and not st.secrets.get("profiling", {}).get("panel", False):
+        return
+    with st.sidebar, profiler.phase("panel de rendimiento"):
+        _profiling_panel(profiler)
+
+
+@st.fragment(run_every=5)
+def _profiling_panel(profiler):
+    st.subheader("🩺 Rendimiento")
+    reruns = list(profiler.reruns)
+    if reruns:
+        last = reruns[-1]
+        st.caption(
+            f"Última ejecución ({last['page']}): {last['seconds'] * 1000:.0f} ms, "
+            f"{last['supabase_calls']} llamada(s) a Supabase ({last['supabase_seconds'] * 1000:.0f} ms)"
+            + (" · interrumpida" if last['interrupted'] else "")
+        )
+        df_phases = pd.DataFrame(last['phases'], columns=['phase', 'offset', 'seconds'])
+        st.dataframe(
+            df_phases.assign(offset=df_phases['offset'] * 1000, seconds=df_phases['seconds'] * 1000),
+            hide_index=True,
+            column_config={
+                'phase': 'Fase',
+                'offset': st.column_config.NumberColumn('Inicio (ms)', format="%.0f"),
+                'seconds': st.column_config.NumberColumn('Duración (ms)', format="%.1f"),
+            },
+        )
+        # Tabla y no gráfica: una gráfica de Altair costaría más que el resto del panel
+        df_reruns = pd.DataFrame(reruns[::-1], columns=['page', 'seconds', 'supabase_calls', 'interrupted'])
+        st.dataframe(
+            df_reruns.assign(seconds=df_reruns['seconds'] * 1000),
+            hide_index=True,
+            height=180,
+            column_config={
+                'page': 'Página',
+                'seconds': st.column_config.NumberColumn('ms', format="%.0f"),
+                'supabase_calls': 'Llamadas',
+                'interrupted': 'Interrumpida',
+            },
+        )
+
+    metrics = profiler.metrics()
+    calls = metrics['hoom_supabase_request_seconds']
+    if calls:
+        rows = {tuple(s['labels'].values()): s['value'] for s in metrics['hoom_supabase_rows_total']}
+        response_bytes = {tuple(s['labels'].values()): s['value'] for s in metrics['hoom_supabase_response_bytes_total']}
+        df_calls = pd.DataFrame([
+            {
+                'target': sample['labels']['target'],
+                'method': sample['labels']['method'],
+                'calls': sample['count'],
+                'rows': rows.get(tuple(sample['labels'].values()), 0),
+                # Sin el hook de httpx no se conocen los bytes
+                'kb': response_bytes[key] / 1024 if (key := tuple(sample['labels'].values())) in response_bytes else None,
+                'mean_ms': sample['sum'] / sample['count'] * 1000,
+                'max_ms': sample['max'] * 1000,
+            }
+            for sample in calls
+        ]).sort_values('mean_ms', ascending=False)
+        st.markdown("**Supabase**")
+        st.dataframe(
+            df_calls,
+            hide_index=True,
+            column_config={
+                'target': 'Tabla',
+                'method': 'Operación',
+                'calls': 'Llamadas',
+                'rows': 'Filas',
+                'kb': st.column_config.NumberColumn('KB', format="%.0f"),
+                'mean_ms': st.column_config.NumberColumn('Media (ms)', format="%.0f"),
+                'max_ms': st.column_config.NumberColumn('Máx. (ms)', format="%.0f"),
+            },
+        )
+
+    cache = metrics['hoom_cache_requests_total']
+    if cache:
+        df_cache = pd.DataFrame([dict(s['labels'], value=s['value']) for s in cache])
+        df_cache = df_cache.pivot_table(index='function', columns='result', values='value', fill_value=0)
+        df_cache = df_cache.reindex(columns=['hit', 'miss'], fill_value=0)
+        st.markdown("**st.cache_data**")
+        st.dataframe(
+            df_cache.assign(ratio=df_cache['hit'] / (df_cache['hit'] + df_cache['miss'])).reset_index(),
+            hide_index=True,
+            column_config={
+                'function': 'Función',
+                'hit': 'Aciertos',
+                'miss': 'Fallos',
+                'ratio': st.column_config.ProgressColumn('Tasa de aciertos', min_value=0, max_value=1, format="percent"),
+            },
+        )
+
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("JSON", profiler.to_json(), file_name="hoom_metrics.json", mime="application/json", on_click="ignore")
+    col2.download_button("Prometheus", profiler.to_prometheus(), file_name="hoom_metrics.prom", mime="text/plain", on_click="ignore")
+    if col3.button("Reiniciar"):
+        profiler.reset()
@@ -0,0 +1,116 @@
+import numpy as np
+
+# --- Índice espacial sobre las coordenadas de las propiedades ---
+
+# Tamaño de celda de la cuadrícula (~550 m de latitud)
+CELL_DEGREES = 0.005
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+# Desplazamiento para que la columna de la celda siempre sea positiva
+_COLUMN_OFFSET = 1 << 20
+
+
+def haversine_m(latitude, longitude, center_latitude, center_longitude):
+    """Distancia en metros de cada punto al centro."""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(center_latitude), np.radians(center_longitude)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def area_mask(latitude, longitude, area):
+    """Máscara de los puntos dentro de `area` (mismo formato que `SpatialIndex.query`), sin índice."""
+    latitude, longitude = np.asarray(latitude, dtype=float), np.asarray(longitude, dtype=float)
+    if 'polygon' in area:
+        return points_in_polygon(latitude, longitude, area['polygon']) & ~np.isnan(latitude)
+    return haversine_m(latitude, longitude, area['latitude'], area['longitude']) <= area['radius_m']
+
+
+def points_in_polygon(latitude, longitude, polygon):
+    """Máscara de los puntos dentro de `polygon` [(lat, lon), ...] (regla par-impar)."""
+    latitude, longitude = np.asarray(latitude, dtype=float), np.asarray(longitude, dtype=float)
+    inside = np.zeros(len(latitude), dtype=bool)
+    vertices = np.asarray(polygon, dtype=float)
+    for (lat1, lon1), (lat2, lon2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        crosses = (lat1 > latitude) != (lat2 > latitude)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            edge_lon = (lon2 - lon1) * (latitude - lat1) / (lat2 - lat1) + lon1
+        inside ^= crosses & (longitude < edge_lon)
+    return inside
+
+
+def _cells(latitude, longitude):
+    return (
+        np.floor(np.asarray(latitude) / CELL_DEGREES).astype(np.int64),
+        np.floor(np.asarray(longitude) / CELL_DEGREES).astype(np.int64),
+    )
+
+
+def _keys(rows, columns):
+    # Fila y columna de la celda en un solo entero; las celdas de una misma
+    # fila quedan contiguas al ordenar
+    return (rows << 21) + (columns + _COLUMN_OFFSET)
+
+
+class SpatialIndex:
+    """Cuadrícula de celdas de `CELL_DEGREES` con los puntos ordenados por celda.
+
+    Una consulta recorre solo las filas de celdas que cubren el rectángulo
+    buscado (un `searchsorted` por fila) y filtra los candidatos con la
+    distancia o el polígono exactos. Devuelve posiciones del DataFrame
+    original, como `PropertyFilterIndex`.
+    """
+
+    def __init__(self, latitude, longitude):
+        latitude = np.asarray(latitude, dtype=float)
+        longitude = np.asarray(longitude, dtype=float)
+        valid = np.flatnonzero(~np.isnan(latitude) & ~np.isnan(longitude))
+        keys = _keys(*_cells(latitude[valid], longitude[valid]))
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._positions = valid[order]
+        self._latitude = latitude[self._positions]
+        self._longitude = longitude[self._positions]
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _candidates(self, min_lat, max_lat, min_lon, max_lon):
+        # Índices (en el orden por celda) de los puntos dentro del rectángulo de celdas
+        (row_start, column_start), (row_end, column_end) = _cells(min_lat, min_lon), _cells(max_lat, max_lon)
+        rows = np.arange(row_start, row_end + 1, dtype=np.int64)
+        starts = np.searchsorted(self._keys, _keys(rows, np.full_like(rows, column_start)), side='left')
+        ends = np.searchsorted(self._keys, _keys(rows, np.full_like(rows, column_end)), side='right')
+        lengths = ends - starts
+        if lengths.sum() == 0:
+            return np.empty(0, dtype=np.int64)
+        # Concatenar los rangos [start, end) sin un ciclo en Python
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return np.arange(lengths.sum()) + offsets
+
+    def within_radius(self, latitude, longitude, radius_m):
+        """(posiciones, distancias en metros) de los puntos a `radius_m` o menos, del más cercano al más lejano."""
+        delta_lat = radius_m / METERS_PER_DEGREE
+        max_abs_lat = min(abs(latitude) + delta_lat, 89.9)
+        delta_lon = radius_m / (METERS_PER_DEGREE * np.cos(np.radians(max_abs_lat)))
+        candidates = self._candidates(latitude - delta_lat, latitude + delta_lat, longitude - delta_lon, longitude + delta_lon)
+        distances = haversine_m(self._latitude[candidates], self._longitude[candidates], latitude, longitude)
+        near = distances <= radius_m
+        candidates, distances = candidates[near], distances[near]
+        order = np.argsort(distances, kind='stable')
+        return self._positions[candidates[order]], distances[order]
+
+    def query(self, area):
+        """Posiciones dentro de un área del filtro de ubicación: {'polygon': [...]} o {'latitude', 'longitude', 'radius_m'}."""
+        if 'polygon' in area:
+            return self.within_polygon(area['polygon'])
+        return np.sort(self.within_radius(area['latitude'], area['longitude'], area['radius_m'])[0])
+
+    def within_polygon(self, polygon):
+        """Posiciones de los puntos dentro de `polygon` [(lat, lon), ...]."""
+        vertices = np.asarray(polygon, dtype=float)
+        if len(vertices) < 3:
+            return np.empty(0, dtype=np.int64)
+        candidates = self._candidates(vertices[:, 0].min(), vertices[:, 0].max(), vertices[:, 1].min(), vertices[:, 1].max())
+        inside = points_in_polygon(self._latitude[candidates], self._longitude[candidates], vertices)
+        return np.sort(self._positions[candidates[inside]])
@@ -0,0 +1,43 @@
+-- Búsqueda espacial en el servidor para el filtro de ubicación del dashboard.
+-- Equivale al índice espacial local (spatial_index.py) cuando la caché aún no
+-- está lista. Las funciones devuelven filas de properties, así que PostgREST
+-- permite encadenar los mismos filtros, orden y paginación.
+CREATE EXTENSION IF NOT EXISTS postgis;
+
+ALTER TABLE public.properties
+ADD COLUMN IF NOT EXISTS location geography(Point, 4326)
+GENERATED ALWAYS AS (
+    CASE
+        WHEN latitude IS NOT NULL AND longitude IS NOT NULL
+        THEN ST_SetSRID(ST_MakePoint(longitude::double precision, latitude::double precision), 4326)::geography
+    END
+) STORED;
+
+CREATE INDEX IF NOT EXISTS properties_location_idx ON public.properties USING GIST (location);
+
+-- Propiedades a radius_m metros o menos del centro, de la más cercana a la más lejana
+CREATE OR REPLACE FUNCTION public.properties_within_radius(
+    center_latitude double precision,
+    center_longitude double precision,
+    radius_m double precision
+)
+RETURNS SETOF public.properties
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT *
+    FROM public.properties
+    WHERE ST_DWithin(location, ST_SetSRID(ST_MakePoint(center_longitude, center_latitude), 4326)::geography, radius_m)
+    ORDER BY location <-> ST_SetSRID(ST_MakePoint(center_longitude, center_latitude), 4326)::geography;
+$$;
+
+-- Propiedades dentro de un polígono GeoJSON (coordenadas [lon, lat])
+CREATE OR REPLACE FUNCTION public.properties_within_polygon(polygon text)
+RETURNS SETOF public.properties
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT *
+    FROM public.properties
+    WHERE ST_Intersects(location, ST_SetSRID(ST_GeomFromGeoJSON(polygon), 4326)::geography);
+$$;
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+import backup
+from backup import TABLE_COLUMNS, export, load_tables
+from memory_client import MemoryClient
+
+NOW = datetime.now(timezone.utc)
+
+
+def _property(row_id, minutes_ago, **values):
+    updated_at = (NOW - timedelta(minutes=minutes_ago)).isoformat()
+    return {'id': row_id, 'created_at': updated_at, 'updated_at': updated_at, 'title': f"Casa {row_id}", **values}
+
+
+def _client(properties, promoters=()):
+    return MemoryClient({'properties': list(properties), 'promoters': list(promoters)}, columns=TABLE_COLUMNS)
+
+
+def _ids(directory, table='properties'):
+    return _ids_of(load_tables(directory)[table])
+
+
+def _ids_of(rows):
+    return sorted(row['id'] for row in rows)
+
+
+def test_export_picks_up_rows_committed_behind_the_watermark(tmp_path, monkeypatch):
+    rows = [_property(f"p{i}", 60 - i) for i in range(5)]
+    export(_client(rows), tmp_path)
+    assert _ids(tmp_path) == ['p0', 'p1', 'p2', 'p3', 'p4']
+
+    # Confirmada después de la exportación, con updated_at anterior a la marca de agua
+    rows.append(_property('late', 90))
+    export(_client(rows), tmp_path)
+    assert _ids(tmp_path) == ['late', 'p0', 'p1', 'p2', 'p3', 'p4']
+
+    # Con los conteos iguales ya no se descarga la lista de ids
+    scans = []
+    fetch_all = backup._fetch_all
+    monkeypatch.setattr(backup, '_fetch_all', lambda *args: scans.append(args) or fetch_all(*args))
+    added = export(_client(rows), tmp_path, tables=['properties'])
+    assert added['properties'] == [] and scans == []
+
+
+@pytest.mark.parametrize('file_format', list(backup.FORMATS))
+def test_round_trip_with_deletes_schema_change_and_point_in_time(tmp_path, monkeypatch, file_format):
+    monkeypatch.setattr(backup, 'PAGE_SIZE', 2)
+    directory = tmp_path / 'copia'
+    promoters = [{'id': 1, 'name': "Promotora Uno"}, {'id': 2, 'name': "Promotora Dos"}]
+    # La descripción es nula en la primera página y texto en las siguientes:
+    # en Parquet el segmento se parte en dos archivos con esquemas distintos
+    rows = [_property(f"p{i}", 60 - i, description=None if i < 2 else f"Descripción {i}", promoter_id=1 + i % 2)
+            for i in range(5)]
+    first = export(_client(rows, promoters), directory, file_format)
+    if file_format == 'parquet':
+        assert len(first['properties'][0]['files']) > 1
+    first_at = first['properties'][0]['created_at']
+
+    # Una eliminación, un cambio y una promotora eliminada
+    rows = [row for row in rows if row['id'] != 'p1']
+    rows[0] = {**rows[0], **_property('p0', 30, price=1_500_000)}
+    second = export(_client(rows, promoters[:1]), directory, file_format)
+    assert [segment['kind'] for segment in second['properties']] == ['delta', 'deletes']
+    assert [segment['kind'] for segment in second['promoters']] == ['deletes']
+
+    latest = load_tables(directory)
+    assert sorted(row['id'] for row in latest['properties']) == ['p0', 'p2', 'p3', 'p4']
+    assert {row['id']: row['price'] for row in latest['properties']}['p0'] == 1_500_000
+    assert [row['description'] for row in sorted(latest['properties'], key=lambda row: row['id'])][1:] == [
+        "Descripción 2", "Descripción 3", "Descripción 4"
+    ]
+    assert [row['id'] for row in latest['promoters']] == [1]
+
+    # Estado de la primera exportación
+    before = load_tables(directory, at=first_at)
+    assert _ids_of(before['properties']) == ['p0', 'p1', 'p2', 'p3', 'p4']
+    assert {row['id']: row['price'] for row in before['properties']}['p0'] is None
+    offline = backup.open_backup(directory, at=first_at)
+    assert offline.from_('promoters').select('id', count='exact', head=True).execute().count == 2
+    assert offline.backup_at == datetime.fromisoformat(first_at)
+
+    restored = backup.write_tables(before, tmp_path / 'restaurado', file_format)
+    restored_rows = {table: [] for table in backup.TABLES}
+    for name in restored:
+        restored_rows[Path(name).parts[0]] += backup.read_rows(tmp_path / 'restaurado' / name)
+    assert _ids_of(restored_rows['properties']) == ['p0', 'p1', 'p2', 'p3', 'p4']
+
+    # La compactación conserva el último estado y borra los segmentos viejos
+    removed = backup.compact(directory, retain_days=0, file_format=file_format)
+    assert removed and not any((directory / name).exists() for name in removed)
+    manifest = backup.read_manifest(directory)
+    assert [segment['kind'] for segment in manifest['tables']['properties']['segments']] == ['snapshot']
+    assert _ids_of(load_tables(directory)['properties']) == ['p0', 'p2', 'p3', 'p4']
+    with pytest.raises(ValueError):
+        load_tables(directory, at=first_at)
+
@@ -0,0 +1,95 @@
+import itertools
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from filter_index import PropertyFilterIndex
+from queries import PROPERTY_LIST_FIELDS, UNKNOWN_PORTAL, compact_properties, filter_properties, prepare_properties
+
+PORTALS = ['inmuebles24', 'vivanuncios', 'lamudi', None]
+PROPERTY_TYPES = ['casa', 'terreno', 'departamento', None]
+PROMOTER_IDS = [1, 2, 3, 4, 5]
+CENTER = (20.67, -103.35)
+
+
+def _properties(n=2000, seed=7):
+    # Filas con nulos en todas las columnas que se filtran, con los tipos de la caché local
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        rows.append({
+            'id': f"p{i:05d}",
+            'created_at': '2025-01-01T00:00:00+00:00',
+            'updated_at': '2025-01-02T00:00:00+00:00',
+            'source_portal': rng.choice(PORTALS),
+            'title': f"Casa en venta{' en fraccionamiento' if rng.random() < 0.2 else ''} {i}",
+            'price': rng.choice([None, rng.randrange(500_000, 10_000_000, 50_000)]),
+            'latitude': None if rng.random() < 0.05 else CENTER[0] + rng.uniform(-0.1, 0.1),
+            'longitude': CENTER[1] + rng.uniform(-0.1, 0.1),
+            'promoter_id': rng.choice(PROMOTER_IDS + [None, None]),
+            'property_type': rng.choice(PROPERTY_TYPES),
+        })
+    df = prepare_properties(pd.DataFrame(rows, columns=PROPERTY_LIST_FIELDS))
+    return compact_properties(df).set_index('id', drop=False).rename_axis(None)
+
+
+AREAS = [
+    None,
+    {'latitude': CENTER[0], 'longitude': CENTER[1], 'radius_m': 4000},
+    {'polygon': [(20.62, -103.40), (20.72, -103.40), (20.72, -103.32), (20.62, -103.30)]},
+]
+
+OPTIONS = {
+    # prepare_properties cambia los portales nulos por UNKNOWN_PORTAL
+    'portals': [None, ['inmuebles24'], ['vivanuncios', UNKNOWN_PORTAL], []],
+    'promoter_ids': [None, [1], [2, 4], []],
+    'include_no_promoter': [True, False],
+    'property_type': [None, 'casa', 'terreno', 'oficina'],
+    'min_price': [None, 0, 2_000_000],
+    'max_price': [None, 5_000_000, 9_950_000],
+    'exclude_fraccionamientos': [False, True],
+    'area': AREAS,
+}
+
+
+def _combinations(count=300, seed=3):
+    # Muestra fija de todas las combinaciones de OPTIONS
+    everything = list(itertools.product(*OPTIONS.values()))
+    return [dict(zip(OPTIONS, values)) for values in random.Random(seed).sample(everything, count)]
+
+
+@pytest.fixture(scope='module')
+def df_properties():
+    return _properties()
+
+
+@pytest.fixture(scope='module')
+def filter_index(df_properties):
+    return PropertyFilterIndex(df_properties)
+
+
+@pytest.mark.parametrize('filters', _combinations(), ids=lambda filters: repr(filters))
+def test_filter_matches_pandas_mask(df_properties, filter_index, filters):
+    expected = filter_properties(df_properties, **filters)
+    result = filter_index.filter(**filters)
+    assert result.index.tolist() == expected.index.tolist()
+
+
+@pytest.mark.parametrize('option', list(OPTIONS))
+def test_each_filter_alone(df_properties, filter_index, option):
+    for value in OPTIONS[option]:
+        expected = filter_properties(df_properties, **{option: value})
+        assert filter_index.filter(**{option: value}).index.tolist() == expected.index.tolist()
+
+
+def test_no_filters_returns_every_row(df_properties, filter_index):
+    assert filter_index.filter().index.tolist() == df_properties.index.tolist()
+
+
+def test_empty_frame():
+    empty = _properties(n=0)
+    index = PropertyFilterIndex(empty)
+    assert index.filter(portals=['lamudi'], min_price=0, area=AREAS[1]).empty
+    assert np.array_equal(index.positions(), np.zeros(0, dtype=np.int64))
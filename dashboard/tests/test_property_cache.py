@@ -0,0 +1,62 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import property_cache
+from backup import TABLE_COLUMNS
+from memory_client import MemoryClient
+from property_cache import PropertyCache
+
+NOW = datetime.now(timezone.utc)
+
+
+class Database:
+    """Tabla properties que se puede modificar entre consultas; registra el hilo de cada consulta."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.threads = []
+
+    def from_(self, table):
+        self.threads.append(threading.current_thread().name)
+        return MemoryClient({'properties': self.rows}, columns=TABLE_COLUMNS).from_(table)
+
+
+def _property(row_id, minutes_ago):
+    updated_at = (NOW - timedelta(minutes=minutes_ago)).isoformat()
+    return {'id': row_id, 'created_at': updated_at, 'updated_at': updated_at, 'title': f"Casa {row_id}", 'photos': []}
+
+
+def _wait(cache):
+    cache.ensure_synced()
+    if cache._sync_thread is not None:
+        cache._sync_thread.join()
+    assert cache.last_error is None
+
+
+def test_polls_in_the_background_and_picks_up_late_rows(monkeypatch):
+    database = Database([_property(f"p{i}", 30 - i) for i in range(3)])
+    cache = PropertyCache(database)
+    _wait(cache)
+    assert sorted(cache.snapshot().index) == ['p0', 'p1', 'p2']
+
+    # Una fila nueva y una confirmada con updated_at anterior a la marca de agua
+    database.rows += [_property('nueva', 0), _property('tardía', 60)]
+    database.threads.clear()
+    monkeypatch.setattr(property_cache, 'POLL_INTERVAL', 0)
+    _wait(cache)
+    assert sorted(cache.snapshot().index) == ['nueva', 'p0', 'p1', 'p2', 'tardía']
+
+    database.rows = database.rows[1:]
+    _wait(cache)
+    assert sorted(cache.snapshot().index) == ['nueva', 'p1', 'p2', 'tardía']
+    assert database.threads and set(database.threads) == {"property-cache-poll"}
+
+
+def test_does_not_poll_before_the_interval():
+    database = Database([_property('p0', 5)])
+    cache = PropertyCache(database)
+    _wait(cache)
+    database.threads.clear()
+    version = cache.version
+    _wait(cache)
+    assert database.threads == [] and cache.version == version
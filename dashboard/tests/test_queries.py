@@ -0,0 +1,43 @@
+import pytest
+from postgrest import SyncPostgrestClient
+from postgrest.exceptions import APIError
+
+from memory_client import MemoryAPIError, MemoryClient
+from queries import apply_property_filters, count_properties, is_missing_object
+
+
+def test_search_uses_websearch_to_tsquery():
+    # Sin conexión: solo se construye la petición
+    client = SyncPostgrestClient("http://localhost:3000")
+    query = apply_property_filters(client.from_("properties").select("id"), search="casa con alberca")
+    assert query.request.params["search_vector"] == "wfts(public.spanish_unaccent).casa con alberca"
+
+
+def test_memory_client_search_accepts_several_words():
+    client = MemoryClient({'properties': [
+        {'id': 'a', 'title': 'Casa con alberca', 'description': None, 'location_text': None},
+        {'id': 'b', 'title': 'Casa sin jardín', 'description': None, 'location_text': None},
+    ]})
+    assert count_properties(client, {'search': 'casa alberca'}) == 1
+
+
+def test_memory_client_rejects_plain_tsquery():
+    client = MemoryClient({'properties': [{'id': 'a', 'title': 'Casa con alberca'}]})
+    query = client.from_("properties").select("id").text_search(
+        "search_vector", "casa alberca", options={"type": "websearch"}
+    )
+    with pytest.raises(MemoryAPIError) as error:
+        query.execute()
+    assert not is_missing_object(error.value)
+
+
+@pytest.mark.parametrize("code, missing", [
+    ("42883", True),
+    ("42703", True),
+    ("PGRST202", True),
+    ("42601", False),
+    ("42501", False),
+    (None, False),
+])
+def test_is_missing_object(code, missing):
+    assert is_missing_object(APIError({"message": "error", "code": code})) is missing
@@ -0,0 +1,121 @@
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import thumbnails
+from thumbnails import FAILURE_TTL, THUMBNAIL_SIZES, ThumbnailCache, fetch_url
+
+COLORS = {'roja': (200, 30, 30), 'verde': (30, 200, 30), 'azul': (30, 30, 200)}
+
+
+def _jpeg(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 600), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def photo_server():
+    # Servidor HTTP local con una foto por color; el resto responde 404
+    photos = {f"/{name}.jpg": _jpeg(color) for name, color in COLORS.items()}
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            data = photos.get(self.path)
+            if data is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = lambda path: f"http://127.0.0.1:{server.server_address[1]}{path}"
+    server.requests = requests
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _files(cache):
+    return {path.name: path.stat().st_size for path in cache.directory.glob("*/*.jpg")}
+
+
+def test_downloads_once_and_stores_every_variant(tmp_path, photo_server):
+    cache = ThumbnailCache(tmp_path)
+    url = photo_server.url("/roja.jpg")
+    data = cache.get(url, 'card')
+    assert Image.open(io.BytesIO(data)).size == THUMBNAIL_SIZES['card']
+    assert Image.open(io.BytesIO(cache.get(url, 'gallery'))).size == THUMBNAIL_SIZES['gallery']
+    assert photo_server.requests == ["/roja.jpg"]
+    assert len(_files(cache)) == len(THUMBNAIL_SIZES)
+    assert cache._total_bytes == sum(_files(cache).values())
+
+
+def test_evicts_least_recently_used_photos_by_bytes(tmp_path, photo_server):
+    cache = ThumbnailCache(tmp_path)
+    red, green, blue = (photo_server.url(f"/{name}.jpg") for name in COLORS)
+    cache.get(red)
+    time.sleep(0.01)
+    cache.get(green)
+    time.sleep(0.01)
+    # Caben dos fotos y media: la tercera desaloja los archivos usados hace más tiempo
+    cache.max_bytes = int(cache._total_bytes * 1.25)
+    for size in THUMBNAIL_SIZES:
+        cache.get(red, size)
+    time.sleep(0.01)
+    cache.get(blue)
+
+    assert not cache._path(green, 'card').exists()
+    assert all(cache._path(url, size).exists() for url in (red, blue) for size in THUMBNAIL_SIZES)
+    assert cache._total_bytes == sum(_files(cache).values()) <= cache.max_bytes
+
+
+def test_rewriting_a_thumbnail_does_not_count_it_twice(tmp_path, photo_server):
+    cache = ThumbnailCache(tmp_path)
+    url = photo_server.url("/roja.jpg")
+    cache.get(url, 'card')
+    # Sin la variante card se vuelve a generar, y se reescribe la de galería
+    cache._path(url, 'card').unlink()
+    cache._total_bytes = sum(_files(cache).values())
+    cache.get(url, 'card')
+    assert cache._total_bytes == sum(_files(cache).values())
+
+
+def test_failed_downloads_show_the_placeholder_until_failure_ttl(tmp_path, photo_server, monkeypatch):
+    cache = ThumbnailCache(tmp_path)
+    url = photo_server.url("/no-existe.jpg")
+    assert cache.get(url, 'card') == cache.placeholder('card')
+    assert cache.get(url, 'card') == cache.placeholder('card')
+    assert photo_server.requests == ["/no-existe.jpg"]
+
+    now = time.monotonic()
+    monkeypatch.setattr(thumbnails.time, 'monotonic', lambda: now + FAILURE_TTL + 1)
+    assert cache.load(url, 'card') is None
+    assert photo_server.requests == ["/no-existe.jpg", "/no-existe.jpg"]
+
+
+def test_placeholder_for_properties_without_photo(tmp_path):
+    cache = ThumbnailCache(tmp_path, fetch=lambda url: pytest.fail("no debe descargar"))
+    for size, dimensions in THUMBNAIL_SIZES.items():
+        assert Image.open(io.BytesIO(cache.get(None, size))).size == dimensions
+
+
+@pytest.mark.parametrize("url", ["file:///etc/hostname", "ftp://example.com/foto.jpg", "/etc/hostname"])
+def test_only_http_urls_are_downloaded(tmp_path, url):
+    with pytest.raises(ValueError):
+        fetch_url(url)
+    assert ThumbnailCache(tmp_path).get(url) == ThumbnailCache(tmp_path).placeholder()
@@ -0,0 +1,105 @@
+import logging
+import threading
+
+import pytest
+
+import write_queue
+from write_queue import WriteQueue
+
+
+class Request:
+    def __init__(self, client, table, operation, data=None):
+        self.client, self.table, self.operation, self.data, self.ids = client, table, operation, data, None
+
+    def in_(self, column, ids):
+        self.ids = list(ids)
+        return self
+
+    def execute(self):
+        # Cada envío espera a que la prueba lo libere
+        self.client.started.set()
+        assert self.client.release.wait(5)
+        if self.client.error is not None:
+            raise self.client.error
+        self.client.requests.append((self.table, self.operation, self.ids, self.data))
+
+
+class Table:
+    def __init__(self, client, table):
+        self.client, self.table = client, table
+
+    def update(self, data):
+        return Request(self.client, self.table, "update", data)
+
+    def delete(self):
+        return Request(self.client, self.table, "delete")
+
+    def insert(self, rows):
+        return Request(self.client, self.table, "insert", rows)
+
+    def upsert(self, rows, **kwargs):
+        return Request(self.client, self.table, "upsert", rows)
+
+
+class Client:
+    def __init__(self, error=None):
+        self.started, self.release = threading.Event(), threading.Event()
+        self.error = error
+        self.requests = []
+
+    def from_(self, table):
+        return Table(self, table)
+
+
+@pytest.fixture(autouse=True)
+def fast_queue(monkeypatch):
+    monkeypatch.setattr(write_queue, 'FLUSH_DELAY', 0)
+    monkeypatch.setattr(write_queue, 'RETRY_BACKOFF', 0)
+
+
+def _wait_idle(queue):
+    for _ in range(500):
+        if not queue.has_pending():
+            return
+        threading.Event().wait(0.01)
+    pytest.fail("la cola no terminó")
+
+
+def test_rows_in_flight_stay_pending_until_the_response():
+    client = Client()
+    queue = WriteQueue(client)
+    queue.update("properties", "p1", {"price": 1}, session_id="s")
+    queue.insert("promoters", {"name": "Nueva"}, session_id="s")
+    assert client.started.wait(5)
+
+    # El envío está en curso: la generación no cambió y la fila sigue pendiente
+    changes, inserts = queue.pending("properties")
+    assert changes["p1"]["data"] == {"price": 1} and queue.generation("properties") == 0
+    assert [item["data"] for item in queue.pending("promoters")[1]] == [{"name": "Nueva"}]
+
+    # Un cambio posterior de la misma fila se combina con el que está en envío
+    queue.update("properties", "p1", {"title": "Casa"}, session_id="s")
+    assert queue.pending("properties")[0]["p1"]["data"] == {"price": 1, "title": "Casa"}
+
+    client.release.set()
+    _wait_idle(queue)
+    assert queue.pending("properties") == ({}, []) and queue.pending("promoters") == ({}, [])
+    assert queue.generation("properties") == 2 and queue.generation("promoters") == 1
+
+
+def test_failed_callbacks_are_logged(caplog):
+    client = Client(error=RuntimeError("sin conexión"))
+    client.release.set()
+    queue = WriteQueue(client)
+
+    def callback(ids):
+        raise ValueError("no se pudo recargar")
+
+    queue.on_failure("properties", callback)
+    with caplog.at_level(logging.WARNING, logger="write_queue"):
+        queue.delete("properties", "p1", session_id="s")
+        _wait_idle(queue)
+
+    assert queue.pending("properties") == ({}, [])
+    assert [level for level, _ in queue.drain_messages("s")] == ["error"]
+    assert any(record.exc_info and "no se pudo recargar" in str(record.exc_info[1]) for record in caplog.records)
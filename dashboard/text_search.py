@@ -0,0 +1,207 @@
+import bisect
+import math
+import threading
+from collections import Counter
+
+import numpy as np
+
+from dedup import normalize_text
+
+# --- Búsqueda de texto sobre title, description y location_text ---
+
+# Parámetros de BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Cada término del título cuenta como si apareciera TITLE_WEIGHT veces
+TITLE_WEIGHT = 2
+# La última palabra de la búsqueda se completa como prefijo (búsqueda al
+# teclear); solo se usan los términos más frecuentes que empiezan igual
+MAX_PREFIX_EXPANSIONS = 50
+MIN_PREFIX_LENGTH = 3
+
+STOPWORDS = frozenset("""
+    a al con de del e el en es esta este la las lo los mas muy o para por que se sin sobre su sus u un una y
+""".split())
+
+
+def stem(word):
+    """Raíz aproximada de una palabra en español, ya normalizada sin acentos.
+
+    Quita plurales, diminutivos y la vocal final, para que "albercas",
+    "alberca" y "alberquita" no se separen por la forma: es un stemmer
+    ligero, no un análisis morfológico completo.
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ces") and len(word) > 4:
+        word = word[:-3] + "z"
+    elif word.endswith("es") and len(word) > 4 and word[-3] not in "aeiou":
+        word = word[:-2]
+    elif word.endswith("s"):
+        word = word[:-1]
+    for suffix, replacement in (("quit", "c"), ("guit", "g"), ("cit", ""), ("it", "")):
+        if word[:-1].endswith(suffix) and len(word) - len(suffix) > 3:
+            word = word[:-len(suffix) - 1] + replacement + word[-1]
+            break
+    if word[-1] in "aeo" and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def analyze(text):
+    """Términos de un texto: normalizado, sin palabras vacías y con raíces."""
+    return [stem(word) for word in normalize_text(text).split() if word not in STOPWORDS]
+
+
+class TextSearchIndex:
+    """Índice invertido con ranking BM25, actualizable fila por fila.
+
+    Cada propiedad ocupa una posición; las listas de cada término guardan
+    (posición, frecuencia) y se compilan a arreglos de numpy la primera vez
+    que se consultan después de un cambio. Implementa la interfaz de
+    consumidor de `property_cache.CacheFollower`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._slot_ids = []
+        self._free_slots = []
+        self._doc_lengths = np.zeros(0)
+        self._doc_terms = {}
+        self._postings = {}
+        self._compiled = {}
+        self._vocabulary = None
+        self._total_length = 0
+        self._length_norm = None
+
+    def __len__(self):
+        return len(self._slots)
+
+    # --- Actualización ---
+
+    def add(self, records):
+        """Indexa o reemplaza filas con `id`, `title`, `description` y `location_text`."""
+        documents = [
+            (record['id'], Counter(
+                analyze(record.get('title')) * TITLE_WEIGHT
+                + analyze(record.get('description'))
+                + analyze(record.get('location_text'))
+            ))
+            for record in records
+        ]
+        with self._lock:
+            self._length_norm = None
+            self._remove([row_id for row_id, _ in documents if row_id in self._slots])
+            for row_id, terms in documents:
+                slot = self._free_slots.pop() if self._free_slots else self._new_slot()
+                self._slots[row_id] = slot
+                self._slot_ids[slot] = row_id
+                self._doc_terms[slot] = terms
+                length = sum(terms.values())
+                self._doc_lengths[slot] = length
+                self._total_length += length
+                for term, frequency in terms.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = {}
+                        self._vocabulary = None
+                    postings[slot] = frequency
+                    self._compiled.pop(term, None)
+
+    def remove(self, ids):
+        with self._lock:
+            self._length_norm = None
+            self._remove(ids)
+
+    def publish(self):
+        pass
+
+    def _new_slot(self):
+        slot = len(self._slot_ids)
+        self._slot_ids.append(None)
+        if slot >= len(self._doc_lengths):
+            self._doc_lengths = np.concatenate([self._doc_lengths, np.zeros(max(1024, len(self._doc_lengths)))])
+        return slot
+
+    def _remove(self, ids):
+        for row_id in ids:
+            slot = self._slots.pop(row_id, None)
+            if slot is None:
+                continue
+            for term in self._doc_terms.pop(slot):
+                postings = self._postings[term]
+                del postings[slot]
+                if not postings:
+                    del self._postings[term]
+                    self._vocabulary = None
+                self._compiled.pop(term, None)
+            self._total_length -= self._doc_lengths[slot]
+            self._doc_lengths[slot] = 0
+            self._slot_ids[slot] = None
+            self._free_slots.append(slot)
+
+    # --- Consulta ---
+
+    def _arrays(self, term):
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            postings = self._postings[term]
+            compiled = self._compiled[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=float, count=len(postings)),
+            )
+        return compiled
+
+    def _prefix_terms(self, prefix):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "￿")
+        terms = self._vocabulary[start:end]
+        return sorted(terms, key=lambda term: len(self._postings[term]), reverse=True)[:MAX_PREFIX_EXPANSIONS]
+
+    def search(self, query, limit=None):
+        """(ids, puntajes) de las filas que contienen todas las palabras de `query`, de mayor a menor puntaje.
+
+        Si `query` no termina en espacio, la última palabra también cuenta
+        como prefijo.
+        """
+        words = analyze(query)
+        if not words:
+            return [], np.zeros(0)
+        complete_last_word = query[-1:].isspace()
+        with self._lock:
+            document_count = len(self._slots)
+            if document_count == 0:
+                return [], np.zeros(0)
+            size = len(self._slot_ids)
+            if self._length_norm is None:
+                # Parte de BM25 que solo depende del largo de cada documento
+                average_length = self._total_length / document_count
+                self._length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[:size] / average_length)
+            length_norm = self._length_norm
+
+            scores = np.zeros(size)
+            matched = np.zeros(size, dtype=np.int32)
+            for i, word in enumerate(words):
+                terms = [word] if word in self._postings else []
+                if i == len(words) - 1 and not complete_last_word and len(word) >= MIN_PREFIX_LENGTH:
+                    terms = list(dict.fromkeys(terms + self._prefix_terms(word)))
+                word_slots = []
+                for term in terms:
+                    slots, frequencies = self._arrays(term)
+                    idf = math.log(1 + (document_count - len(slots) + 0.5) / (len(slots) + 0.5))
+                    scores[slots] += idf * frequencies * (BM25_K1 + 1) / (frequencies + length_norm[slots])
+                    word_slots.append(slots)
+                if len(word_slots) == 1:
+                    matched[word_slots[0]] += 1
+                elif word_slots:
+                    matched[np.unique(np.concatenate(word_slots))] += 1
+
+            hits = np.flatnonzero(matched == len(words))
+            order = np.argsort(-scores[hits], kind='stable')
+            if limit is not None:
+                order = order[:limit]
+            hits = hits[order]
+            return [self._slot_ids[slot] for slot in hits], scores[hits]
@@ -0,0 +1,26 @@
+-- Búsqueda de texto en el servidor para el cuadro "Buscar" del dashboard.
+-- Equivale al índice BM25 local (text_search.py) cuando la caché aún no está
+-- lista: mismo criterio de acentos (se ignoran) y raíces en español.
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- Configuración en español que además quita acentos ("recámaras" = "recamaras")
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'spanish_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION public.spanish_unaccent (COPY = pg_catalog.spanish);
+        ALTER TEXT SEARCH CONFIGURATION public.spanish_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END
+$$;
+
+-- El título pesa más que la ubicación y la descripción
+ALTER TABLE public.properties
+ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (
+    setweight(to_tsvector('public.spanish_unaccent'::regconfig, coalesce(title, '')), 'A')
+    || setweight(to_tsvector('public.spanish_unaccent'::regconfig, coalesce(location_text, '')), 'B')
+    || setweight(to_tsvector('public.spanish_unaccent'::regconfig, coalesce(description, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS properties_search_vector_idx ON public.properties USING GIN (search_vector);
@@ -0,0 +1,222 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageOps
+
+# --- Miniaturas de las fotos de propiedades ---
+
+# Tamaño máximo (ancho, alto) de cada variante
+THUMBNAIL_SIZES = {
+    'card': (480, 360),
+    'gallery': (320, 240),
+}
+JPEG_QUALITY = 80
+DEFAULT_DIRECTORY = Path.home() / ".cache" / "hoom" / "thumbnails"
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+# Tras un error de descarga no se vuelve a intentar durante este tiempo
+FAILURE_TTL = 600
+USER_AGENT = "Mozilla/5.0 (compatible; HoomDashboard/1.0)"
+# Descargas por segundo de los procesos de fondo (pHash de duplicados)
+BACKGROUND_FETCH_RATE = 2.0
+
+
+# Las URLs vienen de la base (datos de los scrapers): solo se descargan por
+# HTTP, nunca archivos locales (file://) ni otros esquemas de urllib
+ALLOWED_SCHEMES = ('http', 'https')
+
+
+def _check_scheme(url):
+    scheme = urllib.parse.urlsplit(url).scheme.lower()
+    if scheme not in ALLOWED_SCHEMES:
+        raise ValueError(f"Esquema de URL no permitido para fotos: {scheme or '(ninguno)'}")
+
+
+class _HttpRedirectHandler(urllib.request.HTTPRedirectHandler):
+    # Las redirecciones también deben quedarse en HTTP
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_scheme(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(_HttpRedirectHandler)
+
+
+def fetch_url(url, timeout=10):
+    _check_scheme(url)
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with _opener.open(request, timeout=timeout) as response:
+        return response.read()
+
+
+class RateLimiter:
+    """Espacia las llamadas a `wait()` a `per_second` por segundo entre todos los hilos."""
+
+    def __init__(self, per_second):
+        self._interval = 1.0 / per_second
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self._interval
+        time.sleep(start - now)
+
+
+class ThumbnailCache:
+    """Caché en disco de miniaturas, con tamaño máximo y desalojo LRU.
+
+    Cada foto se descarga una sola vez y se guardan todas las variantes de
+    `THUMBNAIL_SIZES`. La fecha de modificación de cada archivo marca su
+    último uso. `fetch` (por omisión `fetch_url`) recibe la URL y devuelve
+    los bytes de la foto.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES, fetch=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._fetch = fetch or fetch_url
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._failures = {}
+        self._placeholders = {}
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="thumbnails")
+        self._total_bytes = sum(path.stat().st_size for path in self.directory.glob("*/*.jpg"))
+
+    def _path(self, url, size):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / key[:2] / f"{key}_{size}.jpg"
+
+    def get(self, url, size='card'):
+        """Bytes JPEG de la miniatura; la imagen de reemplazo si no hay foto o falla la descarga."""
+        data = self.load(url, size) if url else None
+        return data if data is not None else self.placeholder(size)
+
+    def load(self, url, size='card'):
+        """Como `get`, pero devuelve None si no se pudo obtener la foto."""
+        path = self._path(url, size)
+        data = self._read(path)
+        if data is not None:
+            return data
+
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        with url_lock:
+            # Otra sesión pudo haberla generado mientras esperábamos
+            data = self._read(path)
+            if data is None:
+                data = self._create(url, size)
+        with self._lock:
+            self._url_locks.pop(url, None)
+        return data
+
+    def load_uncached(self, url, size='gallery', limiter=None):
+        """Miniatura guardada si existe; si no, la foto original descargada sin guardarla.
+
+        Para procesos de fondo que recorren todas las propiedades: no
+        desalojan ni renuevan las miniaturas que usa la interfaz. `limiter`
+        (un `RateLimiter`) espacia las descargas a los portales.
+        """
+        try:
+            return self._path(url, size).read_bytes()
+        except FileNotFoundError:
+            pass
+        failed_at = self._failures.get(url)
+        if failed_at is not None and time.monotonic() - failed_at < FAILURE_TTL:
+            return None
+        if limiter is not None:
+            limiter.wait()
+        try:
+            return self._fetch(url)
+        except Exception:
+            self._failures[url] = time.monotonic()
+            return None
+
+    def prefetch(self, urls, size='card'):
+        # Descarga en paralelo las fotos de la página visible
+        for url in urls:
+            if url and not self._path(url, size).exists():
+                self._executor.submit(self.get, url, size)
+
+    def _read(self, path):
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def _create(self, url, size):
+        failed_at = self._failures.get(url)
+        if failed_at is not None and time.monotonic() - failed_at < FAILURE_TTL:
+            return None
+        try:
+            image = ImageOps.exif_transpose(Image.open(io.BytesIO(self._fetch(url))))
+            image = image.convert("RGB")
+        except Exception:
+            self._failures[url] = time.monotonic()
+            return None
+
+        requested = None
+        for variant, dimensions in THUMBNAIL_SIZES.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail(dimensions, Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            data = buffer.getvalue()
+            self._write(self._path(url, variant), data)
+            if variant == size:
+                requested = data
+        self._evict()
+        return requested
+
+    def _write(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(".tmp")
+        temporary.write_bytes(data)
+        try:
+            previous = path.stat().st_size
+        except FileNotFoundError:
+            previous = 0
+        os.replace(temporary, path)
+        with self._lock:
+            self._total_bytes += len(data) - previous
+
+    def _evict(self):
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            files = sorted(self.directory.glob("*/*.jpg"), key=lambda path: path.stat().st_mtime)
+            # Se libera hasta el 90% para no desalojar en cada escritura
+            target = int(self.max_bytes * 0.9)
+            total = sum(path.stat().st_size for path in files)
+            for path in files:
+                if total <= target:
+                    break
+                size = path.stat().st_size
+                path.unlink(missing_ok=True)
+                total -= size
+            self._total_bytes = total
+
+    def placeholder(self, size='card'):
+        # Imagen "Sin Foto" generada localmente
+        if size not in self._placeholders:
+            width, height = THUMBNAIL_SIZES[size]
+            image = Image.new("RGB", (width, height), "#e9ecef")
+            draw = ImageDraw.Draw(image)
+            text = "Sin Foto"
+            left, top, right, bottom = draw.textbbox((0, 0), text)
+            draw.text(((width - (right - left)) / 2, (height - (bottom - top)) / 2), text, fill="#6c757d")
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            self._placeholders[size] = buffer.getvalue()
+        return self._placeholders[size]
@@ -0,0 +1,235 @@
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+# --- Cola de escrituras en segundo plano ---
+
+# Espera tras el primer cambio para agrupar los que lleguen después
+FLUSH_DELAY = 0.5
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+# Ids por petición en los filtros in_("id", ...): van en la URL
+ID_CHUNK_SIZE = 200
+
+# Tablas cuyas filas pendientes siempre incluyen las columnas NOT NULL y se
+# pueden enviar como un solo upsert. En las demás, las actualizaciones se
+# agrupan por contenido idéntico (update ... in_(ids)).
+UPSERT_TABLES = {"promoters"}
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """Agrupa las escrituras del dashboard y las envía fuera del hilo de la UI.
+
+    Los cambios pendientes se combinan por fila: dos ediciones de la misma
+    fila se mezclan y una eliminación reemplaza a las ediciones anteriores.
+    Cada envío se reintenta hasta `MAX_RETRIES` veces; el resultado queda
+    como mensaje para la sesión que originó el cambio. Las filas en envío
+    siguen en `pending` hasta que llega la respuesta.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._inserts = []
+        self._messages = defaultdict(deque)
+        self._generations = defaultdict(int)
+        self._failure_callbacks = {}
+        # Cambios e inserciones del envío en curso
+        self._in_flight = {}
+        self._in_flight_inserts = []
+        self._temp_ids = itertools.count(1)
+        self._worker = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._worker.start()
+
+    # --- API para la UI ---
+
+    def update(self, table, row_id, changes, session_id=None):
+        self.update_many(table, [row_id], changes, session_id)
+
+    def update_many(self, table, row_ids, changes, session_id=None):
+        # Encolados juntos, salen en el mismo envío (un update ... in_(ids))
+        with self._condition:
+            for row_id in row_ids:
+                pending = self._pending.get((table, row_id))
+                if pending is not None and pending["op"] == "delete":
+                    continue
+                if pending is None:
+                    pending = self._pending[(table, row_id)] = {"op": "update", "data": {}, "sessions": set()}
+                pending["data"].update(changes)
+                pending["sessions"].add(session_id)
+            self._condition.notify()
+
+    def delete(self, table, row_id, session_id=None):
+        self.delete_many(table, [row_id], session_id)
+
+    def delete_many(self, table, row_ids, session_id=None):
+        with self._condition:
+            for row_id in row_ids:
+                pending = self._pending.get((table, row_id))
+                sessions = pending["sessions"] if pending is not None else set()
+                sessions.add(session_id)
+                self._pending[(table, row_id)] = {"op": "delete", "data": None, "sessions": sessions}
+            self._condition.notify()
+
+    def insert(self, table, row, session_id=None):
+        with self._condition:
+            self._inserts.append({"table": table, "data": dict(row), "sessions": {session_id}, "temp_id": next(self._temp_ids)})
+            self._condition.notify()
+
+    def pending(self, table):
+        """Cambios aún no confirmados de `table`, para mostrarlos de forma optimista."""
+        with self._condition:
+            changes = {}
+            # Los cambios en cola son posteriores a los del envío en curso
+            for (t, row_id), p in itertools.chain(self._in_flight.items(), self._pending.items()):
+                if t != table:
+                    continue
+                previous = changes.get(row_id)
+                if previous is None or p["op"] == "delete":
+                    changes[row_id] = dict(p, sessions=None)
+                elif previous["op"] == "update":
+                    changes[row_id] = dict(p, data={**previous["data"], **p["data"]}, sessions=None)
+            inserts = [dict(i, sessions=None) for i in self._in_flight_inserts + self._inserts if i["table"] == table]
+            return changes, inserts
+
+    def has_pending(self):
+        with self._condition:
+            return bool(self._pending or self._inserts or self._in_flight or self._in_flight_inserts)
+
+    def generation(self, table):
+        # Aumenta con cada envío exitoso; sirve como llave de las cachés de lectura
+        with self._condition:
+            return self._generations[table]
+
+    def drain_messages(self, session_id):
+        with self._condition:
+            messages = list(self._messages.pop(session_id, []))
+        return messages
+
+    def on_failure(self, table, callback):
+        # callback(ids) se llama desde el hilo de la cola cuando un envío falla definitivamente
+        self._failure_callbacks[table] = callback
+
+    # --- Envío ---
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not (self._pending or self._inserts):
+                    self._condition.wait()
+            time.sleep(FLUSH_DELAY)
+            with self._condition:
+                pending, self._pending = self._pending, {}
+                inserts, self._inserts = self._inserts, []
+                self._in_flight, self._in_flight_inserts = dict(pending), list(inserts)
+            try:
+                self._flush(pending, inserts)
+            finally:
+                with self._condition:
+                    self._in_flight, self._in_flight_inserts = {}, []
+
+    def _flush(self, pending, inserts):
+        by_table = defaultdict(lambda: {"update": {}, "delete": {}})
+        for (table, row_id), change in pending.items():
+            by_table[table][change["op"]][row_id] = change
+
+        for table, changes in by_table.items():
+            if changes["delete"]:
+                ids = list(changes["delete"])
+                self._send(
+                    table, ids, _sessions(changes["delete"].values()),
+                    lambda: _by_ids(ids, lambda chunk: self._client.from_(table).delete().in_("id", chunk)),
+                    "eliminado(s)",
+                )
+            for ids, data, sessions in self._update_batches(table, changes["update"]):
+                if data is None:
+                    rows = [dict(changes["update"][row_id]["data"], id=row_id) for row_id in ids]
+                    request = lambda rows=rows: self._client.from_(table).upsert(rows, on_conflict="id", default_to_null=False).execute()
+                else:
+                    request = lambda ids=ids, data=data: _by_ids(
+                        ids, lambda chunk: self._client.from_(table).update(data).in_("id", chunk)
+                    )
+                self._send(table, ids, sessions, request, "actualizado(s)")
+
+        inserts_by_table = defaultdict(list)
+        for item in inserts:
+            inserts_by_table[item["table"]].append(item)
+        for table, items in inserts_by_table.items():
+            rows = [item["data"] for item in items]
+            self._send(
+                table, [], _sessions(items),
+                lambda rows=rows: self._client.from_(table).insert(rows).execute(),
+                "añadido(s)", inserts=items,
+            )
+
+    def _update_batches(self, table, updates):
+        # Filas con el mismo cambio -> un update ... in_(ids). El resto va en un
+        # upsert si la tabla lo permite, o en un update por fila.
+        groups = defaultdict(list)
+        for row_id, change in updates.items():
+            groups[json.dumps(change["data"], sort_keys=True, default=str)].append(row_id)
+
+        singles = []
+        for ids in groups.values():
+            if len(ids) > 1 or table not in UPSERT_TABLES:
+                yield ids, updates[ids[0]]["data"], _sessions(updates[i] for i in ids)
+            else:
+                singles.extend(ids)
+        if singles:
+            yield singles, None, _sessions(updates[i] for i in singles)
+
+    def _send(self, table, ids, sessions, request, verb, inserts=()):
+        count = len(ids) + len(inserts)
+        for attempt in range(MAX_RETRIES):
+            try:
+                request()
+                with self._condition:
+                    # Junto con la generación nueva, para que las lecturas vean
+                    # siempre la fila pendiente o la del servidor
+                    self._generations[table] += 1
+                    self._release(table, ids, inserts)
+                self._notify(sessions, "success", f"{count} registro(s) de '{table}' {verb}.")
+                return True
+            except Exception as e:
+                error = e
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        logger.warning("No se pudo guardar en '%s' tras %d intentos: %s", table, MAX_RETRIES, error)
+        self._notify(sessions, "error", f"Error al guardar en '{table}': {error}")
+        callback = self._failure_callbacks.get(table)
+        if callback is not None and ids:
+            try:
+                callback(ids)
+            except Exception:
+                logger.exception("Falló el callback de error de la cola de escrituras para '%s'", table)
+        with self._condition:
+            self._release(table, ids, inserts)
+        return False
+
+    def _release(self, table, ids, inserts):
+        # Quita del envío en curso las filas que ya tienen respuesta
+        for row_id in ids:
+            self._in_flight.pop((table, row_id), None)
+        temp_ids = {item["temp_id"] for item in inserts}
+        self._in_flight_inserts = [item for item in self._in_flight_inserts if item["temp_id"] not in temp_ids]
+
+    def _notify(self, sessions, level, message):
+        with self._condition:
+            for session_id in sessions:
+                self._messages[session_id].append((level, message))
+
+
+def _sessions(changes):
+    return set().union(*(change["sessions"] for change in changes))
+
+
+def _by_ids(ids, build):
+    # Una petición por bloque de ids; las operaciones son idempotentes, así
+    # que un reintento puede repetir los bloques ya enviados
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        build(ids[start:start + ID_CHUNK_SIZE]).execute()